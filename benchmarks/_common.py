@@ -0,0 +1,200 @@
+"""
+Shared helpers for the benchmark scripts.
+
+The application reads its configuration from the environment, so the defaults below
+let the benchmarks import ``src`` without a ``.env`` file. Real values still win.
+"""
+import os
+import random
+import resource
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+for _name, _value in {
+    "SQLALCHEMY_DATABASE_URL": "sqlite:///./bench.db",
+    "SECRET_KEY_JWT": "benchmark-secret",
+    "ALGORITHM": "HS256",
+    "MAIL_USERNAME": "bench",
+    "MAIL_PASSWORD": "bench",
+    "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465",
+    "MAIL_SERVER": "localhost",
+    "POSTGRES_DB": "bench",
+    "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench",
+    "POSTGRES_PORT": "5432",
+    "CLOUDINARY_NAME": "bench",
+    "CLOUDINARY_API_KEY": "bench",
+    "CLOUDINARY_API_SECRET": "bench",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+
+def contact_rows(count: int, start: int = 1):
+    """Yield ``count`` synthetic contact rows as plain dicts."""
+    rnd = random.Random(start)
+    first_day = date(1950, 1, 1)
+    for i in range(start, start + count):
+        yield {
+            "id": i,
+            "first_name": f"first{i % 5000}",
+            "last_name": f"last{i % 7919}",
+            "email": f"contact{i}@example.com",
+            "phone_number": f"+380{i:09d}",
+            "birthday": first_day + timedelta(days=rnd.randrange(365 * 55)),
+            "additional_data": "benchmark",
+        }
+
+
+def owner():
+    """The admin user every benchmark contact belongs to."""
+    from src.database.models import Roles, User
+
+    return User(id=1, username="benchmark", email="bench@example.com", password="x", roles=Roles.admin,
+                confirmed=True)
+
+
+def create_schema(engine):
+    """Recreate the schema on a sync ``engine`` with the benchmark owner and no contacts."""
+    from sqlalchemy.orm import Session
+
+    from src.database.models import Base
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(owner())
+        db.commit()
+
+
+def seed_contacts(engine, count: int, batch_size: int = 10_000):
+    """Create the schema on a sync ``engine`` and insert ``count`` contacts of the benchmark owner."""
+    from src.database.models import Contact
+
+    create_schema(engine)
+    rows = contact_rows(count)
+    with engine.begin() as conn:
+        while True:
+            batch = [{**row, "user_id": 1} for _, row in zip(range(batch_size), rows)]
+            if not batch:
+                break
+            conn.execute(Contact.__table__.insert(), batch)
+
+
+class MemoryRedis:
+    """Async stand-in for redis.asyncio.Redis that keeps data in a dict and counts round-trips."""
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    async def get(self, key):
+        self.round_trips += 1
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        self.round_trips += 1
+        if nx and key in self.data:
+            return None
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    async def exists(self, *keys):
+        self.round_trips += 1
+        return sum(key in self.data for key in keys)
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+    async def expire(self, key, seconds):
+        self.round_trips += 1
+
+    async def delete(self, *keys):
+        self.round_trips += 1
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def hgetall(self, key):
+        # No birthday digest has been built, so contact writes skip updating it
+        self.round_trips += 1
+        return {}
+
+    async def script_load(self, script):
+        return "sha"
+
+    async def evalsha(self, sha, numkeys, *args):
+        # FastAPILimiter: never rate limit the benchmark
+        return 0
+
+
+class MemoryPipeline:
+    """The pipeline of MemoryRedis: queued commands run on execute, as one round-trip."""
+
+    def __init__(self, redis: MemoryRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((getattr(self.redis, name), args, kwargs))
+
+    async def execute(self):
+        results = [await command(*args, **kwargs) for command, args, kwargs in self.commands]
+        self.redis.round_trips -= len(self.commands) - 1
+        self.commands = []
+        return results
+
+
+def app_client(path: str, contacts: int = 0):
+    """
+    Build a TestClient for the real application on the SQLite file ``path`` with ``contacts`` rows
+    owned by the benchmark admin. Redis is replaced by MemoryRedis. Returns the client and the auth headers.
+    """
+    import asyncio
+
+    from fastapi.testclient import TestClient
+    from fastapi_limiter import FastAPILimiter
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from main import app
+    from src.database.connect import get_db
+    from src.services.auth import auth_service
+
+    engine = create_engine(f"sqlite:///{path}")
+    seed_contacts(engine, contacts)
+
+    SessionLocal = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"),
+                                      autoflush=False, expire_on_commit=False)
+
+    async def get_bench_db():
+        async with SessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = get_bench_db
+    auth_service.redis = MemoryRedis()
+    asyncio.run(FastAPILimiter.init(auth_service.redis))
+    token = asyncio.run(auth_service.create_access_token({"sub": "bench@example.com"}, expires_delta=7200))
+    return TestClient(app), {"Authorization": f"Bearer {token}"}
+
+
+def latency_summary(samples: list) -> str:
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50 {p50 * 1000:7.3f} ms  p99 {p99 * 1000:7.3f} ms  {len(samples) / sum(samples):8.1f} req/s"
+
+
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of this process in megabytes."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / 1024 if sys.platform != "darwin" else usage / 1024 / 1024
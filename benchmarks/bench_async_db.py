@@ -0,0 +1,87 @@
+"""
+Load test: concurrent requests against an artificially slow query.
+
+"before" is the old pattern - an ``async def`` handler calling a sync ``Session`` - which blocks
+the event loop for the whole query. "after" is the ``AsyncSession`` path used by the repositories.
+A ``slow(ms)`` SQL function is registered on every SQLite connection to simulate a slow Postgres query.
+
+    python benchmarks/bench_async_db.py --requests 50 --delay-ms 100
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import _common  # noqa: F401
+
+
+def _slow(ms):
+    time.sleep(ms / 1000)
+    return ms
+
+
+async def load(app, path: str, requests: int) -> float:
+    import httpx
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.get(path) for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses), responses[0].text
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--delay-ms", type=int, default=100)
+    args = parser.parse_args()
+
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import create_engine, event, text
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import Session, sessionmaker
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "contacts.db"
+        sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False},
+                                    pool_size=args.requests)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        for eng in (sync_engine, async_engine.sync_engine):
+            event.listen(eng, "connect", lambda conn, _: conn.create_function("slow", 1, _slow))
+        _common.seed_contacts(sync_engine, 100)
+
+        SyncSession = sessionmaker(bind=sync_engine)
+        AsyncSessionLocal = async_sessionmaker(async_engine)
+        query = text("SELECT slow(:ms)").bindparams(ms=args.delay_ms)
+
+        def get_sync_db():
+            db = SyncSession()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        async def get_async_db():
+            async with AsyncSessionLocal() as db:
+                yield db
+
+        app = FastAPI()
+
+        @app.get("/before")
+        async def before(db: Session = Depends(get_sync_db)):
+            return {"result": db.execute(query).scalar()}
+
+        @app.get("/after")
+        async def after(db: AsyncSession = Depends(get_async_db)):
+            return {"result": (await db.execute(query)).scalar()}
+
+        print(f"{args.requests} concurrent requests, {args.delay_ms} ms query")
+        for name in ("before", "after"):
+            elapsed = asyncio.run(load(app, f"/{name}", args.requests))
+            print(f"{name:>6}: {elapsed:6.2f} s  {args.requests / elapsed:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Per-request overhead of Auth.get_current_user on a cache hit and on a cache miss.
+
+"before" replays the old code path - pickled ORM instance, SET followed by EXPIRE - against the
+same in-memory Redis stand-in, so only serialization cost and round-trips are compared.
+
+    python benchmarks/bench_auth_overhead.py --iterations 20000
+"""
+import argparse
+import asyncio
+import pickle
+import time
+from datetime import datetime
+
+import _common
+
+
+async def main(iterations: int) -> None:
+    from jose import jwt
+
+    from src.database.models import Roles, User
+    from src.services.auth import auth_service
+
+    user = User(id=1, username="deadpool", email="deadpool@example.com", password="x" * 60,
+                created_at=datetime.now(), avatar="https://www.gravatar.com/avatar/0", refresh_token="t" * 200,
+                roles=Roles.admin, confirmed=True)
+    token = await auth_service.create_access_token({"sub": user.email}, expires_delta=7200)
+    key = f"user:{user.email}"
+
+    async def before(redis, hit):
+        payload = jwt.decode(token, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM])
+        cached = await redis.get(f"user:{payload['sub']}")
+        if cached is None or not hit:
+            await redis.set(key, pickle.dumps(user))
+            await redis.expire(key, 900)
+            return user
+        return pickle.loads(cached)
+
+    async def after(redis, hit):
+        payload = jwt.decode(token, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM])
+        cached = await redis.get(f"user:{payload['sub']}")
+        if cached is None or not hit:
+            await redis.set(key, auth_service.dump_user(user), ex=900)
+            return user
+        return auth_service.load_user(cached)
+
+    for hit in (True, False):
+        print("cache hit" if hit else "cache miss")
+        for name, path in (("before", before), ("after", after)):
+            redis = _common.MemoryRedis()
+            await path(redis, False)
+            redis.round_trips = 0
+            start = time.perf_counter()
+            for _ in range(iterations):
+                await path(redis, hit)
+            elapsed = time.perf_counter() - start
+            print(f"  {name:>6}: {elapsed / iterations * 1e6:7.1f} us/request  "
+                  f"{redis.round_trips / iterations:.0f} round-trips  "
+                  f"{len(redis.data[key]):5d} bytes cached")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20_000)
+    asyncio.run(main(parser.parse_args().iterations))
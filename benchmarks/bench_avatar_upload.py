@@ -0,0 +1,85 @@
+"""
+Latency of ``--uploads`` concurrent avatar uploads of a ~5 MB 12-megapixel JPEG, and how long the event loop
+stalls meanwhile: the old handler, which sent the original file to Cloudinary with a synchronous call
+on the event loop, against make_avatar in the avatar pool followed by an upload in a thread.
+
+The storage is simulated: every upload takes ``--rtt-ms`` plus its size over ``--uplink-mbps``.
+A probe task that should wake up every millisecond measures the event loop stalls.
+
+    python benchmarks/bench_avatar_upload.py --uploads 8 --uplink-mbps 50 --rtt-ms 80
+"""
+import argparse
+import asyncio
+import io
+import time
+
+import _common
+
+
+def photo() -> bytes:
+    from PIL import Image
+
+    size = (4000, 3000)
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 30)
+    output = io.BytesIO()
+    Image.merge("RGB", (noise, gradient, Image.blend(gradient, noise, 0.5))).save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+async def run(label: str, upload, data: bytes, uploads: int):
+    stalls = []
+
+    async def probe():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stalls.append(time.perf_counter() - start - 0.001)
+
+    async def timed(start: float):
+        sent = await upload(data)
+        return time.perf_counter() - start, sent
+
+    prober = asyncio.create_task(probe())
+    await asyncio.sleep(0.01)
+    # All uploads arrive together, so a blocked loop shows up in the latency of the ones that wait
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed(start) for _ in range(uploads)))
+    await asyncio.sleep(0.01)
+    prober.cancel()
+    latencies = [latency for latency, _ in results]
+    sent = results[0][1]
+    print(f"{label:>8}: {_common.latency_summary(latencies)}  max loop stall {max(stalls) * 1000:8.1f} ms  "
+          f"{sent / 1024:7.1f} KiB sent per upload")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--uplink-mbps", type=float, default=50)
+    parser.add_argument("--rtt-ms", type=float, default=80)
+    args = parser.parse_args()
+
+    from src.services.avatars import make_avatar
+
+    def storage_upload(data: bytes) -> int:
+        time.sleep(args.rtt_ms / 1000 + len(data) * 8 / (args.uplink_mbps * 1e6))
+        return len(data)
+
+    async def before(data: bytes) -> int:
+        # cloudinary.uploader.upload(file.file, ...) called directly in the async handler
+        return storage_upload(data)
+
+    async def after(data: bytes) -> int:
+        avatar = await make_avatar(io.BytesIO(data))
+        return await asyncio.to_thread(storage_upload, avatar)
+
+    data = photo()
+    print(f"{args.uploads} concurrent uploads of {len(data) / 1e6:.1f} MB, "
+          f"{args.uplink_mbps} Mbit/s uplink, {args.rtt_ms} ms round-trip")
+    asyncio.run(run("before", before, data, args.uploads))
+    asyncio.run(run("after", after, data, args.uploads))
+
+
+if __name__ == "__main__":
+    main()
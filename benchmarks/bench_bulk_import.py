@@ -0,0 +1,53 @@
+"""
+Rows per second: POST /api/contacts/ one contact at a time vs POST /api/contacts/bulk.
+
+    python benchmarks/bench_bulk_import.py --single 1000 --bulk 50000
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import _common
+
+
+def payload(rows):
+    for row in rows:
+        row = dict(row, birthday=row["birthday"].isoformat())
+        row.pop("id")
+        yield row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--single", type=int, default=1000)
+    parser.add_argument("--bulk", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client, headers = _common.app_client(str(Path(tmp) / "contacts.db"))
+
+        start = time.perf_counter()
+        for i, row in enumerate(payload(_common.contact_rows(args.single)), start=1):
+            response = client.post("/api/contacts/", json=dict(row, id=i), headers=headers)
+            assert response.status_code == 201, response.text
+        elapsed = time.perf_counter() - start
+        print(f"  single: {args.single:>7,} rows  {args.single / elapsed:9.1f} rows/s")
+
+        rows = list(payload(_common.contact_rows(args.bulk, start=args.single + 1)))
+        for name, content_type, body in (
+            ("json", "application/json", json.dumps(rows)),
+            ("ndjson", "application/x-ndjson", "\n".join(json.dumps(row) for row in rows)),
+        ):
+            body = body.replace("@example.com", f"@{name}.example.com")
+            start = time.perf_counter()
+            response = client.post("/api/contacts/bulk", content=body,
+                                   headers={**headers, "Content-Type": content_type})
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200 and response.json()["inserted"] == args.bulk, response.text[:300]
+            print(f"{'bulk ' + name:>8}: {args.bulk:>7,} rows  {args.bulk / elapsed:9.1f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+A sync run of ``--items`` contacts: one request per contact against the batch endpoints.
+
+Each operation is timed through the real application on SQLite: GET /contacts/{id} against
+POST /contacts/batch/get, PATCH /contacts/{id} against POST /contacts/batch/update, and
+DELETE /contacts/{id} against POST /contacts/batch/delete, with ``--batch`` items per batch request.
+
+    python benchmarks/bench_contact_batch.py --rows 100000 --items 2000 --batch 500
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import _common
+
+
+def timed(label: str, items: int, requests) -> None:
+    start = time.perf_counter()
+    count = 0
+    for response in requests:
+        assert response.status_code in (200, 204), response.text
+        if "/batch/" in response.request.url.path:
+            assert all(item["status"] in (200, 204) for item in response.json()), response.text
+        count += 1
+    elapsed = time.perf_counter() - start
+    print(f"{label:>28}: {elapsed:7.2f} s  {items / elapsed:9.1f} contacts/s  {count:>5} requests")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    from src.services import birthdays, contact_cache
+
+    contact_cache.redis_client = birthdays.redis_client = _common.MemoryRedis()
+    with tempfile.TemporaryDirectory() as tmp:
+        client, headers = _common.app_client(str(Path(tmp) / "contacts.db"), args.rows)
+        singles = range(1, args.items + 1)
+        batched = range(args.items + 1, 2 * args.items + 1)
+        chunks = [list(batched[i:i + args.batch]) for i in range(0, args.items, args.batch)]
+        print(f"{args.items} contacts of {args.rows:,}, {args.batch} per batch")
+
+        timed("GET /contacts/{id}", args.items,
+              (client.get(f"/api/contacts/{i}", headers=headers) for i in singles))
+        timed("POST /contacts/batch/get", args.items,
+              (client.post("/api/contacts/batch/get", json=chunk, headers=headers) for chunk in chunks))
+        timed("PATCH /contacts/{id}", args.items,
+              (client.patch(f"/api/contacts/{i}", json={"additional_data": "synced"}, headers=headers)
+               for i in singles))
+        timed("POST /contacts/batch/update", args.items,
+              (client.post("/api/contacts/batch/update", headers=headers,
+                           json=[{"id": i, "additional_data": "synced"} for i in chunk]) for chunk in chunks))
+        timed("DELETE /contacts/{id}", args.items,
+              (client.delete(f"/api/contacts/{i}", headers=headers) for i in singles))
+        timed("POST /contacts/batch/delete", args.items,
+              (client.post("/api/contacts/batch/delete", json=[{"id": i} for i in chunk], headers=headers)
+               for chunk in chunks))
+
+
+if __name__ == "__main__":
+    main()
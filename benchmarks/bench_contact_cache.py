@@ -0,0 +1,53 @@
+"""
+p50/p99 latency of repeated GET /api/contacts/{id} and /by_email/{email} with and without the contact cache.
+
+Reads cycle over ``--hot`` contacts of a ``--rows`` table on SQLite. Redis is the in-process MemoryRedis,
+so cache hits here do not pay a network round-trip; with a real Redis add its RTT to the cached numbers.
+
+    python benchmarks/bench_contact_cache.py --rows 100000 --requests 2000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import _common
+
+
+class NoCacheRedis(_common.MemoryRedis):
+    """Never finds anything, so every read goes to the database as before the cache."""
+
+    async def get(self, key):
+        self.round_trips += 1
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--hot", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    from src.services import contact_cache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client, headers = _common.app_client(str(Path(tmp) / "contacts.db"), args.rows)
+        print(f"{args.requests} reads over {args.hot} hot contacts of {args.rows:,}")
+        for route in ("id", "email"):
+            for name, redis in (("uncached", NoCacheRedis()), ("cached", _common.MemoryRedis())):
+                contact_cache.redis_client = redis
+                samples = []
+                for i in range(args.requests):
+                    contact_id = i % args.hot + 1
+                    url = (f"/api/contacts/{contact_id}" if route == "id"
+                           else f"/api/contacts/by_email/contact{contact_id}@example.com")
+                    start = time.perf_counter()
+                    response = client.get(url, headers=headers)
+                    samples.append(time.perf_counter() - start)
+                    assert response.status_code == 200, response.text
+                print(f"{route:>6} {name:>9}: {_common.latency_summary(samples)}")
+
+
+if __name__ == "__main__":
+    main()
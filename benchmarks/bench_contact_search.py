@@ -0,0 +1,130 @@
+"""
+Latency of GET /api/contacts/search on the in-memory trigram index (the SQLite backend).
+
+For each table size it reports the time to load the index, its peak RSS, and the median and p95 latency
+of search_contacts for prefix, fuzzy and phone queries of several lengths.
+On Postgres the same queries go through the pg_trgm GIN indexes instead; run the SQL printed by
+--explain QUERY against a Postgres database to check the plan.
+
+    python benchmarks/bench_contact_search.py --rows 100000 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import _common  # noqa: F401
+
+FIRST_NAMES = ("olena", "dmytro", "stefan", "iryna", "pavlo", "oksana", "andrii", "natalia", "taras", "sofia",
+               "maksym", "yulia", "bohdan", "kateryna", "oleh", "anna", "serhii", "mariia", "ivan", "viktoriia")
+SYLLABLES = ("ko", "val", "shen", "pet", "ren", "bon", "dar", "lys", "mel", "nyk", "tur", "han", "chuk", "ets",
+             "sky", "zar", "vol", "myr", "ov", "ko", "hor", "bar", "ly", "ka", "sen", "ruk", "dyb", "lan")
+DOMAINS = ("gmail.com", "ukr.net", "meta.ua", "i.ua", "outlook.com")
+
+QUERIES = {
+    "prefix 1 char": "o",
+    "prefix 3 chars": "ole",
+    "prefix name": "kovalshen",
+    "prefix email": "dmytro.petren",
+    "fuzzy name": "kovalshne",
+    "fuzzy email": "stefan.barly",
+    "phone prefix": "+38067123",
+    "no match": "qqqqqq",
+}
+
+
+def seed_people(engine, count: int, batch_size: int = 10_000):
+    """Contacts with name-like first names, last names, emails and phones, so trigrams are realistic."""
+    from src.database.models import Contact
+
+    rnd = random.Random(42)
+    _common.create_schema(engine)
+    with engine.begin() as conn:
+        for start in range(0, count, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, count)):
+                first = rnd.choice(FIRST_NAMES)
+                last = "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+                batch.append({
+                    "first_name": first.capitalize(),
+                    "last_name": last.capitalize(),
+                    "email": f"{first}.{last}{i}@{rnd.choice(DOMAINS)}",
+                    "phone_number": f"+380{rnd.randrange(10 ** 9):09d}",
+                    "birthday": date(1950, 1, 1) + timedelta(days=rnd.randrange(365 * 55)),
+                    "user_id": 1,
+                })
+            conn.execute(Contact.__table__.insert(), batch)
+
+
+def run_size(path: str, repeats: int) -> None:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from src.repository.contacts import search_contacts
+    from src.services.search import contact_indexes
+
+    user = _common.owner()
+
+    async def run():
+        async with async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"))() as db:
+            start = time.perf_counter()
+            await contact_indexes[user.id].load(db, user.id)
+            print(f"  index load {time.perf_counter() - start:6.2f} s  peak RSS {_common.peak_rss_mb():8.1f} MB")
+            for label, query in QUERIES.items():
+                samples, found = [], 0
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    found = len(await search_contacts(query, user, db, limit=20))
+                    samples.append(time.perf_counter() - start)
+                samples.sort()
+                print(f"  {label:<15} {query!r:<14} p50 {statistics.median(samples) * 1000:8.2f} ms  "
+                      f"p95 {samples[int(len(samples) * 0.95) - 1] * 1000:8.2f} ms  results {found}")
+
+    asyncio.run(run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--path")
+    parser.add_argument("--explain", metavar="QUERY", help="print the Postgres SQL of a search instead")
+    args = parser.parse_args()
+
+    if args.explain:
+        from unittest.mock import AsyncMock, MagicMock
+
+        from sqlalchemy.dialects.postgresql import asyncpg
+
+        from src.repository.contacts import search_contacts
+
+        def show(stmt):
+            print("EXPLAIN ANALYZE", stmt.compile(dialect=asyncpg.dialect(), compile_kwargs={"literal_binds": True}))
+            return MagicMock()
+
+        db = MagicMock()
+        db.get_bind.return_value.dialect.name = "postgresql"
+        db.execute = AsyncMock(side_effect=show)
+        asyncio.run(search_contacts(args.explain, _common.owner(), db))
+        return
+    if args.path:
+        run_size(args.path, args.repeats)
+        return
+
+    from sqlalchemy import create_engine
+
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "contacts.db")
+            seed_people(create_engine(f"sqlite:///{path}"), rows)
+            print(f"GET /api/contacts/search over {rows:,} contacts")
+            subprocess.run([sys.executable, __file__, "--path", path, "--repeats", str(args.repeats)], check=True)
+
+
+if __name__ == "__main__":
+    main()
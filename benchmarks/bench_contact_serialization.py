@@ -0,0 +1,71 @@
+"""
+Time how long a contact read takes to fetch and serialize ``--rows`` contacts.
+
+``before`` is the old path: ORM Contact objects validated into ResponseContact by FastAPI's
+response_model handling, then rendered by JSONResponse. ``after`` is the column select the
+repository uses now, serialized to JSON bytes in one call by the precompiled TypeAdapter.
+
+    python benchmarks/bench_contact_serialization.py --rows 10000
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import _common  # noqa: F401
+
+
+async def measure(path: str, rows: int, repeat: int) -> None:
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from src.database.models import Contact
+    from src.repository.contacts import CONTACT_COLUMNS, _fetch_rows
+    from src.schemas import ResponseContact
+    from src.services.contacts_io import ContactJSONResponse
+
+    field = create_response_field(name="Response_contacts", type_=List[ResponseContact])
+
+    async def before(db):
+        contacts = (await db.execute(select(Contact).limit(rows))).scalars().all()
+        content = await serialize_response(field=field, response_content=contacts)
+        return JSONResponse(content).body
+
+    async def after(db):
+        return ContactJSONResponse(await _fetch_rows(select(*CONTACT_COLUMNS).limit(rows), db)).body
+
+    session = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"))
+    print(f"Fetch and serialize {rows:,} contacts, median of {repeat}")
+    bodies = {}
+    for name, read in (("before", before), ("after", after)):
+        timings = []
+        for _ in range(repeat):
+            async with session() as db:
+                start = time.perf_counter()
+                bodies[name] = await read(db)
+                timings.append(time.perf_counter() - start)
+        print(f"{name:>7}: {statistics.median(timings) * 1000:8.1f} ms  bytes {len(bodies[name]):>10,}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "contacts.db")
+        _common.seed_contacts(create_engine(f"sqlite:///{path}"), args.rows)
+        asyncio.run(measure(path, args.rows, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Writes per second of update_contact under concurrent clients: the old SELECT-then-UPDATE through the ORM
+against the single UPDATE ... RETURNING, for a one-column partial update and a full update.
+
+Every client has its own session and updates random contacts of a ``--rows`` table on SQLite.
+SQLite has one writer at a time and no network, so ``--rtt-ms`` adds a sleep to every statement to stand in
+for the round-trip to a database server. Redis is the in-process MemoryRedis.
+An update that sets the email reads the old email first on SQLite, so full updates take two statements here
+and one on Postgres.
+
+    python benchmarks/bench_contact_writes.py --rows 100000 --clients 8 --writes 500 --rtt-ms 0.5
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import _common
+
+
+async def orm_update(changes: dict, contact_id: int, user, db):
+    # update_contact before: load the whole row, set the attributes, flush an UPDATE, commit
+    from sqlalchemy import select
+
+    from src.database.models import Contact
+
+    result = await db.execute(select(Contact).filter_by(id=contact_id, user_id=user.id))
+    contact = result.scalars().first()
+    for key, value in changes.items():
+        setattr(contact, key, value)
+    contact.version += 1
+    await db.commit()
+    return contact
+
+
+async def run(path: str, rows: int, clients: int, writes: int, rtt_ms: float, update, full: bool):
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 60})
+    statements = 0
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count(*args):
+        nonlocal statements
+        statements += 1
+        # Runs in the connection's thread, so it delays this client like a network round-trip would
+        time.sleep(rtt_ms / 1000)
+
+    SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+    user = _common.owner()
+
+    async def client(seed: int):
+        rnd = random.Random(seed)
+        async with SessionLocal() as db:
+            for i in range(writes):
+                contact_id = rnd.randrange(1, rows + 1)
+                changes = {"additional_data": f"client {seed} write {i}"}
+                if full:
+                    changes.update(first_name=f"first{i}", last_name=f"last{i}", phone_number=f"+380{i:09d}",
+                                   birthday=date(1990, 1, 1 + i % 28), email=f"contact{contact_id}@example.com")
+                await update(changes, contact_id, user, db)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(seed) for seed in range(clients)))
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return clients * writes / elapsed, statements / (clients * writes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+
+    from src.repository.contacts import update_contact
+    from src.services import birthdays, contact_cache
+
+    contact_cache.redis_client = birthdays.redis_client = _common.MemoryRedis()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "contacts.db")
+        _common.seed_contacts(create_engine(f"sqlite:///{path}"), args.rows)
+        print(f"{args.clients} clients x {args.writes} writes on {args.rows:,} contacts, {args.rtt_ms} ms per statement")
+        for full in (False, True):
+            for name, update in (("select+update", orm_update), ("returning", update_contact)):
+                per_second, statements = asyncio.run(run(path, args.rows, args.clients, args.writes, args.rtt_ms, update, full))
+                label = "full" if full else "partial"
+                print(f"{label:>8} {name:>14}: {per_second:8.1f} writes/s  {statements:4.1f} statements/write")
+
+
+if __name__ == "__main__":
+    main()
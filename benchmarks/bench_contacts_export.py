@@ -0,0 +1,69 @@
+"""
+Stream GET /api/contacts/export in every format and report size, time and peak RSS.
+
+Each format runs in its own process so peak RSS reflects that encoder alone.
+
+    python benchmarks/bench_contacts_export.py --rows 200000
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import _common  # noqa: F401
+
+
+def run_format(fmt: str, gzip: bool, path: str) -> None:
+    import asyncio
+
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from src.repository.contacts import stream_contact_rows
+    from src.schemas import ExportFormat
+    from src.services.contacts_io import EXPORT_ENCODERS, gzip_stream
+
+    async def export():
+        nonlocal total
+        encode = EXPORT_ENCODERS[ExportFormat(fmt)][0]
+        async with async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"))() as db:
+            body = encode(stream_contact_rows(_common.owner(), db))
+            if gzip:
+                body = gzip_stream(body)
+            async for chunk in body:
+                total += len(chunk)
+
+    total = 0
+    start = time.perf_counter()
+    asyncio.run(export())
+    label = fmt + ("+gzip" if gzip else "")
+    print(f"{label:>12}: total {time.perf_counter() - start:7.2f} s  bytes {total:>12,}  "
+          f"peak RSS {_common.peak_rss_mb():8.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--format")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--path")
+    args = parser.parse_args()
+
+    if args.format:
+        run_format(args.format, args.gzip, args.path)
+        return
+
+    from sqlalchemy import create_engine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "contacts.db")
+        _common.seed_contacts(create_engine(f"sqlite:///{path}"), args.rows)
+        print(f"GET /api/contacts/export over {args.rows:,} contacts")
+        for fmt, gzip in (("csv", False), ("csv", True), ("ndjson", False), ("ndjson", True), ("columnar", False)):
+            command = [sys.executable, __file__, "--format", fmt, "--path", path]
+            subprocess.run(command + (["--gzip"] if gzip else []), check=True)
+
+
+if __name__ == "__main__":
+    main()
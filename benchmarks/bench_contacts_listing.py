@@ -0,0 +1,81 @@
+"""
+Compare the old ``.all()`` listing of GET /api/contacts/ with the NDJSON streaming mode.
+
+Each mode runs in its own process so peak RSS is not polluted by the other one.
+Time to first byte is the time until the first chunk of the response body is ready.
+
+    python benchmarks/bench_contacts_listing.py --rows 200000
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import _common  # noqa: F401
+
+
+def run_mode(mode: str, path: str) -> None:
+    import asyncio
+    from typing import List
+
+    from pydantic import TypeAdapter
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from src.database.models import Contact
+    from src.repository.contacts import stream_contact_rows
+    from src.services.contacts_io import encode_ndjson
+    from src.schemas import ResponseContact
+
+    async def stream():
+        nonlocal first_byte, total
+        async with async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"))() as db:
+            async for chunk in encode_ndjson(stream_contact_rows(_common.owner(), db)):
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                total += len(chunk)
+
+    start = time.perf_counter()
+    first_byte = None
+    total = 0
+    if mode == "all":
+        # What FastAPI does with response_model=List[ResponseContact] on the whole table
+        db = sessionmaker(bind=create_engine(f"sqlite:///{path}"))()
+        contacts = db.query(Contact).all()
+        adapter = TypeAdapter(List[ResponseContact])
+        body = adapter.dump_json(adapter.validate_python(contacts, from_attributes=True))
+        first_byte = time.perf_counter() - start
+        total = len(body)
+    else:
+        asyncio.run(stream())
+    elapsed = time.perf_counter() - start
+    print(f"{mode:>6}: ttfb {first_byte * 1000:9.1f} ms  total {elapsed:7.2f} s  "
+          f"bytes {total:>12,}  peak RSS {_common.peak_rss_mb():8.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--mode", choices=["all", "stream"])
+    parser.add_argument("--path")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.path)
+        return
+
+    from sqlalchemy import create_engine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "contacts.db")
+        _common.seed_contacts(create_engine(f"sqlite:///{path}"), args.rows)
+        print(f"GET /api/contacts/ over {args.rows:,} contacts")
+        for mode in ("all", "stream"):
+            subprocess.run([sys.executable, __file__, "--mode", mode, "--path", path], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Emails per second for ``--emails`` queued confirmation emails: one SMTP connection per email, as
+fastapi_mail's send_message opens, against the outbox worker with ``--connections`` pooled connections.
+
+The mail server is a minimal SMTP sink in this process that accepts everything. A real server costs a
+TLS handshake and a login on every new connection, so ``--connect-ms`` delays the greeting by that much.
+Both sides send with the same number of concurrent connections; the worker also claims and finishes
+every email in a SQLite outbox.
+
+    python benchmarks/bench_email_outbox.py --emails 10000 --connections 2 --connect-ms 50
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import _common
+
+
+class SMTPSink:
+    """Speaks just enough SMTP for aiosmtplib: EHLO, MAIL, RCPT, DATA, RSET, NOOP and QUIT."""
+
+    def __init__(self, connect_ms: float):
+        self.connect_ms = connect_ms
+        self.connections = 0
+        self.messages = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        await asyncio.sleep(self.connect_ms / 1000)
+        writer.write(b"220 sink ESMTP\r\n")
+        while line := await reader.readline():
+            command = line[:4].upper()
+            if command == b"EHLO":
+                writer.write(b"250-sink\r\n250 8BITMIME\r\n")
+            elif command == b"DATA":
+                writer.write(b"354 go ahead\r\n")
+                await reader.readuntil(b"\r\n.\r\n")
+                self.messages += 1
+                writer.write(b"250 queued\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 bye\r\n")
+                break
+            else:
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+        await writer.drain()
+        writer.close()
+
+
+def queue(path: str, emails: int):
+    from sqlalchemy import create_engine
+
+    from src.database.models import EmailOutbox
+
+    engine = create_engine(f"sqlite:///{path}")
+    _common.create_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(EmailOutbox.__table__.insert(), [
+            {"recipient": f"user{i}@example.com", "subject": "Confirm your email ", "template": "email_template.html",
+             "context": {"host": "http://localhost:8000/", "username": f"user{i}", "token": "x" * 160}}
+            for i in range(emails)])
+    engine.dispose()
+
+
+async def per_message(path: str, port: int, connections: int) -> int:
+    # What the background task did before: render, connect, send and quit for every email
+    import aiosmtplib
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from src.database.models import EmailOutbox
+    from src.repository.outbox import CLAIM_COLUMNS, QueuedEmail
+    from src.services.email import render_email
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.connect() as conn:
+        emails = [QueuedEmail(*row) for row in await conn.execute(select(*CLAIM_COLUMNS))]
+    await engine.dispose()
+    slots = asyncio.Semaphore(connections)
+
+    async def send(email):
+        async with slots:
+            await aiosmtplib.send(render_email(email), hostname="127.0.0.1", port=port)
+
+    await asyncio.gather(*(send(email) for email in emails))
+    return len(emails)
+
+
+async def pooled(path: str, port: int, connections: int) -> int:
+    import aiosmtplib
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from src.services.email import send_outbox_batch
+    from src.services.smtp import RateLimit, SMTPPool
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    pool = SMTPPool(connections, client=lambda: aiosmtplib.SMTP(hostname="127.0.0.1", port=port))
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    rate = RateLimit(0)
+    sent = 0
+    while claimed := await send_outbox_batch(pool, rate, session_factory):
+        sent += claimed
+    await pool.close()
+    await engine.dispose()
+    return sent
+
+
+async def run(name: str, send, path: str, connections: int, connect_ms: float):
+    sink = SMTPSink(connect_ms)
+    server = await asyncio.start_server(sink.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    start = time.perf_counter()
+    count = await send(path, port, connections)
+    elapsed = time.perf_counter() - start
+    server.close()
+    assert sink.messages == count, (sink.messages, count)
+    print(f"{name:>12}: {elapsed:7.2f} s  {count / elapsed:8.1f} emails/s  {sink.connections:>6} connections")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=10_000)
+    parser.add_argument("--connections", type=int, default=2)
+    parser.add_argument("--connect-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    from src.conf.config import settings
+
+    settings.email_rate_per_minute = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "outbox.db")
+        print(f"{args.emails} emails, {args.connections} connections, {args.connect_ms} ms per connect")
+        queue(path, args.emails)
+        asyncio.run(run("per-message", per_message, path, args.connections, args.connect_ms))
+        asyncio.run(run("pooled", pooled, path, args.connections, args.connect_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Render time per email for a ``--recipients`` batch of confirmation emails: fastapi_mail's
+template_name path, which builds a Jinja environment and loads the template for every email,
+against a cached compiled template and the prerendered EmailTemplates.
+
+    python benchmarks/bench_email_templates.py --recipients 10000
+"""
+import argparse
+import time
+
+import _common
+
+
+def timed(label: str, render, contexts: list) -> None:
+    start = time.perf_counter()
+    for context in contexts:
+        render(context)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>22}: {elapsed:7.3f} s  {elapsed / len(contexts) * 1e6:8.1f} us/email")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=10_000)
+    args = parser.parse_args()
+
+    from src.services.email import conf
+    from src.services.email_templates import EmailTemplates
+
+    name = "email_template.html"
+    contexts = [{"host": "http://localhost:8000/", "username": f"user{i}", "token": f"{i:x}" * 20}
+                for i in range(args.recipients)]
+    cached = conf.template_engine().get_template(name)
+    templates = EmailTemplates(conf.TEMPLATE_FOLDER)
+
+    print(f"{args.recipients} recipients of {name}")
+    timed("environment per email", lambda context: conf.template_engine().get_template(name).render(**context),
+          contexts)
+    timed("cached template", lambda context: cached.render(**context), contexts)
+    timed("EmailTemplates", lambda context: templates.render(name, context), contexts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Concurrent logins per second with bcrypt on the event loop vs on the hashing pool.
+
+Besides throughput it measures how long a trivial coroutine (a cheap request on the same
+worker) waits for the event loop while the logins are running.
+
+    python benchmarks/bench_password_hashing.py --logins 32
+"""
+import argparse
+import asyncio
+import time
+
+import _common  # noqa: F401
+
+
+async def probe_loop(stop: asyncio.Event, delays: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        delays.append(time.perf_counter() - start - 0.01)
+
+
+async def run(verify, logins: int, hashed: str):
+    stop, delays = asyncio.Event(), []
+    probe = asyncio.create_task(probe_loop(stop, delays))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(verify("123456789", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    assert all(results)
+    return elapsed, max(delays)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32)
+    args = parser.parse_args()
+
+    from src.services.auth import auth_service
+
+    hashed = auth_service.pwd_context.hash("123456789")
+
+    async def blocking(password, hashed_password):
+        return auth_service.pwd_context.verify(password, hashed_password)
+
+    print(f"{args.logins} concurrent logins, {auth_service.hash_executor._max_workers} hashing workers")
+    for name, verify in (("before", blocking), ("after", auth_service.verify_password)):
+        elapsed, stall = asyncio.run(run(verify, args.logins, hashed))
+        print(f"{name:>6}: {args.logins / elapsed:6.1f} logins/s  worst event loop stall {stall * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Requests per second and bytes on the wire of GET /api/contacts/?limit=5000 over 5k contacts,
+with the fast JSON response class and the gzip middleware switched on and off.
+
+The switches are the FAST_JSON_RESPONSE and RESPONSE_COMPRESSION settings, read when ``main`` is
+imported, so every combination runs in its own process. The client runs in-process, so the numbers
+show server CPU only; the byte counts show what compression saves on a real network.
+
+    python benchmarks/bench_response_encoding.py --rows 5000 --requests 50
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import _common
+
+MODES = {
+    "plain": {"FAST_JSON_RESPONSE": "false", "RESPONSE_COMPRESSION": "false"},
+    "fast json": {"FAST_JSON_RESPONSE": "true", "RESPONSE_COMPRESSION": "false"},
+    "gzip": {"FAST_JSON_RESPONSE": "false", "RESPONSE_COMPRESSION": "true"},
+    "fast json+gzip": {"FAST_JSON_RESPONSE": "true", "RESPONSE_COMPRESSION": "true"},
+}
+
+
+def run_mode(mode: str, rows: int, requests: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        client, headers = _common.app_client(str(Path(tmp) / "contacts.db"), rows)
+        headers["Accept-Encoding"] = "gzip"
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.get("/api/contacts/", params={"limit": rows}, headers=headers)
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text[:300]
+        print(f"{mode:>15}: {_common.latency_summary(samples)}  bytes {response.num_bytes_downloaded:>10,}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--mode", choices=MODES)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.rows, args.requests)
+        return
+
+    print(f"GET /api/contacts/?limit={args.rows} over {args.rows:,} contacts, {args.requests} requests")
+    for mode, env in MODES.items():
+        command = [sys.executable, __file__, "--mode", mode, "--rows", str(args.rows),
+                   "--requests", str(args.requests)]
+        subprocess.run(command, env={**os.environ, **env}, check=True)
+
+
+if __name__ == "__main__":
+    main()
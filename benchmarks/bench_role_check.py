@@ -0,0 +1,60 @@
+"""
+Latency of GET /api/contacts/{id} with the old and the new RoleChecker.
+
+"before" overrides the role check with the previous implementation (five debug prints per request,
+stdout sent to /dev/null), "after" is the current one that logs at DEBUG level only when enabled.
+
+    python benchmarks/bench_role_check.py --requests 2000
+"""
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import _common
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    from fastapi import Depends, HTTPException, Request
+
+    from main import app
+    from src.database.models import User
+    from src.routes.contacts import allowed_get_contacts
+    from src.services.auth import auth_service
+
+    async def legacy_role_check(request: Request, current_user: User = Depends(auth_service.get_current_user)):
+        print(request.method)
+        print(request.url)
+        if request.method in ['POST', 'PUT', 'PATCH']:
+            print(await request.json())
+        print(current_user.roles)
+        print(allowed_get_contacts.allowed_roles)
+        if current_user.roles not in allowed_get_contacts.allowed_roles:
+            raise HTTPException(status_code=403, detail='Operation forbidden')
+        return current_user
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        client, headers = _common.app_client(str(Path(tmp) / "contacts.db"), contacts=100)
+        for name, override in (("before", legacy_role_check), ("after", None)):
+            if override:
+                app.dependency_overrides[allowed_get_contacts] = override
+            else:
+                app.dependency_overrides.pop(allowed_get_contacts, None)
+            samples = []
+            with contextlib.redirect_stdout(devnull):
+                for i in range(args.requests):
+                    start = time.perf_counter()
+                    response = client.get(f"/api/contacts/{i % 100 + 1}", headers=headers)
+                    samples.append(time.perf_counter() - start)
+                    assert response.status_code == 200, response.text
+            print(f"{name:>6}: {_common.latency_summary(samples[100:])}")
+
+
+if __name__ == "__main__":
+    main()
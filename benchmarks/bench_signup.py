@@ -0,0 +1,90 @@
+"""
+Signup throughput. First the user write on its own: the old create_user, which built the Gravatar URL
+and read the user back after the INSERT, against the single INSERT ... RETURNING, with ``--rtt-ms``
+added to every statement to stand in for the round-trip to a database server.
+Then POST /api/auth/signup end to end through the real application on SQLite, bcrypt and the
+confirmation email in the outbox included.
+
+    python benchmarks/bench_signup.py --users 2000 --signups 200 --rtt-ms 0.5
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import _common
+
+
+async def old_create_user(body, db):
+    # create_user before: Gravatar at signup, then a SELECT to refresh the new user
+    from libgravatar import Gravatar
+
+    from src.database.models import User
+
+    new_user = User(**body.model_dump(), avatar=Gravatar(body.email).get_image())
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    return new_user
+
+
+async def run_writes(path: str, users: int, rtt_ms: float, create, offset: int):
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from src.schemas import UserModel
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    statements = 0
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count(*args):
+        nonlocal statements
+        statements += 1
+        time.sleep(rtt_ms / 1000)
+
+    SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    bodies = [UserModel(username=f"user{offset + i:06d}", email=f"user{offset + i}@example.com", password="123456")
+              for i in range(users)]
+    start = time.perf_counter()
+    for body in bodies:
+        async with SessionLocal() as db:
+            await create(body, db)
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return users / elapsed, statements / users
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--signups", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+
+    from src.repository.users import create_user
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "users.db")
+        _common.create_schema(create_engine(f"sqlite:///{path}"))
+        print(f"{args.users} users, {args.rtt_ms} ms per statement")
+        for offset, (name, create) in enumerate((("gravatar+refresh", old_create_user), ("insert", create_user))):
+            per_second, statements = asyncio.run(run_writes(path, args.users, args.rtt_ms, create,
+                                                            offset * args.users))
+            print(f"{name:>17}: {per_second:8.1f} users/s  {statements:4.1f} statements/user")
+
+        client, _ = _common.app_client(str(Path(tmp) / "signup.db"))
+        start = time.perf_counter()
+        for i in range(args.signups):
+            response = client.post("/api/auth/signup", json={"username": f"signup{i:05d}",
+                                                             "email": f"signup{i}@example.com", "password": "123456"})
+            assert response.status_code == 201, response.text
+        elapsed = time.perf_counter() - start
+        print(f"{'POST /auth/signup':>17}: {args.signups / elapsed:8.1f} signups/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Cost of the auth dependency with and without the decoded-claims cache.
+
+"without" verifies the JWT signature on every request, "with" goes through Auth.decode_token.
+Both resolve the user from the local user cache, as a warm worker does for a busy SPA client.
+
+    python benchmarks/bench_token_cache.py --iterations 50000
+"""
+import argparse
+import asyncio
+import time
+
+import _common  # noqa: F401
+
+
+async def main(iterations: int) -> None:
+    from jose import jwt
+
+    from src.database.models import Roles, User
+    from src.services.auth import auth_service
+    from src.services.cache import token_cache, user_cache
+
+    email = "deadpool@example.com"
+    user_cache.set(email, User(id=1, username="deadpool", email=email, roles=Roles.admin), ttl=3600)
+    token = await auth_service.create_access_token({"sub": email}, expires_delta=7200)
+
+    def decode_uncached(value):
+        return jwt.decode(value, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM])
+
+    for name, decode in (("without", decode_uncached), ("with", auth_service.decode_token)):
+        token_cache.clear()
+        auth_service.decode_token = decode
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await auth_service.get_current_user(token=token, db=None)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>7} claims cache: {elapsed / iterations * 1e6:7.1f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=50_000)
+    asyncio.run(main(parser.parse_args().iterations))
@@ -0,0 +1,91 @@
+"""
+Compare the old raw-date filter of get_upcoming_birthdays with the indexed birthday_md query.
+
+Prints the query plan of both and the median latency over a normal and a Dec -> Jan window.
+
+    python benchmarks/bench_upcoming_birthdays.py --rows 1000000
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import _common  # noqa: F401
+
+
+def explain(conn, stmt) -> str:
+    from sqlalchemy import text
+
+    sql = str(stmt.compile(conn.engine, compile_kwargs={"literal_binds": True}))
+    return "; ".join(row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql)))
+
+
+async def timed(run_query, repeats: int) -> tuple:
+    samples, found = [], 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        found = await run_query()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, found
+
+
+async def run(path: str, repeats: int) -> None:
+    from sqlalchemy import create_engine, func, or_, select
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from src.database.models import Contact, birthday_md
+    from src.repository.contacts import get_upcoming_birthdays
+
+    def old_filter(today: date):
+        now = datetime.combine(today, datetime.min.time())
+        return Contact.birthday >= now, Contact.birthday <= now + timedelta(days=7)
+
+    def new_filter(today: date):
+        start, end = birthday_md(today), birthday_md(today + timedelta(days=7))
+        if start <= end:
+            return Contact.birthday_md.between(start, end),
+        return or_(Contact.birthday_md >= start, Contact.birthday_md <= end),
+
+    async with async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"))() as db:
+        async def count(where):
+            return await db.scalar(select(func.count()).select_from(Contact).where(*where))
+
+        async def fetch(today):
+            return len(await get_upcoming_birthdays(_common.owner(), db, today, 7))
+
+        for today in (date(2023, 10, 17), date(2023, 12, 28)):
+            old_ms, old_found = await timed(lambda: count(old_filter(today)), repeats)
+            new_ms, new_found = await timed(lambda: count(new_filter(today)), repeats)
+            orm_ms, _ = await timed(lambda: fetch(today), repeats)
+            print(f"window from {today}:")
+            print(f"  count, raw birthday  {old_ms:8.1f} ms  found {old_found:>6,}")
+            print(f"  count, birthday_md   {new_ms:8.1f} ms  found {new_found:>6,}")
+            print(f"  get_upcoming_birthdays with ORM objects {orm_ms:8.1f} ms")
+
+        with create_engine(f"sqlite:///{path}").connect() as conn:
+            for label, today in (("raw birthday", None), ("birthday_md", date(2023, 10, 17)),
+                                 ("birthday_md wrap", date(2023, 12, 28))):
+                where = old_filter(date(2023, 10, 17)) if today is None else new_filter(today)
+                print(f"EXPLAIN {label + ':':<18}", explain(conn, select(Contact).where(*where)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "contacts.db")
+        _common.seed_contacts(create_engine(f"sqlite:///{path}"), args.rows)
+        print(f"GET /api/contacts/upcoming_birthdays/ over {args.rows:,} contacts")
+        asyncio.run(run(path, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
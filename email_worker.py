@@ -0,0 +1,14 @@
+"""
+The email worker: sends the emails the application queues in the outbox table.
+It runs next to the API as its own process; several workers can share one Postgres outbox.
+
+    python email_worker.py
+"""
+import asyncio
+import logging
+
+from src.services.email import run_email_outbox
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_email_outbox())
@@ -1,16 +1,26 @@
+import asyncio
+import os
 import time
 
-import redis.asyncio as redis
 import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, status, Request
 from fastapi_limiter import FastAPILimiter
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
 from sqlalchemy import text
-from sqlalchemy.orm import Session
-from src.database.connect import get_db
-from src.routes import contacts, auth, users
-
-app = FastAPI()
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.conf.config import settings
+from src.database.connect import get_db, redis_client
+from src.repository.contacts import refresh_birthday_digest
+from src.routes import contacts, auth, users, metrics
+from src.services.birthdays import run_birthday_digest
+from src.services.cache import listen_user_invalidations
+from src.services.etags import GZipETagMiddleware
+from src.services.responses import FastJSONResponse
+
+app = FastAPI(default_response_class=FastJSONResponse if settings.fast_json_response else JSONResponse)
 
 origins = [
     "http://localhost:3000", "http://127.0.0.1:5500"
@@ -24,6 +34,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.response_compression:
+    # Responses that already set Content-Encoding, like the contacts export, are passed through untouched
+    app.add_middleware(GZipMiddleware, minimum_size=settings.compression_minimum_size,
+                       compresslevel=settings.compression_level)
+    app.add_middleware(GZipETagMiddleware)
+
+if settings.avatar_storage == "local":
+    os.makedirs(settings.avatar_local_dir, exist_ok=True)
+    app.mount(settings.avatar_local_url, StaticFiles(directory=settings.avatar_local_dir), name="avatars")
+
 
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
@@ -53,8 +73,22 @@ async def startup():
     :return: A fastapi limiter instance
     :doc-author: Trelent
     """
-    r = await redis.Redis(host='localhost', port=6379, db=0, encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(r)
+    await FastAPILimiter.init(redis_client)
+    app.state.user_invalidations = asyncio.create_task(listen_user_invalidations())
+    app.state.birthday_digest = asyncio.create_task(run_birthday_digest(refresh_birthday_digest))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function is called when the application stops.
+    It stops the background listener of user cache invalidations and the birthday digest job.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    app.state.user_invalidations.cancel()
+    app.state.birthday_digest.cancel()
 
 
 @app.get("/")
@@ -73,19 +107,19 @@ def read_root():
 
 
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     """
     The healthchecker function is a simple function that checks the health of the database.
     It does this by making a request to the database and checking if it returns any results.
     If it doesn't, then we know there's an issue with our connection.
 
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A dictionary with a message
     :doc-author: Trelent
     """
     try:
         # Make request
-        result = db.execute(text("SELECT 1")).fetchone()
+        result = (await db.execute(text("SELECT 1"))).fetchone()
         print(result)
         if result is None:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -100,6 +134,7 @@ def healthchecker(db: Session = Depends(get_db)):
 app.include_router(auth.router, prefix='/api')
 app.include_router(contacts.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
+app.include_router(metrics.router, prefix='/api')
 
 if __name__ == '__main__':
     uvicorn.run(app="main:app", reload=True)
@@ -0,0 +1,26 @@
+"""add users tokens_revoked_at
+
+Revision ID: a3c5e9d2b8f1
+Revises: f2a6d0b84c19
+Create Date: 2026-10-17 18:12:37.408215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e9d2b8f1'
+down_revision: Union[str, None] = 'f2a6d0b84c19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('tokens_revoked_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'tokens_revoked_at')
@@ -0,0 +1,34 @@
+"""add contacts birthday_md
+
+Revision ID: b7d2c41e9a10
+Revises: 5e77f24e49c9
+Create Date: 2026-10-17 10:12:41.308215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2c41e9a10'
+down_revision: Union[str, None] = '5e77f24e49c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_md', sa.SmallInteger(), nullable=True))
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE contacts SET birthday_md = CAST(strftime('%m%d', birthday) AS INTEGER) "
+                   "WHERE birthday IS NOT NULL")
+    else:
+        op.execute("UPDATE contacts SET birthday_md = EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday) "
+                   "WHERE birthday IS NOT NULL")
+    op.create_index(op.f('ix_contacts_birthday_md'), 'contacts', ['birthday_md'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_contacts_birthday_md'), table_name='contacts')
+    op.drop_column('contacts', 'birthday_md')
@@ -0,0 +1,39 @@
+"""add contacts trigram indexes
+
+Revision ID: c41f8e2d7b35
+Revises: b7d2c41e9a10
+Create Date: 2026-10-17 11:03:27.554190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f8e2d7b35'
+down_revision: Union[str, None] = 'b7d2c41e9a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGRAM_INDEXES = {
+    'ix_contacts_first_name_lower_trgm': 'lower(first_name)',
+    'ix_contacts_last_name_lower_trgm': 'lower(last_name)',
+    'ix_contacts_email_lower_trgm': 'lower(email)',
+    'ix_contacts_phone_number_trgm': 'phone_number',
+}
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, expression in TRIGRAM_INDEXES.items():
+        op.execute(f'CREATE INDEX {name} ON contacts USING gin ({expression} gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        op.drop_index(name, table_name='contacts')
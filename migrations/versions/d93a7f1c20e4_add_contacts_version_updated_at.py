@@ -0,0 +1,35 @@
+"""add contacts version and updated_at
+
+Revision ID: d93a7f1c20e4
+Revises: c41f8e2d7b35
+Create Date: 2026-10-17 12:21:05.873412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd93a7f1c20e4'
+down_revision: Union[str, None] = 'c41f8e2d7b35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    # SQLite cannot add a column with a non-constant default, so updated_at is filled in, then made NOT NULL
+    op.add_column('contacts', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE contacts SET updated_at = CURRENT_TIMESTAMP")
+    else:
+        op.execute("UPDATE contacts SET updated_at = timezone('utc', now())")
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column('contacts', 'updated_at')
+    op.drop_column('contacts', 'version')
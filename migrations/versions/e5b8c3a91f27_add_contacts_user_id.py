@@ -0,0 +1,92 @@
+"""add contacts user_id
+
+Revision ID: e5b8c3a91f27
+Revises: d93a7f1c20e4
+Create Date: 2026-10-17 13:48:52.106337
+
+Contacts get an owner. Existing contacts are given to the first admin (or the first user if there is
+no admin), in batches that each commit on their own, so the table is never locked for the whole backfill.
+On Postgres the foreign key and NOT NULL are validated without blocking writes, and the indexes are
+built CONCURRENTLY.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8c3a91f27'
+down_revision: Union[str, None] = 'd93a7f1c20e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10_000
+OWNER_INDEXES = {
+    'ix_contacts_user_id_id': (['user_id', 'id'], False),
+    'ix_contacts_user_id_first_name': (['user_id', 'first_name'], False),
+    'ix_contacts_user_id_last_name': (['user_id', 'last_name'], False),
+    'ix_contacts_user_id_email': (['user_id', 'email'], True),
+    'ix_contacts_user_id_birthday_md': (['user_id', 'birthday_md'], False),
+}
+# Superseded by the owner indexes; email is now unique per owner only
+GLOBAL_INDEXES = {
+    'ix_contacts_email': (['email'], True),
+    'ix_contacts_first_name': (['first_name'], False),
+    'ix_contacts_last_name': (['last_name'], False),
+}
+
+
+def backfill_owner(bind) -> None:
+    owner = bind.execute(sa.text(
+        "SELECT id FROM users ORDER BY CASE WHEN role = 'admin' THEN 0 ELSE 1 END, id LIMIT 1")).scalar()
+    if owner is None:
+        if bind.execute(sa.text("SELECT 1 FROM contacts LIMIT 1")).first() is not None:
+            raise RuntimeError("Contacts need an owner: create a user before running this migration")
+        return
+    batch = sa.text("UPDATE contacts SET user_id = :owner WHERE id IN "
+                    "(SELECT id FROM contacts WHERE user_id IS NULL LIMIT :size)")
+    with op.get_context().autocommit_block():
+        while bind.execute(batch, {"owner": owner, "size": BACKFILL_BATCH_SIZE}).rowcount:
+            pass
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    postgres = bind.dialect.name == 'postgresql'
+    op.add_column('contacts', sa.Column('user_id', sa.Integer(), nullable=True))
+    if postgres:
+        op.execute("ALTER TABLE contacts ADD CONSTRAINT contacts_user_id_fkey FOREIGN KEY (user_id) "
+                   "REFERENCES users (id) ON DELETE CASCADE NOT VALID")
+
+    backfill_owner(bind)
+
+    if postgres:
+        # SET NOT NULL skips its table scan when a validated CHECK already proves it
+        op.execute("ALTER TABLE contacts ADD CONSTRAINT contacts_user_id_not_null CHECK (user_id IS NOT NULL) NOT VALID")
+        op.execute("ALTER TABLE contacts VALIDATE CONSTRAINT contacts_user_id_not_null")
+        op.execute("ALTER TABLE contacts VALIDATE CONSTRAINT contacts_user_id_fkey")
+        op.alter_column('contacts', 'user_id', existing_type=sa.Integer(), nullable=False)
+        op.execute("ALTER TABLE contacts DROP CONSTRAINT contacts_user_id_not_null")
+    else:
+        with op.batch_alter_table('contacts') as batch_op:
+            batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.create_foreign_key('contacts_user_id_fkey', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+
+    with op.get_context().autocommit_block():
+        for name, (columns, unique) in OWNER_INDEXES.items():
+            op.create_index(name, 'contacts', columns, unique=unique, postgresql_concurrently=True)
+        for name in GLOBAL_INDEXES:
+            op.drop_index(name, table_name='contacts', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, (columns, unique) in GLOBAL_INDEXES.items():
+            op.create_index(name, 'contacts', columns, unique=unique, postgresql_concurrently=True)
+        for name in OWNER_INDEXES:
+            op.drop_index(name, table_name='contacts', postgresql_concurrently=True)
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_constraint('contacts_user_id_fkey', type_='foreignkey')
+        batch_op.drop_column('user_id')
@@ -0,0 +1,39 @@
+"""add email outbox
+
+Revision ID: f2a6d0b84c19
+Revises: e5b8c3a91f27
+Create Date: 2026-10-17 15:02:44.190325
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a6d0b84c19'
+down_revision: Union[str, None] = 'e5b8c3a91f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('email_outbox',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('recipient', sa.String(length=250), nullable=False),
+                    sa.Column('subject', sa.String(length=255), nullable=False),
+                    sa.Column('template', sa.String(length=255), nullable=False),
+                    sa.Column('context', sa.JSON(), nullable=False),
+                    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+                    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+                    sa.Column('last_error', sa.String(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_email_outbox_next_attempt_at'), 'email_outbox', ['next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_email_outbox_next_attempt_at'), table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -1,12 +1,18 @@
 from dotenv import load_dotenv
 
+from functools import partial
 from pathlib import Path
+from typing import Dict, List
 import os
 
 import uvicorn
-from fastapi import FastAPI, BackgroundTasks
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from pydantic import EmailStr, BaseModel
+from fastapi import FastAPI, BackgroundTasks, HTTPException, status
+from fastapi_mail import ConnectionConfig
+from pydantic import EmailStr, BaseModel, Field
+
+from src.services.bulk_email import BulkJob, add_job, jobs, run_bulk_job
+from src.services.email_templates import EmailTemplates
+from src.services.smtp import RateLimit, SMTPPool, html_message, smtp_client
 
 load_dotenv()
 
@@ -15,6 +21,17 @@ class EmailSchema(BaseModel):
     email: EmailStr
 
 
+class BulkRecipient(BaseModel):
+    email: EmailStr
+    variables: Dict[str, str | int | float | bool | None] = {}
+
+
+class BulkEmailSchema(BaseModel):
+    subject: str = Field(min_length=1, max_length=255)
+    template: str = "example_email.html"
+    recipients: List[BulkRecipient] = Field(min_length=1, max_length=10_000)
+
+
 conf = ConnectionConfig(
     MAIL_USERNAME=os.environ['MAIL_USERNAME'],
     MAIL_PASSWORD=os.environ['MAIL_PASSWORD'],
@@ -28,10 +45,25 @@ conf = ConnectionConfig(
     VALIDATE_CERTS=True,
     TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
 )
+templates = EmailTemplates(conf.TEMPLATE_FOLDER)
+# Shared by every request and bulk job, so connections are opened once and kept
+pool = SMTPPool(int(os.environ.get('MAIL_CONNECTIONS', 4)), partial(smtp_client, conf))
+rate = RateLimit(int(os.environ.get('MAIL_RATE_PER_MINUTE', 0)))
 
 app = FastAPI()
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function closes the pooled SMTP connections when the application stops.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    await pool.close()
+
+
 @app.post("/send-email")
 async def send_in_background(background_tasks: BackgroundTasks, body: EmailSchema):
     """
@@ -42,19 +74,50 @@ async def send_in_background(background_tasks: BackgroundTasks, body: EmailSchem
     :return: A dictionary and not a response
     :doc-author: Trelent
     """
-    message = MessageSchema(
-        subject="Reset password of user",
-        recipients=[body.email],
-        template_body={"fullname": "Billy Jones", "position": "Bla-Bla"},
-        subtype=MessageType.html
-    )
-
-    fm = FastMail(conf)
+    message = html_message(conf, body.email, "Reset password of user",
+                           templates.render("example_email.html", {"fullname": "Billy Jones", "position": "Bla-Bla"}))
 
-    background_tasks.add_task(fm.send_message, message, template_name="example_email.html")
+    background_tasks.add_task(pool.send, message)
 
     return {"message": "email has been sent"}
 
 
+@app.post("/send-email/bulk", status_code=status.HTTP_202_ACCEPTED)
+async def send_bulk(background_tasks: BackgroundTasks, body: BulkEmailSchema):
+    """
+    The send_bulk function starts sending one template to many recipients, each with their own
+    template variables. The emails go out in the background over the pooled SMTP connections;
+    the returned job id gives the progress and the outcome of every recipient.
+
+    :param background_tasks: BackgroundTasks: Add the job to the background queue
+    :param body: BulkEmailSchema: The subject, the template and the recipients
+    :return: The id of the job and the number of recipients
+    :doc-author: Trelent
+    """
+    if body.template not in templates:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Unknown template")
+    job = BulkJob(body.subject, body.template,
+                  [(recipient.email, recipient.variables) for recipient in body.recipients])
+    add_job(job)
+    background_tasks.add_task(run_bulk_job, job, pool, rate, templates, conf)
+    return {"job_id": job.id, "total": len(body.recipients)}
+
+
+@app.get("/send-email/bulk/{job_id}")
+async def bulk_status(job_id: str):
+    """
+    The bulk_status function reports a bulk job: whether it is queued, running or done,
+    how many emails were sent and failed, and the outcome of every recipient done so far.
+
+    :param job_id: str: The id returned by send_bulk
+    :return: The status of the job
+    :doc-author: Trelent
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job.snapshot()
+
+
 if __name__ == '__main__':
     uvicorn.run('send-email:app', port=8000, reload=True)
@@ -4,6 +4,11 @@ from pydantic import EmailStr
 
 class Settings(BaseSettings):
     sqlalchemy_database_url: str
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
     secret_key_jwt: str
     algorithm: str
     mail_username: str
@@ -11,8 +16,32 @@ class Settings(BaseSettings):
     mail_from: EmailStr
     mail_port: int
     mail_server: str
+    email_smtp_connections: int = 2
+    email_batch_size: int = 100
+    email_rate_per_minute: int = 600
+    email_max_attempts: int = 8
+    email_retry_base: float = 30
+    email_retry_max: float = 3600
+    email_lease_seconds: float = 300
+    email_poll_interval: float = 1
+    password_hash_workers: int = 4
     redis_host: str = "localhost"
     redis_port: int = 6379
+    user_cache_size: int = 1024
+    user_cache_ttl: float = 30
+    token_cache_size: int = 4096
+    contact_cache_ttl: int = 300
+    contact_cache_tombstone_ttl: int = 10
+    contact_batch_limit: int = 1000
+    search_index_users: int = 100
+    search_index_ttl: float = 300
+    birthday_window_days: int = 7
+    birthday_digest_days: int = 31
+    birthday_digest_interval: float = 300
+    fast_json_response: bool = True
+    response_compression: bool = True
+    compression_minimum_size: int = 1024
+    compression_level: int = 6
 
     postgres_db: str
     postgres_user: str
@@ -22,6 +51,12 @@ class Settings(BaseSettings):
     cloudinary_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
+    # "cloudinary", or "local" to keep avatars in avatar_local_dir and serve them from avatar_local_url
+    avatar_storage: str = "cloudinary"
+    avatar_local_dir: str = "static/avatars"
+    avatar_local_url: str = "/static/avatars"
+    avatar_max_bytes: int = 20 * 1024 * 1024
+    avatar_workers: int = 2
 
     class Config:
         env_file = ".env"
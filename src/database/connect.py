@@ -1,18 +1,116 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+
+import redis.asyncio as aioredis
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from src.conf.config import settings
+from src.services.metrics import metrics
 
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long every checkout waited for a free connection
+    in the ``db_pool_wait_seconds`` histogram.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.histogram("db_pool_wait_seconds").observe(time.perf_counter() - start)
+
+
+def async_database_url(url: str) -> str:
+    """
+    The async_database_url function rewrites a database url to use the asyncio driver of its backend,
+    e.g. postgresql://... becomes postgresql+asyncpg://... and sqlite://... becomes sqlite+aiosqlite://...
+    Alembic keeps using the sync url from the settings.
+
+    :param url: str: The database url from the settings
+    :return: The same url with an asyncio driver
+    """
+    url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def engine_options(url: str) -> dict:
+    """
+    The engine_options function builds the pool arguments for create_async_engine from the settings.
+    SQLite keeps the pool SQLAlchemy picks for it, the sizing options only apply to server databases.
+
+    :param url: str: The database url
+    :return: Keyword arguments for create_async_engine
+    """
+    options = {"pool_pre_ping": settings.db_pool_pre_ping}
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+        )
+    return options
+
+
+def instrument_pool(pool):
+    """
+    The instrument_pool function feeds the metrics registry from the pool events:
+    connections currently checked out, checkouts, new connections and invalidations.
+    For queue pools the configured size and the overflow in use are reported as well.
+
+    :param pool: The pool of the engine
+    """
+    checked_out = metrics.gauge("db_pool_checked_out")
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.inc()
+        metrics.counter("db_pool_checkouts").inc()
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out.dec()
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.counter("db_pool_connects").inc()
+
+    @event.listens_for(pool, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.counter("db_pool_invalidations").inc()
+
+    if isinstance(pool, QueuePool):
+        metrics.collector("db_pool", lambda: {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+
+
+engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL), **engine_options(SQLALCHEMY_DATABASE_URL))
+instrument_pool(engine.sync_engine.pool)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+redis_pool = aioredis.ConnectionPool(host=settings.redis_host, port=settings.redis_port, db=0)
+redis_client = aioredis.Redis(connection_pool=redis_pool)
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
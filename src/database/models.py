@@ -1,6 +1,8 @@
 import enum
+from datetime import date, datetime, timezone
 
-from sqlalchemy import Column, Integer, String, Date, DateTime, func, Enum, Boolean
+from sqlalchemy import (Column, Integer, SmallInteger, String, Date, DateTime, func, Enum, Boolean, event, DDL, Index,
+                        ForeignKey, JSON)
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -12,16 +14,71 @@ class Roles(enum.Enum):
     user: str = "user"
 
 
+def birthday_md(birthday: date | None) -> int | None:
+    """
+    The birthday_md function turns a date into its month and day as one sortable number, e.g. 1031 for Oct 31.
+
+    :param birthday: date | None: The birth date
+    :return: month * 100 + day, or None when there is no birthday
+    """
+    if birthday is None:
+        return None
+    return birthday.month * 100 + birthday.day
+
+
+def _default_birthday_md(context) -> int | None:
+    return birthday_md(context.get_current_parameters().get("birthday"))
+
+
+def utcnow() -> datetime:
+    """Naive UTC now, the form the DateTime columns store."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _trigram_index(label: str, expression) -> Index:
+    # GIN trigram indexes serve LIKE 'prefix%' and the % similarity operator; pg_trgm exists on Postgres only
+    return Index(f"ix_contacts_{label}_trgm", expression.label(label), postgresql_using="gin",
+                 postgresql_ops={label: "gin_trgm_ops"}).ddl_if(dialect="postgresql")
+
+
 class Contact(Base):
     __tablename__ = "contacts"
 
     id = Column(Integer, primary_key=True, index=True)
-    first_name = Column(String, index=True, nullable=False)
-    last_name = Column(String, index=True, nullable=False)
-    email = Column(String, unique=True, index=True, nullable=False)
+    first_name = Column(String, nullable=False)
+    last_name = Column(String, nullable=False)
+    email = Column(String, nullable=False)
     phone_number = Column(String, nullable=False)
     birthday = Column(Date, nullable=True)
+    # Denormalised month/day of ``birthday`` so upcoming birthdays are an index range scan
+    birthday_md = Column(SmallInteger, index=True, nullable=True, default=_default_birthday_md)
     additional_data = Column(String, nullable=True)
+    # Row validators for conditional GETs: version is bumped and updated_at set by every update
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+    # Every query is scoped to the owner, so the owner leads the indexes and each user reads a small index range
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+        Index("ix_contacts_user_id_first_name", "user_id", "first_name"),
+        Index("ix_contacts_user_id_last_name", "user_id", "last_name"),
+        Index("ix_contacts_user_id_email", "user_id", "email", unique=True),
+        Index("ix_contacts_user_id_birthday_md", "user_id", "birthday_md"),
+        _trigram_index("first_name_lower", func.lower(first_name)),
+        _trigram_index("last_name_lower", func.lower(last_name)),
+        _trigram_index("email_lower", func.lower(email)),
+        _trigram_index("phone_number", phone_number),
+    )
+
+
+event.listen(Contact.__table__, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+
+@event.listens_for(Contact.birthday, "set")
+def _sync_birthday_md(contact, value, oldvalue, initiator):
+    contact.birthday_md = birthday_md(value) if isinstance(value, date) else None
 
 
 class User(Base):
@@ -33,5 +90,25 @@ class User(Base):
     created_at = Column('created_at', DateTime, default=func.now())
     avatar = Column(String(255), nullable=True)
     refresh_token = Column(String(255), nullable=True)
+    # Access tokens issued before this moment are rejected, set when update_token clears the refresh token
+    tokens_revoked_at = Column(DateTime, nullable=True)
     roles = Column('role', Enum(Roles), default=Roles.user)
     confirmed = Column(Boolean, default=False)
+
+
+class EmailOutbox(Base):
+    """
+    Emails waiting to be sent by the email worker. A row is deleted once its message is sent; a row whose
+    next_attempt_at is NULL was given up on and keeps the last error for inspection.
+    """
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String(250), nullable=False)
+    subject = Column(String(255), nullable=False)
+    template = Column(String(255), nullable=False)
+    context = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    # When the worker may claim the message next; claiming pushes it forward by a lease
+    next_attempt_at = Column(DateTime, nullable=True, default=utcnow, index=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
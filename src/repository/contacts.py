@@ -1,176 +1,628 @@
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, NamedTuple, Set, Tuple
 
 from pydantic import EmailStr
-from sqlalchemy.orm import Session
-
-from src.database.models import Contact
-from src.schemas import ContactModel, ResponseContact
+from sqlalchemy import and_, bindparam, case, delete, false, func, literal, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import Contact, User, birthday_md, utcnow
+from src.schemas import ContactModel, ContactRow, contact_row_adapter
+from src.services import contact_cache
+from src.services.birthdays import (
+    acquire_rebuild_lock,
+    birthday_window,
+    contact_row,
+    digest_is_current,
+    forget_birthday,
+    forget_birthdays,
+    index_birthday,
+    index_birthdays,
+    invalidate_birthday_digest,
+    materialize_birthdays,
+    pop_changed_contacts,
+    reapply_birthdays,
+    release_rebuild_lock,
+)
+from src.services.contact_cache import ContactSnapshot, make_snapshot
+from src.services.etags import ContactVersion, Validator, make_validator
+from src.services.search import contact_indexes
+
+CONTACT_COLUMNS = (
+    Contact.id,
+    Contact.first_name,
+    Contact.last_name,
+    Contact.phone_number,
+    Contact.birthday,
+    Contact.email,
+    Contact.additional_data,
+)
+CONTACT_FIELDS = tuple(column.key for column in CONTACT_COLUMNS)
+VALIDATOR_COLUMNS = (Contact.id, Contact.version, Contact.updated_at)
+VERSIONED_COLUMNS = (*CONTACT_COLUMNS, Contact.version, Contact.updated_at)
+
+
+class VersionedContact(NamedTuple):
+    """A contact and the version its ETag carries, as the batch routes send it."""
+    contact: ContactRow
+    version: ContactVersion
+
+
+class ValidatedContacts(NamedTuple):
+    """Contacts read for a list route, and the validator of the list."""
+    contacts: List[ContactRow]
+    validator: Validator
+
+
+def _versioned(row) -> VersionedContact:
+    *columns, version, updated_at = row
+    return VersionedContact(dict(zip(CONTACT_FIELDS, columns)), ContactVersion(version, updated_at))
+
+
+async def _fetch_rows(stmt, db: AsyncSession) -> List[ContactRow]:
+    result = await db.execute(stmt)
+    return [dict(zip(CONTACT_FIELDS, row)) for row in result]
+
+
+async def _fetch_validated(stmt, db: AsyncSession) -> ValidatedContacts:
+    # The rows come with their versions and update times, so the validator is the one _get_validator
+    # would compute, without a second round-trip
+    contacts, id_sum, version_sum, last_modified = [], 0, 0, None
+    for *columns, version, updated_at in await db.execute(stmt):
+        contact = dict(zip(CONTACT_FIELDS, columns))
+        contacts.append(contact)
+        id_sum += contact["id"]
+        version_sum += version
+        if last_modified is None or updated_at > last_modified:
+            last_modified = updated_at
+    return ValidatedContacts(contacts, make_validator(len(contacts), id_sum, version_sum, last_modified))
+
+
+async def _get_validator(stmt, db: AsyncSession) -> Validator:
+    # One aggregate row over the selected contacts; the contacts themselves are never sent to the application
+    rows = stmt.subquery()
+    result = await db.execute(select(func.count(), func.sum(rows.c.id), func.sum(rows.c.version),
+                                     func.max(rows.c.updated_at)))
+    return make_validator(*result.one())
+
+
+def _owned(columns, user: User):
+    return select(*columns).where(Contact.user_id == user.id)
+
+
+def _page(columns, user: User, limit: int, after: int | None):
+    stmt = _owned(columns, user)
+    if after is not None:
+        stmt = stmt.where(Contact.id > after)
+    return stmt.order_by(Contact.id).limit(limit)
+
+
+async def get_contacts(user: User, db: AsyncSession, limit: int = 100,
+                       after: int | None = None) -> ValidatedContacts:
+    """
+    The get_contacts function returns one page of the user's contacts ordered by id.
+        Pagination is keyset based: the caller passes the id of the last contact it has seen
+        and gets the next ``limit`` contacts, so every page is a range scan on the (user_id, id) index.
+        The page is read with the versions and update times of its contacts, which give its ETag.
+
+    :param user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session into the function
+    :param limit: int: Maximum number of contacts in the page
+    :param after: int | None: Id of the last contact of the previous page
+    :return: The contact rows and the validator of the page
+    :doc-author: Trelent
+    """
+    return await _fetch_validated(_page(VERSIONED_COLUMNS, user, limit, after), db)
 
 
-async def get_contacts(db: Session):
+async def get_contacts_validator(user: User, db: AsyncSession, limit: int = 100,
+                                 after: int | None = None) -> Validator:
     """
-    The get_contacts function returns a list of all contacts in the database.
+    The get_contacts_validator function returns the ETag of the page get_contacts would return,
+        computed by the database from the ids, versions and update times of the page without loading it.
+        It is what a conditional request is checked against before the page is read.
+
+    :param user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session into the function
+    :param limit: int: Maximum number of contacts in the page
+    :param after: int | None: Id of the last contact of the previous page
+    :return: The validator of the page
+    :doc-author: Trelent
+    """
+    return await _get_validator(_page(VALIDATOR_COLUMNS, user, limit, after), db)
 
 
-    :param db: Session: Pass the database session into the function
-    :return: A list of contacts
+async def stream_contact_rows(user: User, db: AsyncSession, after: int | None = None, batch_size: int = 1000):
+    """
+    The stream_contact_rows function yields all the user's contacts ordered by id without loading them all.
+        It selects the contact columns with a core select, so no ORM objects are built, and reads them
+        from a server-side cursor ``batch_size`` rows at a time; memory stays constant no matter how many there are.
+
+    :param user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session into the function
+    :param after: int | None: Id of the last contact already exported
+    :param batch_size: int: Number of rows fetched from the cursor per round-trip
+    :return: An async iterator of lists of rows, in CONTACT_COLUMNS order
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).all()
-    return contacts
+    stmt = _owned(CONTACT_COLUMNS, user)
+    if after is not None:
+        stmt = stmt.where(Contact.id > after)
+    result = await db.stream(stmt.order_by(Contact.id).execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield rows
+
 
+async def _fetch_snapshot(criterion, user: User, db: AsyncSession) -> ContactSnapshot | None:
+    result = await db.execute(_owned(VERSIONED_COLUMNS, user).where(criterion))
+    row = result.first()
+    if row is None:
+        return None
+    *columns, version, updated_at = row
+    contact = dict(zip(CONTACT_FIELDS, columns))
+    return make_snapshot(version, updated_at, contact_row_adapter.dump_json(contact))
 
-async def get_contact(contact_id: int, db):
+
+async def get_contact_snapshot(contact_id: int, user: User, db: AsyncSession) -> ContactSnapshot | None:
     """
-    The get_contact function returns a contact object from the database.
-        Args:
-            contact_id (int): The id of the contact to be returned.
-            db (object): A connection to the database.
+    The get_contact_snapshot function returns one contact ready to send: its ETag, Last-Modified and JSON body.
+        It reads through the Redis contact cache, so repeated reads of a contact do not reach the database
+        until it is changed or the entry expires.
 
     :param contact_id: int: Specify the contact id of the contact we want to get
-    :param db: Query the database for a contact with the given id
-    :return: A contact object
+    :param user: User: The owner of the contact
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The contact snapshot, or None
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(id=contact_id).first()
-    return contact
+    return await contact_cache.get_or_load(contact_cache.contact_key(user.id, contact_id),
+                                           lambda: _fetch_snapshot(Contact.id == contact_id, user, db))
 
 
-async def get_contact_by_first_name(first_name: str, db):
+async def get_contact_by_first_name(first_name: str, user: User, db: AsyncSession) -> ValidatedContacts:
     """
     The get_contact_by_first_name function takes in a first_name and returns all contacts with that first name.
         Args:
             first_name (str): The contact's first name.
 
     :param first_name: str: Filter the contacts by first name
+    :param user: User: The owner of the contacts
     :param db: Access the database
-    :return: A list of response contact objects
+    :return: The contact rows and the validator of the list
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter_by(first_name=first_name).all()
-    response_contacts = [ResponseContact(
-        id=contact.id,
-        first_name=contact.first_name,
-        last_name=contact.last_name,
-        phone_number=contact.phone_number,
-        birthday=contact.birthday,
-        email=contact.email,
-        additional_data=contact.additional_data
-    ) for contact in contacts]
+    return await _fetch_validated(_owned(VERSIONED_COLUMNS, user).where(Contact.first_name == first_name), db)
 
-    return response_contacts
 
+async def get_contact_by_first_name_validator(first_name: str, user: User, db: AsyncSession) -> Validator:
+    """
+    The get_contact_by_first_name_validator function returns the ETag of the contacts
+        with the given first name.
 
-async def get_contact_by_last_name(last_name: str, db):
+    :param first_name: str: Filter the contacts by first name
+    :param user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The validator of the contacts
+    :doc-author: Trelent
+    """
+    return await _get_validator(_owned(VALIDATOR_COLUMNS, user).where(Contact.first_name == first_name), db)
+
+
+async def get_contact_by_last_name(last_name: str, user: User, db: AsyncSession) -> ValidatedContacts:
     """
     The get_contact_by_last_name function returns a list of contacts with the given last name.
 
     :param last_name: str: Filter the contacts by last name
+    :param user: User: The owner of the contacts
     :param db: Pass the database connection to the function
-    :return: A list of response contact objects
+    :return: The contact rows and the validator of the list
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter_by(last_name=last_name).all()
-    response_contacts = [ResponseContact(
-        id=contact.id,
-        first_name=contact.first_name,
-        last_name=contact.last_name,
-        phone_number=contact.phone_number,
-        birthday=contact.birthday,
-        email=contact.email,
-        additional_data=contact.additional_data
-    ) for contact in contacts]
+    return await _fetch_validated(_owned(VERSIONED_COLUMNS, user).where(Contact.last_name == last_name), db)
 
-    return response_contacts
 
+async def get_contact_by_last_name_validator(last_name: str, user: User, db: AsyncSession) -> Validator:
+    """
+    The get_contact_by_last_name_validator function returns the ETag of the contacts
+        with the given last name.
 
-async def get_upcoming_birthdays(db: Session, seven_days_from_now: datetime):
+    :param last_name: str: Filter the contacts by last name
+    :param user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The validator of the contacts
+    :doc-author: Trelent
     """
-    The get_upcoming_birthdays function returns a list of contacts whose birthdays are within the next seven days.
-        Args:
-            db (Session): The database session to use for querying.
-            seven_days_from_now (datetime): A datetime object representing the date that is exactly 7 days from now.
+    return await _get_validator(_owned(VALIDATOR_COLUMNS, user).where(Contact.last_name == last_name), db)
 
-    :param db: Session: Connect to the database
-    :param seven_days_from_now: datetime: Filter the results of the query
-    :return: A list of contacts with birthdays in the next 7 days
+
+async def search_contacts(query: str, user: User, db: AsyncSession, limit: int = 20) -> List[ContactRow]:
+    """
+    The search_contacts function finds the user's contacts whose first name, last name, email or phone starts with
+        the query (case-insensitive) or is similar to it by trigrams, best matches first.
+        A field starting with the query ranks above any fuzzy match, and shorter completions rank higher;
+        fuzzy matches rank by trigram similarity. On Postgres both conditions are served
+        by the pg_trgm GIN indexes; on other databases by the user's in-memory trigram index.
+
+    :param query: str: What the user typed
+    :param user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param limit: int: Maximum number of contacts to return
+    :return: A list of contact rows ordered by rank
     :doc-author: Trelent
     """
-    upcoming_birthdays = db.query(Contact).filter(Contact.birthday >= datetime.now(),
-                                                  Contact.birthday <= seven_days_from_now).all()
-    return upcoming_birthdays
+    query = query.strip().lower()
+    if not query:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        prefix = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        columns = [func.lower(Contact.first_name), func.lower(Contact.last_name), func.lower(Contact.email),
+                   Contact.phone_number]
+        rank = func.greatest(*(case((column.like(prefix), 1.0 + literal(float(len(query))) / func.length(column)),
+                                    else_=func.similarity(column, query)) for column in columns))
+        matches = or_(*(column.like(prefix) for column in columns), *(column.op("%")(query) for column in columns))
+        return await _fetch_rows(_owned(CONTACT_COLUMNS, user).where(matches).order_by(rank.desc(), Contact.id)
+                                 .limit(limit), db)
+
+    index = contact_indexes[user.id]
+    await index.load(db, user.id)
+    ranked = [contact_id for contact_id, _ in index.search(query, limit)]
+    if not ranked:
+        return []
+    rows = {row["id"]: row for row in await _fetch_rows(_owned(CONTACT_COLUMNS, user).where(Contact.id.in_(ranked)),
+                                                          db)}
+    return [rows[contact_id] for contact_id in ranked if contact_id in rows]
+
+
+def _upcoming_birthdays(stmt, today: date, days: int):
+    # The same window as the digest (see in_birthday_window), as a range of the birthday_md index
+    window = birthday_window(today, days)
+    if window is None:
+        criterion = Contact.birthday_md.is_not(None)
+    elif window[0] <= window[1]:
+        criterion = Contact.birthday_md.between(*window)
+    else:
+        criterion = or_(Contact.birthday_md >= window[0], Contact.birthday_md <= window[1])
+    return stmt.where(criterion).order_by(case((Contact.birthday_md >= birthday_md(today), 0), else_=1),
+                                          Contact.birthday_md, Contact.id)
+
+
+async def get_upcoming_birthdays(user: User, db: AsyncSession, today: date, days: int = 7) -> List[ContactRow]:
+    """
+    The get_upcoming_birthdays function returns the user's contacts whose birthday falls between today and
+        ``days`` days from today, both inclusive, ordered by how soon the birthday comes.
+        It filters on ``birthday_md`` (month * 100 + day), a range scan of the (user_id, birthday_md) index,
+        and splits the range in two when the window wraps from December to January.
+
+    :param user: User: The owner of the contacts
+    :param db: AsyncSession: Connect to the database
+    :param today: date: The first day of the window
+    :param days: int: The length of the window in days
+    :return: A list of contact rows with birthdays in the window
+    :doc-author: Trelent
+    """
+    return await _fetch_rows(_upcoming_birthdays(_owned(CONTACT_COLUMNS, user), today, days), db)
 
 
-async def get_contact_by_email(email: EmailStr, db):
+async def get_contact_snapshot_by_email(email: EmailStr, user: User, db: AsyncSession) -> ContactSnapshot | None:
     """
-    The get_contact_by_email function returns a contact object from the database
-        based on the email address provided.
+    The get_contact_snapshot_by_email function returns the contact with the given email ready to send:
+        its ETag, Last-Modified and JSON body. Like get_contact_snapshot it reads through the contact cache.
 
     :param email: EmailStr: Specify the type of parameter that is expected to be passed into the function
-    :param db: Pass the database connection to the function
-    :return: A contact object
+    :param user: User: The owner of the contact
+    :param db: AsyncSession: Pass the database connection to the function
+    :return: The contact snapshot, or None
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(email=email).first()
-
-    return contact
+    return await contact_cache.get_or_load(contact_cache.contact_email_key(user.id, email),
+                                           lambda: _fetch_snapshot(Contact.email == email, user, db))
 
 
-async def create_contact(body: ContactModel, db: Session):
+async def create_contact(body: ContactModel, user: User, db: AsyncSession):
     """
-    The create_contact function creates a new contact in the database.
+    The create_contact function creates a new contact of the user in the database.
 
     :param body: ContactModel: Define the type of data that is expected to be passed in
-    :param db: Session: Pass the database session to the function
+    :param user: User: The owner of the new contact
+    :param db: AsyncSession: Pass the database session to the function
     :return: A contact object
+    :raises IntegrityError: The user already has a contact with this email; the transaction is rolled back
     :doc-author: Trelent
     """
-    contact = Contact(**body.dict())
+    # The id is assigned by the database, never taken from the client
+    contact = Contact(**body.model_dump(exclude={"id"}), user_id=user.id)
     db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise
+    await db.refresh(contact)
+    await contact_cache.invalidate_contact(user.id, contact.id, contact.email)
+    row = contact_row(contact)
+    await index_birthday(user.id, row)
+    if user.id in contact_indexes:
+        contact_indexes[user.id].add_contact(row)
     return contact
 
 
-async def update_contact(body: ContactModel, contact_id: int, db: Session):
+async def create_contacts(contacts: List[ContactModel], user: User, db: AsyncSession) -> List[str]:
     """
-    The update_contact function updates a contact in the database.
-        Args:
-            body (ContactModel): The updated contact information.
-            contact_id (int): The id of the contact to update.
+    The create_contacts function inserts a batch of contacts of the user with one multi-row
+    INSERT ... ON CONFLICT (user_id, email) DO NOTHING and commits it. Contacts whose email the user
+    already has are skipped instead of failing the whole batch.
+
+    :param contacts: List[ContactModel]: The validated contacts of the batch
+    :param user: User: The owner of the new contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The emails of the contacts that were inserted
+    :doc-author: Trelent
+    """
+    if not contacts:
+        return []
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = (
+        dialect_insert(Contact)
+        .values([{**contact.model_dump(exclude={"id"}), "birthday_md": birthday_md(contact.birthday),
+                  "user_id": user.id} for contact in contacts])
+        .on_conflict_do_nothing(index_elements=[Contact.user_id, Contact.email])
+        .returning(Contact.email)
+    )
+    result = await db.execute(stmt)
+    emails = result.scalars().all()
+    await db.commit()
+    if emails:
+        await invalidate_birthday_digest()
+        contact_indexes.pop(user.id, None)
+    return emails
+
+
+def _expected(expected: List[ContactVersion] | None):
+    # The WHERE clause of a conditional write: the contact must still be at one of the versions the client saw
+    if expected is None:
+        return ()
+    return or_(false(), *(and_(Contact.version == v.version, Contact.updated_at == v.updated_at) for v in expected)),
+
+
+async def update_contact(changes: dict, contact_id: int, user: User, db: AsyncSession,
+                         expected: List[ContactVersion] | None = None) -> ContactSnapshot | None:
+    """
+    The update_contact function sets the given columns of a contact and bumps its version, which changes its ETag.
+        It is one UPDATE ... RETURNING: the row is not read first and only the changed columns are written.
+        With ``expected`` the update only happens if the contact is still at one of those versions.
 
-    :param body: ContactModel: Pass in the json data that is sent to the api
+    :param changes: dict: The new values by column name; a full update sends every column
     :param contact_id: int: Identify the contact that is being updated
-    :param db: Session: Access the database
-    :return: The contact object that was updated
-    :doc-author: Trelent
-    """
-    contact = db.query(Contact).filter_by(id=contact_id).first()
-    if contact:
-        contact.first_name = body.first_name
-        contact.last_name = body.last_name
-        contact.email = body.email
-        contact.phone_number = body.phone_number
-        contact.birthday = body.birthday
-        contact.additional_data = body.additional_data
-        db.commit()
+    :param user: User: The owner of the contact
+    :param db: AsyncSession: Access the database
+    :param expected: List[ContactVersion] | None: The versions from If-Match, or None for any version
+    :return: The updated contact, or None if it does not exist or is at another version
+    :raises IntegrityError: The user has another contact with the new email; the transaction is rolled back
+    :doc-author: Trelent
+    """
+    values = dict(changes)
+    if "birthday" in values:
+        values["birthday_md"] = birthday_md(values["birthday"])
+    owned = (Contact.id == contact_id, Contact.user_id == user.id)
+    stmt = update(Contact).where(*owned, *_expected(expected)).values(**values, version=Contact.version + 1)
+    # The email the contact had before, whose cache entry must go too
+    old_email = Contact.email
+    if "email" in values:
+        if db.get_bind().dialect.name == "postgresql":
+            previous = select(Contact.id, Contact.email).where(*owned).with_for_update().cte("previous")
+            stmt = stmt.where(Contact.id == previous.c.id)
+            old_email = previous.c.email
+        else:
+            # SQLite cannot return the old value of a column. Reading it in the same transaction is safe:
+            # a concurrent writer makes this update fail instead of being overwritten.
+            old_email = literal(await db.scalar(select(Contact.email).where(*owned)))
+    stmt = stmt.returning(*VERSIONED_COLUMNS, old_email)
+    try:
+        row = (await db.execute(stmt.execution_options(synchronize_session=False))).first()
+    except IntegrityError:
+        await db.rollback()
+        raise
+    if row is None:
+        return None
+    await db.commit()
+    *columns, version, updated_at, previous_email = row
+    contact = dict(zip(CONTACT_FIELDS, columns))
+    await contact_cache.invalidate_contact(user.id, contact_id, previous_email, contact["email"])
+    await index_birthday(user.id, contact)
+    if user.id in contact_indexes:
+        contact_indexes[user.id].add_contact(contact)
+    return make_snapshot(version, updated_at, contact_row_adapter.dump_json(contact))
+
+
+async def remove_contact(contact_id: int, user: User, db: AsyncSession,
+                         expected: List[ContactVersion] | None = None) -> ContactRow | None:
+    """
+    The remove_contact function removes a contact from the database with one DELETE ... RETURNING.
+        With ``expected`` the contact is only removed if it is still at one of those versions.
+
+    :param contact_id: int: Specify the id of the contact to be deleted
+    :param user: User: The owner of the contact
+    :param db: AsyncSession: Pass the database session to the function
+    :param expected: List[ContactVersion] | None: The versions from If-Match, or None for any version
+    :return: The contact that was deleted, or None
+    :doc-author: Trelent
+    """
+    stmt = (delete(Contact).where(Contact.id == contact_id, Contact.user_id == user.id, *_expected(expected))
+            .returning(*CONTACT_COLUMNS))
+    row = (await db.execute(stmt.execution_options(synchronize_session=False))).first()
+    if row is None:
+        return None
+    await db.commit()
+    contact = dict(zip(CONTACT_FIELDS, row))
+    await contact_cache.invalidate_contact(user.id, contact_id, contact["email"])
+    await forget_birthday(contact_id, user.id)
+    if user.id in contact_indexes:
+        contact_indexes[user.id].discard(contact_id)
     return contact
 
 
-async def remove_contact(contact_id: int, db: Session):
+async def contact_exists(contact_id: int, user: User, db: AsyncSession) -> bool:
     """
-    The remove_contact function removes a contact from the database.
-        Args:
-            contact_id (int): The id of the contact to be removed.
-            db (Session): A connection to the database.
+    The contact_exists function tells a conditional write that failed because the contact is missing (404)
+    from one that failed because the contact changed since the client read it (412).
 
-    :param contact_id: int: Specify the id of the contact to be deleted
-    :param db: Session: Pass the database session to the function
-    :return: The contact that was deleted
+    :param contact_id: int: The id of the contact
+    :param user: User: The owner of the contact
+    :param db: AsyncSession: Pass the database session to the function
+    :return: True if the user has a contact with this id
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(id=contact_id).first()
-    if contact:
-        db.delete(contact)
-        db.commit()
-    return contact
+    return await db.scalar(_owned((Contact.id,), user).where(Contact.id == contact_id)) is not None
+
+
+async def get_contacts_by_ids(ids: List[int], user: User, db: AsyncSession) -> Dict[int, VersionedContact]:
+    """
+    The get_contacts_by_ids function reads a batch of the user's contacts with one SELECT ... WHERE id IN (...).
+
+    :param ids: List[int]: The ids of the contacts
+    :param user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The contacts found with their validators, by id; ids the user has no contact with are left out
+    :doc-author: Trelent
+    """
+    result = await db.execute(_owned(VERSIONED_COLUMNS, user).where(Contact.id.in_(ids)))
+    return {row[0]: _versioned(row) for row in result}
+
+
+async def update_contacts(changes: Dict[int, dict], user: User, db: AsyncSession,
+                          expected: Dict[int, List[ContactVersion]]
+                          ) -> Tuple[Dict[int, VersionedContact], Set[int], Set[int]]:
+    """
+    The update_contacts function applies a batch of partial updates in one transaction.
+        The contacts are read and locked with one SELECT ... WHERE id IN (...) FOR UPDATE, which also checks
+        the expected versions and gives the old emails to invalidate. Items that change the email to one
+        another contact of the user has, or that an earlier item of the batch takes, are left out before
+        anything is written, so they do not make the unique index fail the whole batch. Then the updates
+        that set the same columns are sent as one executemany UPDATE, so a batch costs a few statements
+        whatever its size.
+
+    :param changes: Dict[int, dict]: The new values by column name, by contact id
+    :param user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param expected: Dict[int, List[ContactVersion]]: The versions of the items that have an If-Match
+    :return: The updated contacts by id, the ids of the contacts that are not at an expected version,
+        and the ids of the contacts whose new email is taken
+    :doc-author: Trelent
+    """
+    stmt = _owned(VERSIONED_COLUMNS, user).where(Contact.id.in_(changes)).with_for_update()
+    current = {row[0]: _versioned(row) for row in await db.execute(stmt)}
+    new_emails = {values["email"] for contact_id, values in changes.items()
+                  if contact_id in current and values.get("email", current[contact_id].contact["email"])
+                  != current[contact_id].contact["email"]}
+    # Emails the user's contacts have now; one that moves to another contact in the same batch is still
+    # taken, since the unique index is checked row by row
+    claimed = set()
+    if new_emails:
+        result = await db.execute(_owned((Contact.email,), user).where(Contact.email.in_(new_emails)))
+        claimed = set(result.scalars())
+    now = utcnow()
+    updated, conflicts, taken, emails = {}, set(), set(), {}
+    statements = defaultdict(list)
+    for contact_id, values in changes.items():
+        if contact_id not in current:
+            continue
+        contact, version = current[contact_id]
+        if contact_id in expected and version not in expected[contact_id]:
+            conflicts.add(contact_id)
+            continue
+        if values.get("email", contact["email"]) != contact["email"]:
+            if values["email"] in claimed:
+                taken.add(contact_id)
+                continue
+            claimed.add(values["email"])
+        new = {**contact, **values}
+        if "birthday" in values:
+            values = {**values, "birthday_md": birthday_md(values["birthday"])}
+        statements[tuple(values)].append({"contact_id": contact_id,
+                                          **{f"new_{key}": value for key, value in values.items()}})
+        updated[contact_id] = VersionedContact(new, ContactVersion(version.version + 1, now))
+        emails[contact_id] = (contact["email"], new["email"])
+    table = Contact.__table__
+    for columns, params in statements.items():
+        # The rows are locked, so the version bumped in SQL is the one predicted above
+        stmt = (update(table).where(table.c.id == bindparam("contact_id"), table.c.user_id == user.id)
+                .values(version=table.c.version + 1, updated_at=now,
+                        **{column: bindparam(f"new_{column}") for column in columns}))
+        await db.execute(stmt, params)
+    await db.commit()
+    await contact_cache.invalidate_contacts(user.id, emails)
+    await index_birthdays(user.id, [contact for contact, _ in updated.values()])
+    if user.id in contact_indexes:
+        for contact, _ in updated.values():
+            contact_indexes[user.id].add_contact(contact)
+    return updated, conflicts, taken
+
+
+async def remove_contacts(ids: List[int], user: User, db: AsyncSession,
+                          expected: Dict[int, List[ContactVersion]]) -> Tuple[Dict[int, ContactRow], Set[int]]:
+    """
+    The remove_contacts function removes a batch of contacts with one DELETE ... WHERE id IN (...) RETURNING.
+        Items with an If-Match are only removed if the contact is still at one of its versions;
+        only when some of those fail is the database asked which of them exist.
+
+    :param ids: List[int]: The ids of the contacts to remove
+    :param user: User: The owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param expected: Dict[int, List[ContactVersion]]: The versions of the items that have an If-Match
+    :return: The removed contacts by id, and the ids of the contacts that are not at an expected version
+    :doc-author: Trelent
+    """
+    unconditional = [contact_id for contact_id in ids if contact_id not in expected]
+    criterion = or_(Contact.id.in_(unconditional),
+                    *(and_(Contact.id == contact_id, *_expected(versions)) for contact_id, versions in expected.items()))
+    stmt = delete(Contact).where(Contact.user_id == user.id, criterion).returning(*CONTACT_COLUMNS)
+    result = await db.execute(stmt.execution_options(synchronize_session=False))
+    removed = {row[0]: dict(zip(CONTACT_FIELDS, row)) for row in result}
+    conflicts = set()
+    failed = [contact_id for contact_id in expected if contact_id not in removed]
+    if failed:
+        result = await db.execute(_owned((Contact.id,), user).where(Contact.id.in_(failed)))
+        conflicts = set(result.scalars())
+    await db.commit()
+    await contact_cache.invalidate_contacts(user.id, {contact_id: (contact["email"],)
+                                                      for contact_id, contact in removed.items()})
+    await forget_birthdays(removed, user.id)
+    if user.id in contact_indexes:
+        for contact_id in removed:
+            contact_indexes[user.id].discard(contact_id)
+    return removed, conflicts
+
+
+async def refresh_birthday_digest(db: AsyncSession, today: date) -> bool:
+    """
+    The refresh_birthday_digest function rebuilds the Redis digest of upcoming birthdays from the database
+    when it was not built today or was invalidated. A short Redis lock makes sure only one worker rebuilds it.
+    It is the one query that reads the contacts of every user. Contacts written while it runs could be
+    replaced by the rows read before, so they are read again by id and applied once the digest is written.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param today: date: The first day of the digest window
+    :return: True if the digest was rebuilt
+    :doc-author: Trelent
+    """
+    if await digest_is_current(today) or not await acquire_rebuild_lock():
+        return False
+    try:
+        stmt = _upcoming_birthdays(select(Contact.user_id, *CONTACT_COLUMNS), today, settings.birthday_digest_days)
+        contacts = [(user_id, dict(zip(CONTACT_FIELDS, row))) for user_id, *row in await db.execute(stmt)]
+        await materialize_birthdays(contacts, today, settings.birthday_digest_days)
+        while (changed := await pop_changed_contacts()) != {}:
+            if changed is None:
+                await invalidate_birthday_digest()
+                break
+            ids = [contact_id for contact_ids in changed.values() for contact_id in contact_ids]
+            rows = {row[0]: dict(zip(CONTACT_FIELDS, row))
+                    for row in await db.execute(select(*CONTACT_COLUMNS).where(Contact.id.in_(ids)))}
+            for user_id, contact_ids in changed.items():
+                await reapply_birthdays(user_id, {contact_id: rows.get(contact_id) for contact_id in contact_ids})
+    finally:
+        await release_rebuild_lock()
+    return True
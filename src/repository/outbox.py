@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import EmailOutbox, utcnow
+
+CLAIM_COLUMNS = (EmailOutbox.id, EmailOutbox.recipient, EmailOutbox.subject, EmailOutbox.template,
+                 EmailOutbox.context, EmailOutbox.attempts)
+
+
+class QueuedEmail(NamedTuple):
+    """An email of the outbox as the worker claimed it; attempts counts this attempt."""
+    id: int
+    recipient: str
+    subject: str
+    template: str
+    context: dict
+    attempts: int
+
+
+async def enqueue_email(recipient: str, subject: str, template: str, context: dict, db: AsyncSession) -> None:
+    """
+    The enqueue_email function adds an email to the outbox; the email worker sends it.
+    It does not commit: the email is written by the caller's next commit, in the same transaction
+    as the change it is about, so neither can be stored without the other.
+
+    :param recipient: str: The address to send the email to
+    :param subject: str: The subject of the email
+    :param template: str: The name of the HTML template
+    :param context: dict: The variables of the template, which must be JSON serializable
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    :doc-author: Trelent
+    """
+    db.add(EmailOutbox(recipient=recipient, subject=subject, template=template, context=context))
+
+
+async def claim_emails(db: AsyncSession, limit: int, lease_seconds: float) -> List[QueuedEmail]:
+    """
+    The claim_emails function takes up to ``limit`` due emails for one worker with a single
+    UPDATE ... RETURNING. Claiming pushes next_attempt_at forward by the lease, so other workers skip them;
+    if the worker dies before it reports back, the emails are due again when the lease ends.
+    On Postgres concurrent claims do not wait on each other thanks to FOR UPDATE SKIP LOCKED.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param limit: int: The maximum number of emails to claim
+    :param lease_seconds: float: How long the emails are reserved for this worker
+    :return: The claimed emails, oldest due first
+    :doc-author: Trelent
+    """
+    now = utcnow()
+    due = (select(EmailOutbox.id).where(EmailOutbox.next_attempt_at <= now)
+           .order_by(EmailOutbox.next_attempt_at).limit(limit).with_for_update(skip_locked=True))
+    stmt = (update(EmailOutbox).where(EmailOutbox.id.in_(due.scalar_subquery()))
+            .values(attempts=EmailOutbox.attempts + 1, next_attempt_at=now + timedelta(seconds=lease_seconds))
+            .returning(*CLAIM_COLUMNS))
+    result = await db.execute(stmt.execution_options(synchronize_session=False))
+    emails = sorted((QueuedEmail(*row) for row in result), key=lambda email: email.id)
+    await db.commit()
+    return emails
+
+
+async def finish_emails(sent: List[int], retry: Dict[int, datetime | None], errors: Dict[int, str],
+                        db: AsyncSession) -> None:
+    """
+    The finish_emails function records the outcome of a batch: sent emails are deleted with one DELETE,
+    failed ones are rescheduled (or given up on, with a NULL next_attempt_at) with one executemany UPDATE.
+
+    :param sent: List[int]: The ids of the emails that were sent
+    :param retry: Dict[int, datetime | None]: When to try each failed email again, or None to give up
+    :param errors: Dict[int, str]: The error of each failed email
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    :doc-author: Trelent
+    """
+    if sent:
+        await db.execute(delete(EmailOutbox).where(EmailOutbox.id.in_(sent))
+                         .execution_options(synchronize_session=False))
+    if retry:
+        table = EmailOutbox.__table__
+        stmt = (update(table).where(table.c.id == bindparam("email_id"))
+                .values(next_attempt_at=bindparam("retry_at"), last_error=bindparam("error")))
+        await db.execute(stmt, [{"email_id": email_id, "retry_at": retry_at, "error": errors[email_id][:1000]}
+                                for email_id, retry_at in retry.items()])
+    await db.commit()
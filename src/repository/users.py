@@ -1,42 +1,50 @@
-from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User
+from src.database.models import User, utcnow
 from src.schemas import UserModel
+from src.services.cache import invalidate_user
 
 
-async def get_user_by_email(email: str, db: Session) -> User | None:
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(email: str, db: AsyncSession) -> User | None:
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
 
 
-async def create_user(body: UserModel, db: Session) -> User:
-    avatar = None
-    try:
-        g = Gravatar(body.email)
-        avatar = g.get_image()
-    except Exception as e:
-        print(e)
-    new_user = User(**body.dict(), avatar=avatar)
+async def create_user(body: UserModel, db: AsyncSession) -> User:
+    # One INSERT: the generated id and created_at come back with RETURNING, and a user without an uploaded
+    # avatar shows their Gravatar, which UserDb derives from the email when the user is read
+    new_user = User(**body.model_dump())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     user.refresh_token = token
-    db.commit()
+    if token is None:
+        # Clearing the refresh token revokes the access tokens issued so far as well
+        user.tokens_revoked_at = utcnow()
+    await db.commit()
+    await invalidate_user(user.email)
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def update_password(user: User, password: str, db: AsyncSession) -> None:
+    user.password = password
+    await db.commit()
+
+
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
+    await invalidate_user(email)
 
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    await invalidate_user(email)
     return user
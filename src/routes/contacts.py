@@ -1,15 +1,31 @@
-from typing import List
-from datetime import datetime, timedelta
+from typing import Dict, List
+from datetime import date
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.conf.config import settings
 from src.database.connect import get_db
 from src.database.models import User, Roles
-from src.schemas import ResponseContact, ContactModel
+from src.schemas import (
+    BatchDeleteItem,
+    BatchItemResult,
+    BatchUpdateItem,
+    BulkImportResult,
+    ContactModel,
+    ContactUpdate,
+    ExportFormat,
+    ResponseContact,
+    batch_results_adapter,
+)
 from src.repository import contacts as repository_contacts
-from src.services.auth import auth_service
+from src.services import birthdays as birthday_digest, contacts_io, etags
+from src.services.contact_cache import ContactSnapshot
+from src.services.etags import ContactVersion
+from src.services.contacts_io import ContactJSONResponse
 from src.services.roles import RoleChecker
 
 router = APIRouter(prefix='/contacts', tags=['contacts'])
@@ -19,184 +35,449 @@ allowed_create_contacts = RoleChecker([Roles.admin, Roles.moderator, Roles.user]
 allowed_update_contacts = RoleChecker([Roles.admin, Roles.moderator])
 allowed_remove_contacts = RoleChecker([Roles.admin])
 
+STREAM_BATCH_SIZE = 1000
+EMAIL_TAKEN = "Contact with this email already exists"
+
+
+def contact_snapshot_response(request: Request, contact: ContactSnapshot) -> Response:
+    """Send a cached or freshly read contact as is, or 304 when the client's copy is current."""
+    if etags.not_modified(request, contact.validator):
+        return etags.not_modified_response(contact.validator)
+    return Response(contact.body, media_type="application/json", headers=etags.validator_headers(contact.validator))
+
 
 @router.get("/", response_model=List[ResponseContact],
-            dependencies=[Depends(allowed_get_contacts), Depends(RateLimiter(times=2, seconds=5))])
-async def get_contacts(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+            dependencies=[Depends(RateLimiter(times=2, seconds=5))])
+async def get_contacts(request: Request, limit: int = Query(100, ge=1, le=5000),
+                       after: int | None = Query(None, ge=0), stream: bool = False,
+                       db: AsyncSession = Depends(get_db), current_user: User = Depends(allowed_get_contacts)):
     """
-    The get_contacts function returns a list of contacts.
-
-    :param db: Session: Pass the database connection to the function
+    The get_contacts function returns a page of contacts ordered by id.
+        Pass the X-Next-Cursor header of a response as ``after`` to get the next page.
+        With ``stream=true`` every contact after the cursor is streamed as NDJSON instead.
+        Pages carry an ETag; a matching If-None-Match gets 304 Not Modified without the page being read.
+        Only conditional requests check the ETag before reading; otherwise it is computed from the page itself.
+
+    :param request: Request: The request, for its conditional headers
+    :param limit: int: Maximum number of contacts in the page
+    :param after: int | None: Id of the last contact of the previous page
+    :param stream: bool: Stream all remaining contacts as NDJSON
+    :param db: AsyncSession: Pass the database connection to the function
     :param current_user: User: Get the current user
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.get_contacts(db)
-    return contacts
+    if stream:
+        batches = repository_contacts.stream_contact_rows(current_user, db, after, STREAM_BATCH_SIZE)
+        return StreamingResponse(contacts_io.encode_ndjson(batches), media_type="application/x-ndjson")
+    if etags.is_conditional(request):
+        validator = await repository_contacts.get_contacts_validator(current_user, db, limit, after)
+        if etags.not_modified(request, validator):
+            return etags.not_modified_response(validator)
+    contacts, validator = await repository_contacts.get_contacts(current_user, db, limit, after)
+    headers = etags.validator_headers(validator)
+    if len(contacts) == limit:
+        headers["X-Next-Cursor"] = str(contacts[-1]["id"])
+    return ContactJSONResponse(contacts, headers=headers)
+
+
+@router.get("/export")
+async def export_contacts(request: Request, format: ExportFormat = ExportFormat.ndjson,
+                          db: AsyncSession = Depends(get_db), current_user: User = Depends(allowed_get_contacts)):
+    """
+    The export_contacts function streams every contact as a file in the requested format:
+        csv, ndjson or columnar (gzip-compressed column groups). Rows are read from a server-side
+        cursor and encoded batch by batch, so memory stays flat regardless of the table size.
+        csv and ndjson are gzip-encoded on the fly when the client accepts it.
+
+    :param request: Request: Read the Accept-Encoding header
+    :param format: ExportFormat: The file format
+    :param db: AsyncSession: Pass the database connection to the function
+    :param current_user: User: Get the current user
+    :return: A streaming response with the exported contacts
+    :doc-author: Trelent
+    """
+    encode, media_type, filename = contacts_io.EXPORT_ENCODERS[format]
+    body = encode(repository_contacts.stream_contact_rows(current_user, db, batch_size=STREAM_BATCH_SIZE))
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format != ExportFormat.columnar and "gzip" in request.headers.get("accept-encoding", ""):
+        body = contacts_io.gzip_stream(body)
+        headers.update({"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+@router.get("/search", response_model=List[ResponseContact])
+async def search_contacts(q: str = Query(min_length=1, max_length=100), limit: int = Query(20, ge=1, le=100),
+                          db: AsyncSession = Depends(get_db), current_user: User = Depends(allowed_get_contacts)):
+    """
+    The search_contacts function is the type-ahead search over first name, last name, email and phone.
+        It matches case-insensitive prefixes and similar spellings and returns the best matches first.
+        An empty list means nothing matched.
 
+    :param q: str: What the user typed
+    :param limit: int: Maximum number of contacts to return
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: User: Get the current user
+    :return: A list of contacts ordered by rank
+    :doc-author: Trelent
+    """
+    return ContactJSONResponse(await repository_contacts.search_contacts(q, current_user, db, limit))
 
-@router.get("/{contact_id}", response_model=ResponseContact, dependencies=[Depends(allowed_get_contacts)])
-async def get_contact(contact_id: int = Path(gt=0, ge=1), db: Session = Depends(get_db),
-                      current_user: User = Depends(auth_service.get_current_user)):
+
+@router.get("/{contact_id}", response_model=ResponseContact)
+async def get_contact(request: Request, contact_id: int = Path(gt=0, ge=1), db: AsyncSession = Depends(get_db),
+                      current_user: User = Depends(allowed_get_contacts)):
     """
-    The get_contact function returns a contact by its ID.
+    The get_contact function returns a contact by its ID, from the contact cache when it is there.
+        It answers 304 Not Modified when the client's ETag or Last-Modified is still current.
 
+    :param request: Request: The request, for its conditional headers
     :param contact_id: int: Get the id of the contact to be updated
     :param ge: Ensure that the contact_id is greater than or equal to 1
-    :param db: Session: Pass the database connection to the function
+    :param db: AsyncSession: Pass the database connection to the function
     :param current_user: User: Get the current user
     :return: A contact object, which is defined in the models
     :doc-author: Trelent
     """
-    contact = await repository_contacts.get_contact(contact_id, db)
+    contact = await repository_contacts.get_contact_snapshot(contact_id, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Not found")
-    return contact
+    return contact_snapshot_response(request, contact)
 
 
-@router.get("/by_first_name/{first_name}", response_model=List[ResponseContact],
-            dependencies=[Depends(allowed_get_contacts)])
-async def get_contact_by_first_name(first_name: str, db: Session = Depends(get_db),
-                                    current_user: User = Depends(auth_service.get_current_user)):
+@router.get("/by_first_name/{first_name}", response_model=List[ResponseContact])
+async def get_contact_by_first_name(request: Request, first_name: str, db: AsyncSession = Depends(get_db),
+                                    current_user: User = Depends(allowed_get_contacts)):
     """
     The get_contact_by_first_name function is used to retrieve a contact by first_name.
         The function takes in the first_name of the contact as an argument and returns a JSON object containing all information about that contact.
 
+    :param request: Request: The request, for its conditional headers
     :param first_name: str: Specify the first_name of the contact that we want to retrieve
-    :param db: Session: Pass the database session to the function
-    :param current_user: User: Get the current user from the auth_service
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: User: Get the current user from the role check
     :return: The contact with the given first_name
     :doc-author: Trelent
     """
-    contact = await repository_contacts.get_contact_by_first_name(first_name, db)
+    if etags.is_conditional(request):
+        validator = await repository_contacts.get_contact_by_first_name_validator(first_name, current_user, db)
+        if etags.not_modified(request, validator):
+            return etags.not_modified_response(validator)
+    contact, validator = await repository_contacts.get_contact_by_first_name(first_name, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="First_name Not found")
-    return contact
+    return ContactJSONResponse(contact, headers=etags.validator_headers(validator))
 
 
-@router.get("/by_last_name/{last_name}", response_model=List[ResponseContact],
-            dependencies=[Depends(allowed_get_contacts)])
-async def get_contact_by_last_name(last_name: str, db: Session = Depends(get_db),
-                                   current_user: User = Depends(auth_service.get_current_user)):
+@router.get("/by_last_name/{last_name}", response_model=List[ResponseContact])
+async def get_contact_by_last_name(request: Request, last_name: str, db: AsyncSession = Depends(get_db),
+                                   current_user: User = Depends(allowed_get_contacts)):
     """
     The get_contact_by_last_name function is used to retrieve a contact by last name.
         The function takes in the last_name of the contact as an argument and returns a JSON object containing all information about that contact.
 
+    :param request: Request: The request, for its conditional headers
     :param last_name: str: Get the last_name of the contact
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user
     :return: A single contact by last_name
     :doc-author: Trelent
     """
-    contact = await repository_contacts.get_contact_by_last_name(last_name, db)
+    if etags.is_conditional(request):
+        validator = await repository_contacts.get_contact_by_last_name_validator(last_name, current_user, db)
+        if etags.not_modified(request, validator):
+            return etags.not_modified_response(validator)
+    contact, validator = await repository_contacts.get_contact_by_last_name(last_name, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Last_name Not found")
-    return contact
+    return ContactJSONResponse(contact, headers=etags.validator_headers(validator))
 
 
-@router.get("/by_email/{email}", response_model=ResponseContact, dependencies=[Depends(allowed_get_contacts)])
-async def get_contact_by_email(email: str, db: Session = Depends(get_db),
-                               current_user: User = Depends(auth_service.get_current_user)):
+@router.get("/by_email/{email}", response_model=ResponseContact)
+async def get_contact_by_email(request: Request, email: str, db: AsyncSession = Depends(get_db),
+                               current_user: User = Depends(allowed_get_contacts)):
     """
     The get_contact_by_email function is used to retrieve a contact by email.
         The function will return the contact if it exists, otherwise it will raise an HTTPException with status code 404 and detail &quot;Email Not found&quot;.
 
 
+    :param request: Request: The request, for its conditional headers
     :param email: str: Get the email of the contact to be deleted
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the user who is currently logged in
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = await repository_contacts.get_contact_by_email(email, db)
+    contact = await repository_contacts.get_contact_snapshot_by_email(email, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Email Not found")
-    return contact
+    return contact_snapshot_response(request, contact)
 
 
-@router.get("/upcoming_birthdays/", response_model=List[ResponseContact], dependencies=[Depends(allowed_get_contacts)])
-async def get_upcoming_birthdays(db: Session = Depends(get_db),
-                                 current_user: User = Depends(auth_service.get_current_user)):
+@router.get("/upcoming_birthdays/", response_model=List[ResponseContact])
+async def get_upcoming_birthdays(days: int = Query(settings.birthday_window_days, ge=0, le=365),
+                                 db: AsyncSession = Depends(get_db),
+                                 current_user: User = Depends(allowed_get_contacts)):
     """
-    The get_upcoming_birthdays function returns a list of contacts with birthdays in the next 7 days.
+    The get_upcoming_birthdays function returns a list of contacts with birthdays in the next ``days`` days.
+        It is served from the Redis digest built by the daily job, and from the database when the digest
+        is stale, shorter than the window, or Redis is down.
 
-    :param db: Session: Get a database connection from the dependency injection container
+    :param days: int: The length of the window in days, 7 by default
+    :param db: AsyncSession: Get a database connection from the dependency injection container
     :param current_user: User: Get the current user
     :return: A list of contacts with upcoming birthdays
     :doc-author: Trelent
     """
-    seven_days_from_now = datetime.now() + timedelta(days=7)
-    upcoming_birthdays = await repository_contacts.get_upcoming_birthdays(db, seven_days_from_now)
+    today = date.today()
+    cached = await birthday_digest.read_birthdays(current_user.id, today, days)
+    if cached is None:
+        upcoming_birthdays = await repository_contacts.get_upcoming_birthdays(current_user, db, today, days)
+    else:
+        upcoming_birthdays = cached
     if not upcoming_birthdays:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No upcoming birthdays found")
 
-    return upcoming_birthdays
+    if cached is not None:
+        return Response(contacts_io.json_array(cached), media_type="application/json")
+    return ContactJSONResponse(upcoming_birthdays)
 
 
-@router.post("/", response_model=ResponseContact, status_code=status.HTTP_201_CREATED,
-             dependencies=[Depends(allowed_create_contacts)])
-async def get_create_contact(body: ContactModel, db: Session = Depends(get_db),
-                             current_user: User = Depends(auth_service.get_current_user)):
+@router.post("/", response_model=ResponseContact, status_code=status.HTTP_201_CREATED)
+async def get_create_contact(body: ContactModel, db: AsyncSession = Depends(get_db),
+                             current_user: User = Depends(allowed_create_contacts)):
     """
     The get_create_contact function creates a new contact in the database.
         The function takes in a ContactModel object and returns the newly created contact.
+        The id of the body is ignored; the database assigns one. If the user already has a contact
+        with this email, 409 Conflict is returned.
 
     :param body: ContactModel: Specify the type of data that is expected in the request body
-    :param db: Session: Pass the database session to the repository layer
+    :param db: AsyncSession: Pass the database session to the repository layer
     :param current_user: User: Get the current user from the database
     :return: The contact that was created
     :doc-author: Trelent
     """
-    contact = await repository_contacts.create_contact(body, db)
+    try:
+        contact = await repository_contacts.create_contact(body, current_user, db)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=EMAIL_TAKEN)
     return contact
 
 
-@router.put("/{contact_id}", response_model=ResponseContact, dependencies=[Depends(allowed_update_contacts)])
-async def update_contact(body: ContactModel, contact_id: int = Path(ge=1), db: Session = Depends(get_db),
-                         current_user: User = Depends(auth_service.get_current_user)):
+@router.post("/bulk", response_model=BulkImportResult)
+async def import_contacts(request: Request, db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(allowed_create_contacts)):
+    """
+    The import_contacts function creates many contacts in one request.
+        The body is a JSON array of contacts, or a streamed text/csv (with a header row) or
+        application/x-ndjson body. Rows are validated and inserted in batches; contacts whose email
+        the current user already has are skipped and reported together with the invalid rows.
+
+    :param request: Request: Read the body as a stream
+    :param db: AsyncSession: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the role check
+    :return: The number of inserted contacts and the errors per row
+    :doc-author: Trelent
     """
-    The update_contact function updates a contact in the database.
-        The function takes an id and a body as input, and returns the updated contact.
+    return await contacts_io.import_contacts(contacts_io.read_records(request), current_user, db)
+
+
+def _check_batch(ids: List[int]):
+    if len(ids) > settings.contact_batch_limit:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"At most {settings.contact_batch_limit} items per batch")
+    if len(set(ids)) < len(ids):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Duplicate contact ids")
+
+
+def _expected_versions(items) -> Dict[int, List[ContactVersion]]:
+    # Items without if_match, or with "*", may change the contact at any version
+    expected = {}
+    for item in items:
+        versions = etags.parse_if_match(item.if_match)
+        if versions is not None:
+            expected[item.id] = versions
+    return expected
+
+
+def _batch_response(results: List[BatchItemResult]) -> Response:
+    return Response(batch_results_adapter.dump_json(results), media_type="application/json")
+
+
+def _found(contact: repository_contacts.VersionedContact, status_code: int = status.HTTP_200_OK) -> BatchItemResult:
+    return {"id": contact.contact["id"], "status": status_code, "etag": etags.contact_validator(*contact.version).etag,
+            "contact": contact.contact}
+
+
+def _failed(contact_id: int, conflicts) -> BatchItemResult:
+    if contact_id in conflicts:
+        return {"id": contact_id, "status": status.HTTP_412_PRECONDITION_FAILED,
+                "detail": "Contact was changed by another request"}
+    return {"id": contact_id, "status": status.HTTP_404_NOT_FOUND, "detail": "Not found"}
+
+
+@router.post("/batch/get", response_model=List[BatchItemResult])
+async def get_contacts_batch(ids: List[int] = Body(min_length=1), db: AsyncSession = Depends(get_db),
+                             current_user: User = Depends(allowed_get_contacts)):
+    """
+    The get_contacts_batch function returns many contacts by id with one query.
+        The body is a JSON array of ids; the result has one item per id, in the same order,
+        with the contact and its ETag, or status 404.
+
+    :param ids: List[int]: The ids of the contacts
+    :param db: AsyncSession: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the role check, done once for the whole batch
+    :return: The result of every item
+    :doc-author: Trelent
+    """
+    _check_batch(ids)
+    found = await repository_contacts.get_contacts_by_ids(ids, current_user, db)
+    return _batch_response([_found(found[contact_id]) if contact_id in found else _failed(contact_id, ())
+                            for contact_id in ids])
+
+
+@router.post("/batch/update", response_model=List[BatchItemResult])
+async def update_contacts_batch(items: List[BatchUpdateItem] = Body(min_length=1), db: AsyncSession = Depends(get_db),
+                                current_user: User = Depends(allowed_update_contacts)):
+    """
+    The update_contacts_batch function applies many partial updates in one transaction.
+        Every item has the id of a contact, the fields to change like PATCH /contacts/{id},
+        and optionally ``if_match``, an ETag the contact must still have. Items are independent:
+        the result has one item per update with the status PATCH would have answered.
+
+    :param items: List[BatchUpdateItem]: The updates
+    :param db: AsyncSession: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the role check, done once for the whole batch
+    :return: The result of every item
+    :doc-author: Trelent
+    """
+    _check_batch([item.id for item in items])
+    changes = {item.id: item.model_dump(exclude_unset=True, exclude={"id", "if_match"}) for item in items}
+    expected = _expected_versions(items)
+    updated, conflicts, taken = await repository_contacts.update_contacts(
+        {contact_id: values for contact_id, values in changes.items() if values}, current_user, db, expected)
+    results = []
+    for item in items:
+        if not changes[item.id]:
+            results.append({"id": item.id, "status": status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            "detail": "Nothing to update"})
+        elif item.id in taken:
+            results.append({"id": item.id, "status": status.HTTP_409_CONFLICT, "detail": EMAIL_TAKEN})
+        elif item.id in updated:
+            results.append(_found(updated[item.id]))
+        else:
+            results.append(_failed(item.id, conflicts))
+    return _batch_response(results)
+
+
+@router.post("/batch/delete", response_model=List[BatchItemResult])
+async def remove_contacts_batch(items: List[BatchDeleteItem] = Body(min_length=1), db: AsyncSession = Depends(get_db),
+                                current_user: User = Depends(allowed_remove_contacts)):
+    """
+    The remove_contacts_batch function removes many contacts with one DELETE.
+        Every item has the id of a contact and optionally ``if_match``, an ETag the contact must still have.
+        The result has one item per id with status 204, 404 or 412.
+
+    :param items: List[BatchDeleteItem]: The contacts to remove
+    :param db: AsyncSession: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the role check, done once for the whole batch
+    :return: The result of every item
+    :doc-author: Trelent
+    """
+    ids = [item.id for item in items]
+    _check_batch(ids)
+    expected = _expected_versions(items)
+    removed, conflicts = await repository_contacts.remove_contacts(ids, current_user, db, expected)
+    return _batch_response([{"id": contact_id, "status": status.HTTP_204_NO_CONTENT} if contact_id in removed
+                            else _failed(contact_id, conflicts) for contact_id in ids])
+
+
+async def _write_failed(contact_id: int, expected, user: User, db: AsyncSession) -> HTTPException:
+    # A conditional write also fails when the contact changed since the client read it
+    if expected is not None and await repository_contacts.contact_exists(contact_id, user, db):
+        return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED,
+                             detail="Contact was changed by another request")
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+
+async def _update(changes: dict, contact_id: int, expected, user: User, db: AsyncSession):
+    try:
+        contact = await repository_contacts.update_contact(changes, contact_id, user, db, expected)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=EMAIL_TAKEN)
+    if contact is None:
+        raise await _write_failed(contact_id, expected, user, db)
+    return Response(contact.body, media_type="application/json", headers=etags.validator_headers(contact.validator))
+
+
+@router.put("/{contact_id}", response_model=ResponseContact)
+async def update_contact(request: Request, body: ContactModel, contact_id: int = Path(ge=1),
+                         db: AsyncSession = Depends(get_db), current_user: User = Depends(allowed_update_contacts)):
+    """
+    The update_contact function replaces every field of a contact.
+        The function takes an id and a body as input, and returns the updated contact with its new ETag.
         If no such contact exists, it raises an HTTPException with status code 404.
+        With If-Match set to an ETag of the contact, it is only updated if it has not changed since,
+        and 412 Precondition Failed is returned otherwise. If another contact of the user has the new email,
+        409 Conflict is returned.
 
+    :param request: Request: The request, for its If-Match header
     :param body: ContactModel: Pass the contact information to be updated
-    :param contact_id: int: Specify the id of the contact to be deleted
-    :param db: Session: Get the database session
+    :param contact_id: int: Specify the id of the contact to be updated
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user
     :return: The updated contact
     :doc-author: Trelent
     """
-    contact = await repository_contacts.update_contact(body, contact_id, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail="Not found")
+    return await _update(body.model_dump(exclude={"id"}), contact_id, etags.if_match(request), current_user, db)
 
-    return contact
 
+@router.patch("/{contact_id}", response_model=ResponseContact)
+async def patch_contact(request: Request, body: ContactUpdate, contact_id: int = Path(ge=1),
+                        db: AsyncSession = Depends(get_db), current_user: User = Depends(allowed_update_contacts)):
+    """
+    The patch_contact function changes only the fields sent in the body; the other columns are not written.
+        It handles If-Match like update_contact.
+
+    :param request: Request: The request, for its If-Match header
+    :param body: ContactUpdate: The fields to change
+    :param contact_id: int: Specify the id of the contact to be updated
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user
+    :return: The updated contact
+    :doc-author: Trelent
+    """
+    changes = body.model_dump(exclude_unset=True)
+    if not changes:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Nothing to update")
+    return await _update(changes, contact_id, etags.if_match(request), current_user, db)
 
-@router.delete("/{contact_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(allowed_remove_contacts)])
-async def remove_contact(contact_id: int = Path(gt=0, ge=1), db: Session = Depends(get_db),
-                         current_user: User = Depends(auth_service.get_current_user)):
+
+@router.delete("/{contact_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_contact(request: Request, contact_id: int = Path(gt=0, ge=1), db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(allowed_remove_contacts)):
     """
     The remove_contact function removes a contact from the database.
-        The function takes in an integer representing the id of the contact to be removed,
-        and returns a dictionary containing information about that contact.
+        The function takes in an integer representing the id of the contact to be removed.
+        It handles If-Match like update_contact.
 
+    :param request: Request: The request, for its If-Match header
     :param contact_id: int: Get the id of the contact to be deleted
     :param ge: Check if the contact_id is greater than or equal to 1
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = await repository_contacts.remove_contact(contact_id, db)
+    expected = etags.if_match(request)
+    contact = await repository_contacts.remove_contact(contact_id, current_user, db, expected)
     if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail="Not found")
+        raise await _write_failed(contact_id, expected, current_user, db)
     return contact
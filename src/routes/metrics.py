@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends
+
+from src.database.models import Roles
+from src.services.metrics import metrics
+from src.services.roles import RoleChecker
+
+router = APIRouter(prefix='/metrics', tags=['metrics'])
+
+allowed_read_metrics = RoleChecker([Roles.admin])
+
+
+@router.get("/", dependencies=[Depends(allowed_read_metrics)])
+async def read_metrics():
+    """
+    The read_metrics function returns a snapshot of the in-process metrics of this worker:
+    database pool usage, pool wait time histogram and the other counters registered by the services.
+
+    :return: A dictionary with the current metric values
+    :doc-author: Trelent
+    """
+    return metrics.snapshot()
@@ -1,14 +1,16 @@
+import os
+
 from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
+from PIL import Image
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
 from src.database.models import User
 from src.schemas import UserModel, UserResponse, TokenModel, UserDb
 from src.repository import users as repository_users
 from src.services.auth import auth_service
+from src.services.avatars import AvatarStorage, get_avatar_storage, make_avatar
 from src.conf.config import settings
 
 router = APIRouter(prefix='/users', tags=["users"])
@@ -21,16 +23,22 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
 
 @router.patch('/avatar', response_model=UserDb)
 async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-    public_id = f"WEB13/{current_user.username}{current_user.id}"
-    cloudinary.uploader.upload(file.file, public_id=public_id, overwrite=True)
-    avatar_url = cloudinary.CloudinaryImage(public_id).build_url(width=250, height=250, crop='fill',
-                                                                 version=r.get('version'))
+                             db: AsyncSession = Depends(get_db),
+                             storage: AvatarStorage = Depends(get_avatar_storage)):
+    # The multipart parser has already streamed the upload into a spooled temporary file;
+    # it is decoded from there, and only the resized avatar is kept in memory and sent to the storage
+    size = file.size
+    if size is None:
+        size = file.file.seek(0, os.SEEK_END)
+        file.file.seek(0)
+    if size > settings.avatar_max_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image is too large")
+    try:
+        avatar = await make_avatar(file.file)
+    except (OSError, Image.DecompressionBombError):
+        # Not an image, a truncated one, or one with too many pixels to decode safely
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid image")
+    # Keyed by id only: usernames are free text and must not end up in a path
+    avatar_url = await storage.save(f"WEB13/user{current_user.id}", avatar)
     user = await repository_users.update_avatar(current_user.email, avatar_url, db)
     return user
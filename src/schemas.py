@@ -1,7 +1,12 @@
+import enum
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, model_validator
+from typing_extensions import TypedDict
+
+from src.database.models import Roles
+from src.services.avatars import gravatar_url
 
 
 class ContactModel(BaseModel):
@@ -14,6 +19,19 @@ class ContactModel(BaseModel):
     additional_data: str
 
 
+class ContactUpdate(BaseModel):
+    """
+    The fields of a partial update. Only the fields sent are changed; defaults are not validated,
+    so a field left out is simply unset while an explicit null is rejected like in ContactModel.
+    """
+    first_name: str = None
+    last_name: str = None
+    phone_number: str = None
+    birthday: date = None
+    email: EmailStr = None
+    additional_data: str = None
+
+
 class ResponseContact(BaseModel):
     id: int = 1
     first_name: str
@@ -27,6 +45,66 @@ class ResponseContact(BaseModel):
         or_mode = True
 
 
+class ContactRow(TypedDict):
+    """
+    The columns of ResponseContact as read from the database. Rows are trusted, so they are serialized
+    with the adapters below without being validated into ResponseContact first.
+    """
+    id: int
+    first_name: str
+    last_name: str
+    phone_number: str
+    birthday: Optional[date]
+    email: str
+    additional_data: Optional[str]
+
+
+contact_row_adapter = TypeAdapter(ContactRow)
+contact_rows_adapter = TypeAdapter(List[ContactRow])
+
+
+class BatchUpdateItem(ContactUpdate):
+    """One item of a batch update: the contact, the fields to change and optionally the ETag it must still have."""
+    id: int = Field(ge=1)
+    if_match: Optional[str] = None
+
+
+class BatchDeleteItem(BaseModel):
+    id: int = Field(ge=1)
+    if_match: Optional[str] = None
+
+
+class BatchItemResult(TypedDict, total=False):
+    """
+    The outcome of one item of a batch: the HTTP status the single-contact route would have answered,
+    and the contact with its ETag on success or the reason otherwise.
+    """
+    id: int
+    status: int
+    etag: str
+    contact: ContactRow
+    detail: str
+
+
+batch_results_adapter = TypeAdapter(List[BatchItemResult])
+
+
+class BulkImportError(BaseModel):
+    row: int
+    detail: str
+
+
+class BulkImportResult(BaseModel):
+    inserted: int = 0
+    errors: List[BulkImportError] = []
+
+
+class ExportFormat(str, enum.Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    columnar = "columnar"
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=5, max_length=16)
     email: str
@@ -38,11 +116,32 @@ class UserDb(BaseModel):
     username: str
     email: str
     created_at: datetime
-    avatar: str
+    avatar: Optional[str] = None
 
     class Config:
         orm_mode = True
 
+    @model_validator(mode="after")
+    def default_avatar(self) -> "UserDb":
+        # Users who did not upload an avatar show their Gravatar, derived here instead of stored at signup
+        if not self.avatar:
+            self.avatar = gravatar_url(self.email)
+        return self
+
+
+class CachedUser(BaseModel):
+    id: int
+    username: str
+    email: str
+    created_at: datetime
+    avatar: Optional[str]
+    roles: Roles
+    confirmed: Optional[bool]
+    tokens_revoked_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 
 class UserResponse(BaseModel):
     user: UserDb
@@ -1,17 +1,27 @@
-import pickle
+import asyncio
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
-import redis as redis_db
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from redis.exceptions import RedisError
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.connect import get_db
+from src.database.connect import get_db, redis_client
+from src.database.models import User
 from src.repository import users as repository_users
 from src.conf.config import settings
+from src.schemas import CachedUser
+from src.services.cache import token_cache, user_cache, user_cache_key
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
 
 
 class Auth:
@@ -19,9 +29,32 @@ class Auth:
     SECRET_KEY = settings.secret_key_jwt
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    redis = redis_db.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    redis = redis_client
+    redis_user_ttl = 900
+    hash_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="password-hash")
+
+    def __init__(self):
+        metrics.collector("password_hash", lambda: {
+            "workers": self.hash_executor._max_workers,
+            "queue_depth": self.hash_executor._work_queue.qsize(),
+        })
 
-    def verify_password(self, plain_password, hashed_password):
+    async def _run_hashing(self, func, *args):
+        """
+        The _run_hashing function runs a bcrypt call on the bounded hashing pool instead of the event loop.
+        bcrypt releases the GIL, so at most password_hash_workers hashes run in parallel and the rest wait
+        in the pool queue, whose depth is reported by the metrics.
+
+        :param self: Represent the instance of the class
+        :param func: The pwd_context method to call
+        :param args: Arguments of the call
+        :return: The result of the call
+        :doc-author: Trelent
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.hash_executor, func, *args)
+
+    async def verify_password(self, plain_password, hashed_password):
         """
         The verify_password function takes a plain-text password and hashed
         password as arguments. It then uses the pwd_context object to verify that the
@@ -33,9 +66,22 @@ class Auth:
         :return: A boolean value, true if the password is correct and false if it is not
         :doc-author: Trelent
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self._run_hashing(self.pwd_context.verify, plain_password, hashed_password)
+
+    async def verify_and_update_password(self, plain_password, hashed_password):
+        """
+        The verify_and_update_password function verifies a password and, when the stored hash
+        uses deprecated settings (pwd_context.needs_update), also returns a fresh hash to store.
+
+        :param self: Represent the instance of the class
+        :param plain_password: Pass in the password that is entered by the user
+        :param hashed_password: Check the password against the hashed version of it
+        :return: A tuple (verified, new_hash), new_hash is None when the stored hash is up to date
+        :doc-author: Trelent
+        """
+        return await self._run_hashing(self.pwd_context.verify_and_update, plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password as input and returns the hash of that password.
         The hash is generated using the pwd_context object, which is an instance of Flask-Bcrypt's Bcrypt class.
@@ -45,7 +91,7 @@ class Auth:
         :return: A hash of the password
         :doc-author: Trelent
         """
-        return self.pwd_context.hash(password)
+        return await self._run_hashing(self.pwd_context.hash, password)
 
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -111,6 +157,27 @@ class Auth:
         token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return token
 
+    def decode_token(self, token: str) -> dict:
+        """
+        The decode_token function verifies a JWT and returns its claims.
+        Validated claims are kept in token_cache under the SHA-256 of the token until the token expires,
+        so a client repeating the same bearer token pays for signature verification once per worker.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded JWT
+        :return: The claims of the token
+        :raises JWTError: If the token is invalid or expired
+        :doc-author: Trelent
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        payload = token_cache.get(key)
+        if payload is None:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            ttl = payload.get("exp", 0) - time.time()
+            if ttl > 0:
+                token_cache.set(key, payload, ttl=ttl)
+        return payload
+
     async def decode_refresh_token(self, refresh_token: str):
         """
         The decode_refresh_token function is used to decode the refresh token.
@@ -124,7 +191,7 @@ class Auth:
         :doc-author: Trelent
         """
         try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(refresh_token)
             if payload['scope'] == 'refresh_token':
                 email = payload['sub']
                 return email
@@ -132,15 +199,16 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         The get_current_user function is a dependency that will be used in the
             UserRouter class. It takes an OAuth2 token as input and returns the user
-            associated with that token. If no user is found, it raises an exception.
+            associated with that token. If no user is found, or the token was issued before
+            the tokens of the user were revoked, it raises an exception.
 
         :param self: Represent the instance of the class
         :param token: str: Pass the token to the function
-        :param db: Session: Get the database session
+        :param db: AsyncSession: Get the database session
         :return: The user object
         :doc-author: Trelent
         """
@@ -151,7 +219,7 @@ class Auth:
 
         try:
             # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             if payload['scope'] == 'access_token':
                 email = payload["sub"]
                 if email is None:
@@ -161,19 +229,89 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
-        user = self.redis.get(f"user:{email}")
-        if user is None:
-            print('GET USER FROM POSTGRES')
+        user = await self._get_user(email, db)
+        if user is None or self.is_revoked(payload, user):
+            raise credentials_exception
+        return user
+
+    async def _get_user(self, email: str, db: AsyncSession) -> User | None:
+        """
+        The _get_user function reads a user through the local cache, then the Redis cache, then the database.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email the token was issued to
+        :param db: AsyncSession: Get the database session on a miss of both caches
+        :return: The user, or None if there is no such user
+        :doc-author: Trelent
+        """
+        # Local tier: a detached user cached by this worker for a few seconds
+        user = user_cache.get(email)
+        if user is not None:
+            metrics.counter("user_cache_local_hits").inc()
+            return user
+
+        key = user_cache_key(email)
+        try:
+            cached = await self.redis.get(key)
+        except RedisError as err:
+            logger.warning("User cache lookup failed: %s", err)
+            cached = None
+        if cached is None:
+            metrics.counter("user_cache_misses").inc()
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
-                raise credentials_exception
-            self.redis.set(f"user:{email}", pickle.dumps(user))
-            self.redis.expire(f"user:{email}", 900)
+                return None
+            cached = self.dump_user(user)
+            try:
+                await self.redis.set(key, cached, ex=self.redis_user_ttl)
+            except RedisError as err:
+                logger.warning("User cache update failed: %s", err)
+            user_cache.set(email, self.load_user(cached))
         else:
-            print('GET USER FROM CACHE')
-            user = pickle.loads(user)
+            metrics.counter("user_cache_redis_hits").inc()
+            user = self.load_user(cached)
+            user_cache.set(email, user)
         return user
 
+    @staticmethod
+    def is_revoked(payload: dict, user: User) -> bool:
+        """
+        The is_revoked function tells whether a token was issued before the tokens of its user were revoked.
+        iat has a resolution of one second, so a token issued in the second of the revocation is revoked too.
+
+        :param payload: dict: The claims of the token
+        :param user: User: The user the token was issued to
+        :return: True if the token must be rejected
+        :doc-author: Trelent
+        """
+        if user.tokens_revoked_at is None:
+            return False
+        revoked_at = user.tokens_revoked_at.replace(tzinfo=timezone.utc).timestamp()
+        return payload.get("iat", 0) < revoked_at
+
+    @staticmethod
+    def dump_user(user: User) -> str:
+        """
+        The dump_user function serializes the columns of a user needed by the routes to a JSON snapshot.
+        It replaces pickling the ORM instance, which was bigger, slower and tied to the mapper state.
+
+        :param user: User: The user loaded from the database
+        :return: A JSON string
+        :doc-author: Trelent
+        """
+        return CachedUser.model_validate(user).model_dump_json()
+
+    @staticmethod
+    def load_user(data: str | bytes) -> User:
+        """
+        The load_user function rebuilds a detached User from a JSON snapshot made by dump_user.
+
+        :param data: str | bytes: The cached snapshot
+        :return: A user object that is not attached to any session
+        :doc-author: Trelent
+        """
+        return User(**CachedUser.model_validate_json(data).model_dump())
+
     async def get_email_from_token(self, token: str):
         """
         The get_email_from_token function takes a token as an argument and returns the email associated with that token.
@@ -187,7 +325,7 @@ class Auth:
         :doc-author: Trelent
         """
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             if payload['scope'] == 'email_token':
                 email = payload["sub"]
                 return email
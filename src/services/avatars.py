@@ -0,0 +1,111 @@
+import asyncio
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from hashlib import blake2b
+from pathlib import Path
+from typing import BinaryIO, Protocol
+
+import cloudinary
+import cloudinary.uploader
+from libgravatar import Gravatar
+from PIL import Image, ImageOps
+
+from src.conf.config import settings
+
+AVATAR_SIZE = 250
+AVATAR_QUALITY = 85
+# Decoding and resizing are CPU bound; Pillow releases the GIL, so a few threads keep up without
+# letting a burst of uploads take every core from the API
+avatar_executor = ThreadPoolExecutor(max_workers=settings.avatar_workers, thread_name_prefix="avatar")
+
+
+def resize_avatar(source: BinaryIO) -> bytes:
+    """
+    The resize_avatar function turns an uploaded image into the avatar that is stored: cropped to fill
+    AVATAR_SIZE x AVATAR_SIZE like Cloudinary's crop='fill', rotated by its EXIF orientation, and encoded
+    as a JPEG of a few kilobytes. JPEGs are decoded at a reduced scale close to the target, which skips
+    most of the decoding work of a large photo. It blocks; make_avatar runs it off the event loop.
+
+    :param source: BinaryIO: The uploaded file, read from its current position
+    :return: The JPEG bytes of the avatar
+    :raises PIL.UnidentifiedImageError: The file is not an image
+    :raises PIL.Image.DecompressionBombError: The image has too many pixels
+    """
+    with Image.open(source) as image:
+        image.draft("RGB", (AVATAR_SIZE * 2, AVATAR_SIZE * 2))
+        avatar = ImageOps.fit(ImageOps.exif_transpose(image).convert("RGB"), (AVATAR_SIZE, AVATAR_SIZE),
+                              Image.LANCZOS)
+    output = io.BytesIO()
+    avatar.save(output, "JPEG", quality=AVATAR_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+async def make_avatar(source: BinaryIO) -> bytes:
+    """Runs resize_avatar on the avatar pool instead of the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(avatar_executor, resize_avatar, source)
+
+
+class AvatarStorage(Protocol):
+    async def save(self, key: str, data: bytes) -> str:
+        """Stores the avatar ``data`` under ``key``, replacing the previous one, and returns its URL."""
+
+
+class CloudinaryStorage:
+    """Stores avatars on Cloudinary. The client is configured once, and uploads run in a thread."""
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str):
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+
+    async def save(self, key: str, data: bytes) -> str:
+        result = await asyncio.to_thread(cloudinary.uploader.upload, data, public_id=key, overwrite=True)
+        return cloudinary.CloudinaryImage(key).build_url(width=AVATAR_SIZE, height=AVATAR_SIZE, crop='fill',
+                                                         version=result.get('version'))
+
+
+class LocalStorage:
+    """
+    Stores avatars as files under ``root``, for development and tests. The URL carries a hash of the
+    content, so clients do not keep showing a replaced avatar from their cache.
+    """
+
+    def __init__(self, root: str | os.PathLike, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written next to the target and renamed, so readers never see a partial file
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, path)
+
+    async def save(self, key: str, data: bytes) -> str:
+        root = self.root.resolve()
+        path = (root / f"{key}.jpg").resolve()
+        if not path.is_relative_to(root):
+            raise ValueError(f"Avatar key {key!r} is outside the storage root")
+        await asyncio.to_thread(self._write, path, data)
+        return f"{self.base_url}/{key}.jpg?v={blake2b(data, digest_size=6).hexdigest()}"
+
+
+@lru_cache
+def get_avatar_storage() -> AvatarStorage:
+    """
+    The get_avatar_storage function is the dependency that gives routes the configured avatar storage,
+    created on first use. Tests override it to store avatars locally.
+
+    :return: The avatar storage backend
+    """
+    if settings.avatar_storage == "local":
+        return LocalStorage(settings.avatar_local_dir, settings.avatar_local_url)
+    return CloudinaryStorage(settings.cloudinary_name, settings.cloudinary_api_key, settings.cloudinary_api_secret)
+
+
+@lru_cache(maxsize=4096)
+def gravatar_url(email: str) -> str:
+    """The Gravatar of an email: an md5 of the address in a URL, memoized since users are read far more than created."""
+    return Gravatar(email).get_image()
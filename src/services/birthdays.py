@@ -0,0 +1,317 @@
+"""
+The birthday digest: the upcoming birthdays of every user, materialized in Redis once a day by the
+rebuild job and kept current by the contact writes. It is laid out as
+
+- ``birthdays:user:{user_id}``: per owner, a sorted set of contact ids scored by birthday month/day
+  (birthday_md, e.g. 1031), holding only the contacts whose birthday falls in the window;
+- ``birthdays:contacts``: a hash of contact id to the serialized contact, shared by all owners;
+- ``birthdays:meta``: a hash with ``built_on`` and ``days``, the window the digest covers;
+- ``birthdays:owners``: the set of user ids that have a sorted set, so a rebuild can clear them all;
+- ``birthdays:lock`` and ``birthdays:changed``: the rebuild lock, and the contacts written while it is held.
+
+There are no per-day keys: a lookup reads the month/days of its window from its owner's sorted set.
+"""
+import asyncio
+import logging
+from calendar import isleap
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.connect import SessionLocal, redis_client
+from src.database.models import Contact, birthday_md
+from src.schemas import ContactRow, contact_row_adapter
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DIGEST_META = "birthdays:meta"
+DIGEST_CONTACTS = "birthdays:contacts"
+DIGEST_LOCK = "birthdays:lock"
+# The owners that have a sorted set in the digest, so a rebuild can clear them all
+DIGEST_OWNERS = "birthdays:owners"
+# The contacts written while a rebuild runs, as "user_id:contact_id", and INVALIDATED after an invalidation
+DIGEST_CHANGED = "birthdays:changed"
+INVALIDATED = "*"
+
+
+def owner_key(user_id: int) -> str:
+    return f"birthdays:user:{user_id}"
+
+
+def birthday_window(today: date, days: int) -> Tuple[int, int] | None:
+    """
+    The birthday_window function gives the first and last birthday_md of the window from today to ``days``
+    days later, both inclusive; the last is smaller than the first when the window wraps from December to
+    January. Outside leap years Feb 29 birthdays are celebrated with Feb 28, so a window that ends on Feb 28
+    of such a year ends on 229 instead. The database query and the digest both filter with it.
+
+    :param today: date: The first day of the window
+    :param days: int: The length of the window in days
+    :return: The first and last birthday_md, or None when the window covers the whole year
+    """
+    if days >= 365:
+        return None
+    last = today + timedelta(days=days)
+    end = birthday_md(last)
+    if end == 228 and not isleap(last.year):
+        end = 229
+    return birthday_md(today), end
+
+
+def in_birthday_window(month_day: int, window: Tuple[int, int] | None) -> bool:
+    if window is None:
+        return True
+    start, end = window
+    return start <= month_day <= end if start <= end else month_day >= start or month_day <= end
+
+
+def window_month_days(today: date, days: int) -> List[int]:
+    """
+    The window_month_days function lists the month/days of the window from today to ``days`` days later,
+    in calendar order. Feb 29 is listed after Feb 28 when birthday_window includes it.
+
+    :param today: date: The first day of the window
+    :param days: int: The length of the window in days
+    :return: The birthday_md values of the window, without duplicates
+    """
+    window = birthday_window(today, days)
+    month_days = []
+    for i in range(min(days, 365) + 1):
+        month_days.append(birthday_md(today + timedelta(days=i)))
+        if month_days[-1] == 228 and in_birthday_window(229, window):
+            month_days.append(229)
+    return list(dict.fromkeys(month_days))
+
+
+def contact_row(contact: Contact) -> ContactRow:
+    return {key: getattr(contact, key) for key in ContactRow.__annotations__}
+
+
+async def _digest_window() -> List[int] | None:
+    meta = await redis_client.hgetall(DIGEST_META)
+    if not meta:
+        return None
+    return window_month_days(date.fromisoformat(meta[b"built_on"].decode()), int(meta[b"days"]))
+
+
+async def digest_is_current(today: date) -> bool:
+    return await redis_client.hget(DIGEST_META, "built_on") == today.isoformat().encode()
+
+
+async def materialize_birthdays(contacts: List[Tuple[int, ContactRow]], today: date, days: int):
+    """
+    The materialize_birthdays function replaces the digest with ``contacts``: per owner, one sorted set of
+    contact ids scored by birthday month/day; a hash with the serialized contacts; and the date and length
+    of the window it covers. Everything is written in one MULTI/EXEC so readers never see a half-built digest.
+    Contacts written after ``contacts`` were read are recorded and applied again by the caller
+    (see pop_changed_contacts).
+
+    :param contacts: List[Tuple[int, ContactRow]]: The owner and the contact of every birthday in the window
+    :param today: date: The first day of the window
+    :param days: int: The length of the window in days
+    """
+    owners = defaultdict(dict)
+    for user_id, contact in contacts:
+        owners[user_id][contact["id"]] = birthday_md(contact["birthday"])
+    old_owners = await redis_client.smembers(DIGEST_OWNERS)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(DIGEST_CONTACTS, DIGEST_OWNERS, *(owner_key(int(user_id)) for user_id in old_owners))
+        for user_id, members in owners.items():
+            pipe.zadd(owner_key(user_id), members)
+        if contacts:
+            pipe.sadd(DIGEST_OWNERS, *owners)
+            pipe.hset(DIGEST_CONTACTS, mapping={contact["id"]: contact_row_adapter.dump_json(contact)
+                                                for _, contact in contacts})
+        pipe.hset(DIGEST_META, mapping={"built_on": today.isoformat(), "days": days})
+        await pipe.execute()
+
+
+async def read_birthdays(user_id: int, today: date, days: int) -> List[bytes] | None:
+    """
+    The read_birthdays function serves a user's upcoming birthdays from the digest.
+    It returns None when the digest was not built today, does not cover ``days``, or Redis is unavailable,
+    and the caller then falls back to the database.
+
+    :param user_id: int: The owner of the contacts
+    :param today: date: The first day of the window
+    :param days: int: The length of the window in days
+    :return: The serialized contacts ordered by how soon the birthday comes, or None
+    """
+    try:
+        meta = await redis_client.hgetall(DIGEST_META)
+        if meta.get(b"built_on") != today.isoformat().encode() or days > int(meta[b"days"]):
+            metrics.counter("birthday_digest_misses").inc()
+            return None
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for month_day in window_month_days(today, days):
+                pipe.zrangebyscore(owner_key(user_id), month_day, month_day)
+            # Same order as the database: by how soon the birthday comes, then by id
+            ids = [contact_id for bucket in await pipe.execute() for contact_id in sorted(bucket, key=int)]
+        payloads = await redis_client.hmget(DIGEST_CONTACTS, ids) if ids else []
+    except RedisError as err:
+        logger.warning("Birthday digest unavailable: %s", err)
+        metrics.counter("birthday_digest_misses").inc()
+        return None
+    metrics.counter("birthday_digest_hits").inc()
+    return [payload for payload in payloads if payload is not None]
+
+
+async def _reindex(user_id: int, contacts: Dict[int, ContactRow | None], record: bool = True):
+    try:
+        window = await _digest_window()
+        # The contact was committed before this check, so a rebuild that starts later reads it from the
+        # database; one that is already running may replace the digest with what it read before
+        rebuilding = record and await redis_client.exists(DIGEST_LOCK)
+        if window is None and not rebuilding:
+            return
+        async with redis_client.pipeline(transaction=True) as pipe:
+            if rebuilding:
+                pipe.sadd(DIGEST_CHANGED, *(f"{user_id}:{contact_id}" for contact_id in contacts))
+            if window is not None:
+                pipe.zrem(owner_key(user_id), *contacts)
+                in_window = {}
+                for contact_id, contact in contacts.items():
+                    month_day = birthday_md(contact["birthday"]) if contact is not None else None
+                    if month_day in window:
+                        pipe.zadd(owner_key(user_id), {contact_id: month_day})
+                        in_window[contact_id] = contact_row_adapter.dump_json(contact)
+                if in_window:
+                    pipe.sadd(DIGEST_OWNERS, user_id)
+                    pipe.hset(DIGEST_CONTACTS, mapping=in_window)
+                if len(in_window) < len(contacts):
+                    pipe.hdel(DIGEST_CONTACTS, *(contact_id for contact_id in contacts if contact_id not in in_window))
+            await pipe.execute()
+    except RedisError as err:
+        logger.warning("Could not update the birthday digest for %d contacts: %s", len(contacts), err)
+
+
+async def index_birthday(user_id: int, contact: ContactRow):
+    """
+    The index_birthday function moves a created or updated contact into the right bucket of the digest,
+    or out of it when its birthday is no longer in the materialized window.
+
+    :param user_id: int: The owner of the contact
+    :param contact: ContactRow: The contact as it is now stored
+    """
+    await _reindex(user_id, {contact["id"]: contact})
+
+
+async def index_birthdays(user_id: int, contacts: List[ContactRow]):
+    """
+    The index_birthdays function is index_birthday for a batch of contacts, in one MULTI/EXEC.
+
+    :param user_id: int: The owner of the contacts
+    :param contacts: List[ContactRow]: The contacts as they are now stored
+    """
+    if contacts:
+        await _reindex(user_id, {contact["id"]: contact for contact in contacts})
+
+
+async def forget_birthday(contact_id: int, user_id: int):
+    """
+    The forget_birthday function removes a deleted contact from the digest.
+
+    :param contact_id: int: The id of the removed contact
+    :param user_id: int: The owner of the removed contact
+    """
+    await _reindex(user_id, {contact_id: None})
+
+
+async def forget_birthdays(contact_ids: Iterable[int], user_id: int):
+    """
+    The forget_birthdays function removes a batch of deleted contacts from the digest.
+
+    :param contact_ids: Iterable[int]: The ids of the removed contacts
+    :param user_id: int: The owner of the removed contacts
+    """
+    contacts = dict.fromkeys(contact_ids)
+    if contacts:
+        await _reindex(user_id, contacts)
+
+
+async def invalidate_birthday_digest():
+    """
+    The invalidate_birthday_digest function marks the digest as stale after changes too large to apply
+    one by one, such as a bulk import. Reads go to the database until the job rebuilds it.
+    """
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(DIGEST_META)
+            # A rebuild that is running would write the meta again; this tells it not to
+            pipe.sadd(DIGEST_CHANGED, INVALIDATED)
+            await pipe.execute()
+    except RedisError as err:
+        logger.warning("Could not invalidate the birthday digest: %s", err)
+
+
+async def acquire_rebuild_lock() -> bool:
+    """
+    The acquire_rebuild_lock function takes the short lock that lets one worker rebuild the digest.
+    While it is held, writes record their contacts in DIGEST_CHANGED (see pop_changed_contacts).
+
+    :return: True if this worker holds the lock
+    """
+    if not await redis_client.set(DIGEST_LOCK, 1, nx=True, ex=60):
+        return False
+    # Writes recorded before the rebuild reads the database are already in what it reads
+    await redis_client.delete(DIGEST_CHANGED)
+    return True
+
+
+async def release_rebuild_lock():
+    await redis_client.delete(DIGEST_LOCK)
+
+
+async def pop_changed_contacts() -> Dict[int, List[int]] | None:
+    """
+    The pop_changed_contacts function takes the contacts written since the rebuild started. The rebuild may
+    have replaced their update with the row it read before, so it reads them again and applies them with
+    reapply_birthdays, until none is left.
+
+    :return: The ids of the written contacts by owner, or None if the digest was invalidated meanwhile
+    """
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.smembers(DIGEST_CHANGED)
+        pipe.delete(DIGEST_CHANGED)
+        members, _ = await pipe.execute()
+    changed = defaultdict(list)
+    for member in members:
+        if member == INVALIDATED.encode():
+            return None
+        user_id, contact_id = member.split(b":")
+        changed[int(user_id)].append(int(contact_id))
+    return changed
+
+
+async def reapply_birthdays(user_id: int, contacts: Dict[int, ContactRow | None]):
+    """
+    The reapply_birthdays function is how a rebuild applies the contacts from pop_changed_contacts,
+    read again from the database; None stands for a removed contact. They are not recorded again.
+
+    :param user_id: int: The owner of the contacts
+    :param contacts: Dict[int, ContactRow | None]: The contacts as they are now stored, by id
+    """
+    await _reindex(user_id, contacts, record=False)
+
+
+async def run_birthday_digest(refresh: Callable[[AsyncSession, date], Awaitable]):
+    """
+    The run_birthday_digest function is the scheduled job of the digest. Every birthday_digest_interval
+    seconds it calls ``refresh``, which rebuilds the digest when it was not built today or was invalidated.
+    It runs for the lifetime of the worker; errors are logged and retried on the next tick.
+
+    :param refresh: Callable[[AsyncSession, date], Awaitable]: Rebuilds the digest if needed
+    """
+    while True:
+        try:
+            async with SessionLocal() as db:
+                await refresh(db, date.today())
+        except (RedisError, SQLAlchemyError) as err:
+            logger.warning("Birthday digest refresh failed: %s", err)
+        await asyncio.sleep(settings.birthday_digest_interval)
@@ -0,0 +1,90 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple, TypedDict
+from uuid import uuid4
+
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
+from jinja2 import TemplateError
+
+from src.services.email_templates import EmailTemplates
+from src.services.smtp import RateLimit, SMTPPool, html_message
+
+# Finished jobs kept for their status endpoint; the oldest are forgotten first
+JOBS_KEPT = 100
+
+
+class RecipientResult(TypedDict, total=False):
+    email: str
+    status: str
+    detail: str
+
+
+class BulkJob:
+    """
+    One bulk send: the same template rendered with each recipient's variables.
+    ``results`` fills in as recipients are done, in the order they were given.
+    """
+
+    def __init__(self, subject: str, template: str, recipients: List[Tuple[str, dict]]):
+        self.id = uuid4().hex
+        self.subject = subject
+        self.template = template
+        self.recipients = recipients
+        self.status = "queued"
+        self.created_at = datetime.now(timezone.utc)
+        self.results: List[RecipientResult | None] = [None] * len(recipients)
+        self.sent = 0
+        self.failed = 0
+
+    def snapshot(self) -> dict:
+        return {"id": self.id, "status": self.status, "created_at": self.created_at, "total": len(self.recipients),
+                "sent": self.sent, "failed": self.failed,
+                "results": [result for result in self.results if result is not None]}
+
+
+jobs: Dict[str, BulkJob] = OrderedDict()
+
+
+def add_job(job: BulkJob):
+    """Registers a job for its status endpoint, forgetting the oldest finished jobs beyond JOBS_KEPT."""
+    jobs[job.id] = job
+    finished = [job_id for job_id, kept in jobs.items() if kept.status == "done"]
+    for job_id in finished[:max(len(finished) - JOBS_KEPT, 0)]:
+        del jobs[job_id]
+
+
+async def run_bulk_job(job: BulkJob, pool: SMTPPool, rate: RateLimit, templates: EmailTemplates,
+                       conf: ConnectionConfig):
+    """
+    The run_bulk_job function sends the emails of a job over the pooled connections: as many senders
+    as the pool has connections take the next recipient until none is left, so a job of any size
+    keeps exactly that many emails in flight. A failed recipient is recorded and does not stop the job.
+
+    :param job: BulkJob: The job to send
+    :param pool: SMTPPool: The SMTP connections to send with
+    :param rate: RateLimit: The send-rate limit, shared with other jobs
+    :param templates: EmailTemplates: The compiled templates
+    :param conf: ConnectionConfig: The sender of the emails
+    """
+    job.status = "running"
+    pending = iter(enumerate(job.recipients))
+
+    async def sender():
+        for i, (email, context) in pending:
+            try:
+                message = html_message(conf, email, job.subject, templates.render(job.template, context))
+                await rate.acquire()
+                await pool.send(message)
+            except (TemplateError, aiosmtplib.SMTPException, OSError) as err:
+                job.results[i] = {"email": email, "status": "failed", "detail": str(err) or type(err).__name__}
+                job.failed += 1
+            else:
+                job.results[i] = {"email": email, "status": "sent"}
+                job.sent += 1
+
+    try:
+        await asyncio.gather(*(sender() for _ in range(min(pool.size, len(job.recipients)))))
+    finally:
+        job.status = "done"
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.connect import redis_client
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+USER_INVALIDATION_CHANNEL = "user:invalidate"
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache whose entries expire after ``ttl`` seconds.
+    It lives in one worker only, so it sits in front of Redis and must be kept short-lived.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+user_cache = LocalCache(maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl)
+# Validated JWT claims keyed by token hash, each entry lives until the token's exp. Only the signature check
+# is cached: get_current_user still compares the iat of the claims with the tokens_revoked_at of the user
+token_cache = LocalCache(maxsize=settings.token_cache_size, ttl=0)
+
+
+def user_cache_key(email: str) -> str:
+    return f"user:{email}"
+
+
+def user_cache_stats() -> dict:
+    """
+    The user_cache_stats function reports how the lookups of get_current_user were served.
+    The redis ratio is relative to the lookups that missed the local tier and reached Redis.
+    """
+    local = metrics.counter("user_cache_local_hits").value
+    redis = metrics.counter("user_cache_redis_hits").value
+    misses = metrics.counter("user_cache_misses").value
+    total = local + redis + misses
+    return {
+        "local_size": len(user_cache),
+        "local_hit_ratio": local / total if total else 0.0,
+        "redis_hit_ratio": redis / (redis + misses) if redis + misses else 0.0,
+        "overall_hit_ratio": (local + redis) / total if total else 0.0,
+    }
+
+
+metrics.collector("user_cache", user_cache_stats)
+
+
+async def invalidate_user(email: str):
+    """
+    The invalidate_user function drops the cached snapshot of a user from every tier:
+    this worker's local cache, Redis, and - through pub/sub - the local caches of the other workers.
+    The next request of the user reads the row again, with its new tokens_revoked_at if its tokens were revoked.
+    A Redis failure is logged and not raised, the local entries still expire after user_cache_ttl.
+
+    :param email: str: The email of the user that was modified
+    """
+    user_cache.pop(email)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.delete(user_cache_key(email))
+            pipe.publish(USER_INVALIDATION_CHANNEL, email)
+            await pipe.execute()
+    except RedisError as err:
+        logger.warning("Could not invalidate cached user %s: %s", email, err)
+
+
+async def listen_user_invalidations():
+    """
+    The listen_user_invalidations function subscribes to the invalidation channel and evicts
+    the announced users from the local cache.
+    It runs for the lifetime of the worker and resubscribes after a Redis connection error.
+    """
+    while True:
+        try:
+            async with redis_client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(USER_INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    user_cache.pop(message["data"].decode())
+        except RedisError as err:
+            logger.warning("User invalidation listener disconnected: %s", err)
+            user_cache.clear()
+            await asyncio.sleep(1)
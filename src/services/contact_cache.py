@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, NamedTuple
+
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.connect import redis_client
+from src.services.etags import Validator, contact_validator
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ContactSnapshot(NamedTuple):
+    """A contact as the read routes send it: its validator and its serialized JSON body."""
+    validator: Validator
+    body: bytes
+
+
+def make_snapshot(version: int, updated_at: datetime, body: bytes) -> ContactSnapshot:
+    return ContactSnapshot(contact_validator(version, updated_at), body)
+
+
+def contact_key(user_id: int, contact_id: int) -> str:
+    return f"contact:{user_id}:{contact_id}"
+
+
+def contact_email_key(user_id: int, email: str) -> str:
+    return f"contact:{user_id}:email:{email}"
+
+
+def dump_snapshot(snapshot: ContactSnapshot) -> bytes:
+    # ETag and Last-Modified on the first line, the JSON body (which has no raw newlines) after it
+    validator = snapshot.validator
+    return f"{validator.etag} {validator.last_modified.isoformat()}\n".encode() + snapshot.body
+
+
+def load_snapshot(data: bytes) -> ContactSnapshot:
+    head, body = data.split(b"\n", 1)
+    etag, last_modified = head.decode().split(" ")
+    return ContactSnapshot(Validator(etag, datetime.fromisoformat(last_modified), 1), body)
+
+
+# What invalidation leaves in place of a snapshot for contact_cache_tombstone_ttl seconds. It reads as a miss,
+# and loads only store a snapshot where there is nothing, so a load that read the contact before the write
+# cannot put the old snapshot back
+TOMBSTONE = b""
+
+# One pending database load per key in this worker; concurrent misses wait for it instead of querying too
+_loading: Dict[str, asyncio.Future] = {}
+_FAILED = object()
+
+
+async def _read(key: str) -> ContactSnapshot | None:
+    try:
+        data = await redis_client.get(key)
+    except RedisError as err:
+        logger.warning("Contact cache lookup failed: %s", err)
+        return None
+    # Snapshots cached before contact ETags became strong are misses too, until they expire
+    return None if not data or data.startswith(b"W/") else load_snapshot(data)
+
+
+async def _write(key: str, snapshot: ContactSnapshot):
+    try:
+        await redis_client.set(key, dump_snapshot(snapshot), ex=settings.contact_cache_ttl, nx=True)
+    except RedisError as err:
+        logger.warning("Contact cache update failed: %s", err)
+
+
+async def get_or_load(key: str, load: Callable[[], Awaitable[ContactSnapshot | None]]) -> ContactSnapshot | None:
+    """
+    The get_or_load function is the read-through path of the contact cache. It returns the snapshot
+    stored in Redis under ``key``, or calls ``load`` and stores what it returns for contact_cache_ttl seconds.
+    Misses are single-flight per key within a worker: while one request loads a key, the others await
+    its result. If that request fails or is cancelled they load it themselves.
+    Missing contacts are not cached. A Redis failure is logged and the contact is read from the database.
+
+    A load that races with an update cannot store the old snapshot after the update invalidated it:
+    the snapshot is only stored if the key is empty, and invalidation leaves a TOMBSTONE for a while.
+    Only a load slower than contact_cache_tombstone_ttl could still do it.
+
+    :param key: str: The cache key, see contact_key and contact_email_key; both include the owner
+    :param load: Callable[[], Awaitable[ContactSnapshot | None]]: Reads the contact from the database
+    :return: The snapshot, or None when the contact does not exist
+    """
+    snapshot = await _read(key)
+    if snapshot is not None:
+        metrics.counter("contact_cache_hits").inc()
+        return snapshot
+    metrics.counter("contact_cache_misses").inc()
+    pending = _loading.get(key)
+    if pending is not None:
+        metrics.counter("contact_cache_coalesced").inc()
+        snapshot = await asyncio.shield(pending)
+        return await load() if snapshot is _FAILED else snapshot
+    pending = _loading[key] = asyncio.get_running_loop().create_future()
+    snapshot = _FAILED
+    try:
+        snapshot = await load()
+        if snapshot is not None:
+            await _write(key, snapshot)
+        return snapshot
+    finally:
+        del _loading[key]
+        pending.set_result(snapshot)
+
+
+async def invalidate_contact(user_id: int, contact_id: int, *emails: str):
+    """
+    The invalidate_contact function replaces the cached snapshots of a contact with tombstones after it
+    was created, updated or removed: the one by id and the ones by each given email (the old and the new
+    one on update). It is called after the commit, so the next load reads the new row.
+    A Redis failure is logged and not raised; the entries still expire after contact_cache_ttl.
+
+    :param user_id: int: The owner of the contact
+    :param contact_id: int: The id of the contact
+    :param emails: str: The emails the contact had or has now
+    """
+    await invalidate_contacts(user_id, {contact_id: emails})
+
+
+async def invalidate_contacts(user_id: int, contacts: Dict[int, Iterable[str]]):
+    """
+    The invalidate_contacts function is invalidate_contact for a batch of contacts, in one round trip.
+
+    :param user_id: int: The owner of the contacts
+    :param contacts: Dict[int, Iterable[str]]: The emails each contact had or has now, by contact id
+    """
+    if not contacts:
+        return
+    keys = {contact_email_key(user_id, email) for emails in contacts.values() for email in emails}
+    keys.update(contact_key(user_id, contact_id) for contact_id in contacts)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(key, TOMBSTONE, ex=settings.contact_cache_tombstone_ttl)
+            await pipe.execute()
+    except RedisError as err:
+        logger.warning("Could not invalidate %d cached contacts: %s", len(contacts), err)
@@ -0,0 +1,282 @@
+import codecs
+import csv
+import io
+import json
+import zlib
+from collections import Counter, deque
+from typing import AsyncIterator, List, Sequence, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import User
+from src.repository import contacts as repository_contacts
+from src.repository.contacts import CONTACT_FIELDS
+from src.schemas import (
+    BulkImportError,
+    BulkImportResult,
+    ContactModel,
+    ExportFormat,
+    contact_row_adapter,
+    contact_rows_adapter,
+)
+
+IMPORT_BATCH_SIZE = 1000
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+COLUMNAR_FORMAT = "contacts-columnar/1"
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    The _lines function splits a streamed request body into text lines without buffering the whole body.
+
+    :param chunks: AsyncIterator[bytes]: The body chunks
+    :return: An async iterator of lines
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8").rstrip("\r")
+
+
+def _ends_quoted(line: str, quoted: bool) -> bool:
+    # Whether a CSV line ends inside a quoted field, following csv's default dialect: a quote opens a field
+    # only at its start, "" inside it is a quote, and a lone quote closes it
+    field_start = not quoted
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quoted:
+            if char == '"':
+                if line.startswith('"', i + 1):
+                    i += 1
+                else:
+                    quoted = False
+        elif char == '"' and field_start:
+            quoted = True
+        field_start = not quoted and char == ","
+        i += 1
+    return quoted
+
+
+async def _csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str] | str]:
+    """
+    The _csv_rows function parses a streamed CSV body with one csv.reader, so quoted fields keep their
+    newlines as encode_csv writes them. Lines are handed to the reader as they arrive, and a record is
+    read once a line ends outside quotes, so the reader never waits for data that has not come yet.
+
+    :param chunks: AsyncIterator[bytes]: The body chunks
+    :return: An async iterator of records, or an error message for a record that cannot be parsed
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    lines = deque()
+    # The reader only asks for a line that has arrived, except at the end, where None ends its input
+    reader = csv.reader(iter(lambda: lines.popleft() if lines else None, None))
+    pending, quoted = "", False
+
+    def parse():
+        try:
+            return next(reader)
+        except csv.Error as err:
+            return f"Invalid CSV: {err}"
+
+    async for chunk in chunks:
+        *ready, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in ready:
+            line += "\n"
+            lines.append(line)
+            quoted = _ends_quoted(line, quoted) if quoted or '"' in line else False
+            if not quoted:
+                yield parse()
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        lines.append(pending)
+    if lines:
+        # The last record, which may have no newline, or be cut off inside quotes and end with the body
+        yield parse()
+
+
+async def read_records(request: Request) -> AsyncIterator[Tuple[int, dict | str]]:
+    """
+    The read_records function parses the body of a bulk import request according to its Content-Type:
+    text/csv (with a header row) is read record by record and NDJSON line by line from the stream,
+    anything else is read as one JSON array.
+
+    :param request: Request: The import request
+    :return: An async iterator of (row number, record) pairs, record is an error message for unparsable rows
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == "text/csv":
+        header = None
+        row = 0
+        async for values in _csv_rows(request.stream()):
+            if not values:
+                continue
+            if header is None:
+                if isinstance(values, str):
+                    raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=values)
+                header = [name.strip() for name in values]
+                continue
+            row += 1
+            yield row, values if isinstance(values, str) else dict(zip(header, values))
+    elif content_type in NDJSON_TYPES:
+        row = 0
+        async for line in _lines(request.stream()):
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                yield row, json.loads(line)
+            except ValueError as err:
+                yield row, f"Invalid JSON: {err}"
+    else:
+        try:
+            records = json.loads(await request.body())
+        except ValueError as err:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid JSON: {err}")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail="Expected a JSON array of contacts")
+        for row, record in enumerate(records, start=1):
+            yield row, record
+
+
+async def _flush(batch: list, result: BulkImportResult, user: User, db: AsyncSession):
+    inserted = Counter(await repository_contacts.create_contacts([contact for _, contact in batch], user, db))
+    for row, contact in batch:
+        if inserted[contact.email]:
+            inserted[contact.email] -= 1
+            result.inserted += 1
+        else:
+            result.errors.append(BulkImportError(row=row, detail="Contact with this email already exists"))
+
+
+async def import_contacts(records: AsyncIterator[Tuple[int, dict | str]], user: User, db: AsyncSession,
+                          batch_size: int = IMPORT_BATCH_SIZE) -> BulkImportResult:
+    """
+    The import_contacts function validates records with ContactModel and inserts the valid ones in batches
+    of batch_size, one multi-row statement and one commit per batch.
+    Rows that fail validation or whose email the user already has are reported by row number.
+
+    :param records: The (row number, record) pairs from read_records
+    :param user: User: The owner of the imported contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of contacts per INSERT
+    :return: The number of inserted contacts and the per-row errors
+    """
+    result = BulkImportResult()
+    batch = []
+    async for row, record in records:
+        if isinstance(record, str):
+            result.errors.append(BulkImportError(row=row, detail=record))
+            continue
+        try:
+            batch.append((row, ContactModel.model_validate(record)))
+        except ValidationError as err:
+            detail = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in err.errors())
+            result.errors.append(BulkImportError(row=row, detail=detail))
+            continue
+        if len(batch) == batch_size:
+            await _flush(batch, result, user, db)
+            batch = []
+    if batch:
+        await _flush(batch, result, user, db)
+    return result
+
+
+async def encode_csv(batches: AsyncIterator[Sequence], fields: Sequence[str] = CONTACT_FIELDS) -> AsyncIterator[bytes]:
+    """
+    The encode_csv function encodes row batches as CSV with a header row, one chunk per batch.
+
+    :param batches: AsyncIterator[Sequence]: Batches of row tuples in ``fields`` order
+    :param fields: Sequence[str]: Column names
+    :return: An async iterator of CSV chunks
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(fields)
+    yield buffer.getvalue().encode()
+    async for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+
+
+async def encode_ndjson(batches: AsyncIterator[Sequence], fields: Sequence[str] = CONTACT_FIELDS) -> AsyncIterator[bytes]:
+    """
+    The encode_ndjson function encodes row batches as newline-delimited JSON objects, one chunk per batch.
+
+    :param batches: AsyncIterator[Sequence]: Batches of row tuples in ``fields`` order
+    :param fields: Sequence[str]: Column names
+    :return: An async iterator of NDJSON chunks
+    """
+    async for rows in batches:
+        yield "".join(json.dumps(dict(zip(fields, row)), default=str) + "\n" for row in rows).encode()
+
+
+async def encode_columnar(batches: AsyncIterator[Sequence], fields: Sequence[str] = CONTACT_FIELDS) -> AsyncIterator[bytes]:
+    """
+    The encode_columnar function writes a gzip-compressed columnar file: a header line naming the format
+    and the columns, then one JSON line per batch (row group) holding each column as an array.
+    Values of a column are stored next to each other, which compresses far better than rows.
+
+    :param batches: AsyncIterator[Sequence]: Batches of row tuples in ``fields`` order
+    :param fields: Sequence[str]: Column names
+    :return: An async iterator of gzip chunks
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    header = json.dumps({"format": COLUMNAR_FORMAT, "columns": list(fields)}) + "\n"
+    yield compressor.compress(header.encode())
+    async for rows in batches:
+        columns = dict(zip(fields, map(list, zip(*rows))))
+        group = json.dumps({"rows": len(rows), "columns": columns}, default=str) + "\n"
+        chunk = compressor.compress(group.encode())
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    The gzip_stream function compresses a stream on the fly for Content-Encoding: gzip.
+
+    :param chunks: AsyncIterator[bytes]: The uncompressed stream
+    :return: An async iterator of gzip chunks
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+EXPORT_ENCODERS = {
+    ExportFormat.csv: (encode_csv, "text/csv", "contacts.csv"),
+    ExportFormat.ndjson: (encode_ndjson, "application/x-ndjson", "contacts.ndjson"),
+    ExportFormat.columnar: (encode_columnar, "application/gzip", "contacts.columnar.gz"),
+}
+
+
+class ContactJSONResponse(Response):
+    """
+    JSON response for contact rows (or a list of them) read from the database.
+    The rows are serialized by the precompiled ContactRow adapters straight to bytes, which skips
+    the validation and jsonable_encoder pass FastAPI would run against response_model.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        adapter = contact_rows_adapter if isinstance(content, list) else contact_row_adapter
+        return adapter.dump_json(content)
+
+
+def json_array(items: Sequence[bytes]) -> bytes:
+    """Join already serialized JSON values into one JSON array."""
+    return b"[" + b",".join(items) + b"]"
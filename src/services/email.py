@@ -1,12 +1,29 @@
+import asyncio
+import logging
+from datetime import timedelta
+from email.message import EmailMessage
+from functools import partial
 from pathlib import Path
+from typing import Tuple
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
+from jinja2 import TemplateError
 from pydantic import EmailStr
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from src.services.auth import auth_service
 from src.conf.config import settings
+from src.database.connect import SessionLocal
+from src.database.models import utcnow
+from src.repository import outbox as repository_outbox
+from src.repository.outbox import QueuedEmail
+from src.services.auth import auth_service
+from src.services.email_templates import EmailTemplates
+from src.services.metrics import metrics
+from src.services.smtp import RateLimit, SMTPPool, html_message, smtp_client
 
+logger = logging.getLogger(__name__)
 
 conf = ConnectionConfig(
     MAIL_USERNAME=settings.mail_username,
@@ -21,32 +38,113 @@ conf = ConnectionConfig(
     VALIDATE_CERTS=True,
     TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
 )
+# Compiled once at import, i.e. when the application or the worker starts
+templates = EmailTemplates(conf.TEMPLATE_FOLDER)
 
 
-async def send_email(email: EmailStr, username: str, host: str):
+async def queue_confirmation_email(email: EmailStr, username: str, host: str, db: AsyncSession):
     """
-    The send_email function sends an email to the user with a link to confirm their email address.
-        The function takes in three parameters:
-            -email: EmailStr, the user's email address.
-            -username: str, the username of the user who is registering for an account.  This will be used in a greeting message within the body of the email sent to them.
-            -host: str, this is where we are hosting our application (i.e., localhost).  This will be used as part of a URL that users can click on within their emails.
+    The queue_confirmation_email function puts the email with the link to confirm a new user's address
+    in the outbox. The email worker sends it, so signing up does not wait for the mail server.
+    Like enqueue_email it does not commit; the email is stored with the caller's next commit.
 
     :param email: EmailStr: Specify the email address of the user
     :param username: str: Personalize the email
     :param host: str: Pass the hostname of the server to the email template
-    :return: A coroutine object
+    :param db: AsyncSession: Pass the database session to the outbox
+    :return: None
     :doc-author: Trelent
     """
+    token_verification = auth_service.create_email_token({"sub": email})
+    await repository_outbox.enqueue_email(email, "Confirm your email ", "email_template.html",
+                                          {"host": host, "username": username, "token": token_verification}, db)
+
+
+def render_email(email: QueuedEmail) -> EmailMessage:
+    return html_message(conf, email.recipient, email.subject, templates.render(email.template, email.context))
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff: email_retry_base seconds after the first failure, doubling up to email_retry_max."""
+    return min(settings.email_retry_base * 2 ** (attempts - 1), settings.email_retry_max)
+
+
+async def _deliver(email: QueuedEmail, pool: SMTPPool, rate: RateLimit) -> Tuple[str, bool] | None:
+    # None when sent, otherwise the error and whether trying again cannot help
+    try:
+        message = render_email(email)
+    except TemplateError as err:
+        return f"template: {err}", True
+    await rate.acquire()
+    try:
+        await pool.send(message)
+    except aiosmtplib.SMTPRecipientsRefused as err:
+        return str(err), True
+    except aiosmtplib.SMTPResponseException as err:
+        return str(err), err.code >= 500
+    except (aiosmtplib.SMTPException, OSError) as err:
+        return str(err) or type(err).__name__, False
+    return None
+
+
+async def send_outbox_batch(pool: SMTPPool, rate: RateLimit,
+                            session_factory: async_sessionmaker = SessionLocal) -> int:
+    """
+    The send_outbox_batch function claims a batch of due emails, sends them over the pooled connections
+    and records the outcome: sent emails leave the outbox, failed ones are retried with exponential backoff,
+    and emails the server refused for good or that failed email_max_attempts times are given up on.
+    Delivery is at least once: an email sent just before the worker dies is sent again after the lease.
+
+    :param pool: SMTPPool: The SMTP connections to send with
+    :param rate: RateLimit: The send-rate limit shared by all batches
+    :param session_factory: async_sessionmaker: Opens the database sessions of the outbox
+    :return: The number of emails claimed
+    """
+    async with session_factory() as db:
+        emails = await repository_outbox.claim_emails(db, settings.email_batch_size, settings.email_lease_seconds)
+    if not emails:
+        return 0
+    outcomes = await asyncio.gather(*(_deliver(email, pool, rate) for email in emails))
+    sent, retry, errors = [], {}, {}
+    now = utcnow()
+    for email, outcome in zip(emails, outcomes):
+        if outcome is None:
+            sent.append(email.id)
+            continue
+        errors[email.id], permanent = outcome
+        if permanent or email.attempts >= settings.email_max_attempts:
+            retry[email.id] = None
+            metrics.counter("email_given_up").inc()
+            logger.error("Giving up on email %s to %s: %s", email.id, email.recipient, errors[email.id])
+        else:
+            retry[email.id] = now + timedelta(seconds=retry_delay(email.attempts))
+            logger.warning("Email %s to %s failed, retrying: %s", email.id, email.recipient, errors[email.id])
+    async with session_factory() as db:
+        await repository_outbox.finish_emails(sent, retry, errors, db)
+    metrics.counter("email_sent").inc(len(sent))
+    metrics.counter("email_failed").inc(len(errors))
+    return len(emails)
+
+
+async def run_email_outbox(pool: SMTPPool | None = None, session_factory: async_sessionmaker = SessionLocal):
+    """
+    The run_email_outbox function is the email worker: it sends outbox batches for as long as it runs,
+    and waits email_poll_interval seconds whenever the outbox had less than a full batch due.
+    Database errors are logged and retried on the next poll.
+
+    :param pool: SMTPPool | None: The SMTP connections, email_smtp_connections of them by default
+    :param session_factory: async_sessionmaker: Opens the database sessions of the outbox
+    """
+    pool = pool or SMTPPool(settings.email_smtp_connections, partial(smtp_client, conf))
+    rate = RateLimit(settings.email_rate_per_minute)
     try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+        while True:
+            try:
+                claimed = await send_outbox_batch(pool, rate, session_factory)
+            except SQLAlchemyError as err:
+                logger.warning("Email outbox unavailable: %s", err)
+                claimed = 0
+            if claimed < settings.email_batch_size:
+                await asyncio.sleep(settings.email_poll_interval)
+    finally:
+        await pool.close()
@@ -0,0 +1,87 @@
+from os import PathLike
+from typing import Callable, Dict, Tuple
+
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound, nodes, select_autoescape
+from markupsafe import escape
+
+
+class Prerendered:
+    """
+    A template that is only text and ``{{ name }}`` placeholders, kept as its static pieces and the names
+    between them. Rendering joins them, which gives the same string as Jinja without its per-render setup.
+    """
+
+    def __init__(self, pieces: Tuple[str, ...], names: Tuple[str, ...], autoescape: bool):
+        self.pieces = pieces
+        self.names = names
+        self._convert: Callable[[object], str] = escape if autoescape else str
+
+    def render(self, context: dict) -> str:
+        parts = [self.pieces[0]]
+        for name, piece in zip(self.names, self.pieces[1:]):
+            # An undefined variable renders as an empty string, like Jinja's default Undefined
+            parts.append(self._convert(context[name]) if name in context else "")
+            parts.append(piece)
+        return "".join(parts)
+
+
+def prerender(environment: Environment, name: str) -> Prerendered | None:
+    """
+    The prerender function splits a template into static pieces and placeholders.
+    It returns None for templates that use anything else (tags, filters, attributes), which are
+    rendered by Jinja instead.
+
+    :param environment: Environment: The environment the template is loaded from
+    :param name: str: The name of the template
+    :return: The prerendered template, or None
+    """
+    source = environment.loader.get_source(environment, name)[0]
+    pieces, names = [""], []
+    for node in environment.parse(source).body:
+        if not isinstance(node, nodes.Output):
+            return None
+        for child in node.nodes:
+            if isinstance(child, nodes.TemplateData):
+                pieces[-1] += child.data
+            elif isinstance(child, nodes.Name) and child.ctx == "load":
+                names.append(child.name)
+                pieces.append("")
+            else:
+                return None
+    autoescape = environment.autoescape(name) if callable(environment.autoescape) else environment.autoescape
+    return Prerendered(tuple(pieces), tuple(names), autoescape)
+
+
+class EmailTemplates:
+    """
+    The templates of a folder, compiled once when the application starts. Each render uses the compiled
+    template instead of building a Jinja environment and reading the file for every email, as
+    fastapi_mail's template_name does. Simple templates are prerendered (see Prerendered).
+    HTML templates are autoescaped, so a username cannot inject markup into an email.
+    """
+
+    def __init__(self, folder: str | PathLike):
+        self.environment = Environment(loader=FileSystemLoader(folder), autoescape=select_autoescape(["html"]),
+                                       auto_reload=False)
+        self._renderers: Dict[str, Callable[[dict], str]] = {}
+        for name in self.environment.list_templates():
+            prerendered = prerender(self.environment, name)
+            template = self.environment.get_template(name)
+            self._renderers[name] = prerendered.render if prerendered else template.render
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._renderers
+
+    def render(self, name: str, context: dict) -> str:
+        """
+        The render method renders a template of the folder.
+
+        :param name: str: The name of the template, relative to the folder
+        :param context: dict: The variables of the template
+        :return: The rendered text
+        """
+        try:
+            renderer = self._renderers[name]
+        except KeyError:
+            raise TemplateNotFound(name) from None
+        return renderer(context)
@@ -0,0 +1,166 @@
+import re
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
+from typing import Dict, List, NamedTuple
+
+from fastapi import Request, Response, status
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class Validator(NamedTuple):
+    """The ETag and Last-Modified of a contact or a collection of contacts, and how many contacts it covers."""
+    etag: str
+    last_modified: datetime | None
+    count: int
+
+
+def make_validator(count: int, id_sum: int | None, version_sum: int | None,
+                   last_modified: datetime | None) -> Validator:
+    """
+    The make_validator function turns the aggregate of a set of contacts into its validator.
+    Any update bumps a version and moves updated_at, and any insert or delete changes the count or the ids,
+    so the ETag changes whenever the response body would. It is weak because the same contacts
+    may be sent gzip-encoded or not.
+    Collections have no Last-Modified: a delete does not move the latest updated_at, so If-Modified-Since
+    would keep answering 304 for a list that lost a contact. Only the ETag validates them.
+
+    :param count: int: Number of contacts
+    :param id_sum: int | None: Sum of their ids
+    :param version_sum: int | None: Sum of their versions
+    :param last_modified: datetime | None: Latest updated_at, naive UTC, hashed into the ETag
+    :return: The validator, without a last_modified
+    """
+    state = f"{count}:{id_sum or 0}:{version_sum or 0}:{last_modified.isoformat() if last_modified else ''}"
+    return Validator(f'W/"{blake2b(state.encode(), digest_size=8).hexdigest()}"', None, count)
+
+
+class ContactVersion(NamedTuple):
+    """The version and updated_at of one contact, as carried by its ETag."""
+    version: int
+    updated_at: datetime
+
+
+_EPOCH = datetime(1970, 1, 1)
+# What GZipETagMiddleware appends to a strong ETag when the body is sent gzip-encoded
+GZIP_SUFFIX = "-gzip"
+_CONTACT_TAG = re.compile(r'"(\d+)\.([0-9a-f]+)(?:-gzip)?"')
+
+
+def contact_validator(version: int, updated_at: datetime) -> Validator:
+    """
+    The contact_validator function gives a single contact its validator. Unlike the hashed ETags of
+    collections, the ETag of a contact spells out its version and updated_at, so a write can check
+    If-Match in its WHERE clause without reading the row first. It is strong: the version and updated_at
+    determine the JSON body byte for byte, and GZipETagMiddleware tags the gzip-encoded body apart.
+
+    :param version: int: The version of the contact
+    :param updated_at: datetime: When it was last changed, naive UTC
+    :return: The validator
+    """
+    micros = (updated_at - _EPOCH) // timedelta(microseconds=1)
+    return Validator(f'"{version}.{micros:x}"', updated_at, 1)
+
+
+def if_match(request: Request) -> List[ContactVersion] | None:
+    """
+    The if_match function reads the contact versions a write is conditional on from If-Match.
+    If-Match uses the strong comparison, so weak tags never match, nor do tags that are not contact ETags.
+    The ETag of the identity and of the gzip-encoded body both name the current contact, so both match.
+
+    :param request: Request: The conditional request
+    :return: The expected versions, or None when any version will do (no If-Match, or ``*``)
+    """
+    return parse_if_match(request.headers.get("if-match"))
+
+
+def parse_if_match(header: str | None) -> List[ContactVersion] | None:
+    """The expected versions of an If-Match value, also used for the per-item ETags of batch writes."""
+    if header is None or header.strip() == "*":
+        return None
+    versions = []
+    for tag in header.split(","):
+        match = _CONTACT_TAG.fullmatch(tag.strip())
+        if match:
+            versions.append(ContactVersion(int(match[1]), _EPOCH + timedelta(microseconds=int(match[2], 16))))
+    return versions
+
+
+def _http_date(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def _opaque(tag: str) -> str:
+    # Weak comparison: W/ and the content coding do not matter
+    tag = tag.strip()
+    tag = tag[2:] if tag.startswith("W/") else tag
+    return tag.replace(f'{GZIP_SUFFIX}"', '"')
+
+
+def is_conditional(request: Request) -> bool:
+    """Whether the request carries a validator that not_modified would look at."""
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def not_modified(request: Request, validator: Validator) -> bool:
+    """
+    The not_modified function tells whether the client's cached copy is still current. If-None-Match is
+    compared with weak comparison; If-Modified-Since is only looked at when there is no If-None-Match.
+
+    :param request: Request: The conditional request
+    :param validator: Validator: The current validator of the resource
+    :return: True if a 304 can be sent instead of the body
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {_opaque(tag) for tag in if_none_match.split(",")}
+        return "*" in tags or _opaque(validator.etag) in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or validator.last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return _http_date(validator.last_modified) <= since
+
+
+def validator_headers(validator: Validator) -> Dict[str, str]:
+    """The ETag, Last-Modified and Cache-Control headers of a response; clients must revalidate every time."""
+    headers = {"ETag": validator.etag, "Cache-Control": "private, no-cache"}
+    if validator.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_http_date(validator.last_modified), usegmt=True)
+    return headers
+
+
+def not_modified_response(validator: Validator) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(validator))
+
+
+class GZipETagMiddleware:
+    """
+    ASGI middleware that keeps strong ETags strong under GZipMiddleware, which it must wrap: when a response
+    is sent gzip-encoded, GZIP_SUFFIX is added to its strong ETag, since a strong ETag names exactly one
+    byte sequence. Weak ETags are left alone.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_etag(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                etag = headers.get("etag")
+                if etag and etag.startswith('"') and headers.get("content-encoding") == "gzip":
+                    headers["etag"] = f'{etag[:-1]}{GZIP_SUFFIX}"'
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,96 @@
+import bisect
+import threading
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def dec(self, amount: int = 1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed upper bounds, in the same shape Prometheus uses.
+    Observations may come from worker threads (e.g. the SQLAlchemy pool), so updates are locked.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+
+    def _get(self, name: str, factory: Callable):
+        if name not in self._metrics:
+            self._metrics[name] = factory()
+        return self._metrics[name]
+
+    def counter(self, name: str) -> Counter:
+        return self._get(name, Counter)
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get(name, Gauge)
+
+    def histogram(self, name: str, buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(name, lambda: Histogram(buckets))
+
+    def collector(self, name: str, collect: Callable[[], dict]):
+        """
+        The collector method registers a callable that is evaluated on every snapshot,
+        for values that are cheaper to read on demand than to track (e.g. pool size).
+        """
+        self._collectors[name] = collect
+
+    def snapshot(self) -> dict:
+        data = {name: metric.snapshot() for name, metric in sorted(self._metrics.items())}
+        for name, collect in sorted(self._collectors.items()):
+            data[name] = collect()
+        return data
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,15 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Application-wide JSON response rendered by pydantic-core's serializer instead of json.dumps.
+    It produces the same compact UTF-8 JSON as JSONResponse, and also encodes dates, UUIDs, enums
+    and pydantic models that were returned without a response_model, without a jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
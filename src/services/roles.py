@@ -1,3 +1,4 @@
+import logging
 from typing import List
 
 from fastapi import Depends, HTTPException, status, Request
@@ -5,19 +6,32 @@ from fastapi import Depends, HTTPException, status, Request
 from src.database.models import User, Roles
 from src.services.auth import auth_service
 
+logger = logging.getLogger(__name__)
+
 
 class RoleChecker:
     def __init__(self, allowed_roles: List[Roles]):
         self.allowed_roles = allowed_roles
 
-    async def __call__(self, request: Request, current_user: User = Depends(auth_service.get_current_user)):
-        print(request.method)
-        print(request.url)
-        if request.method in ['POST', 'PUT', 'PATCH']:
-            print(await request.json())
-        print(current_user.roles)
-        print(self.allowed_roles)
+    async def __call__(self, request: Request, current_user: User = Depends(auth_service.get_current_user)) -> User:
+        """
+        The __call__ method checks the role of the current user and returns the user,
+        so a route can take its principal from the role check instead of resolving it a second time.
+
+        :param self: Represent the instance of the class
+        :param request: Request: The current request, used for logging only
+        :param current_user: User: The user resolved by auth_service.get_current_user
+        :return: The current user
+        :doc-author: Trelent
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("role check", extra={
+                "method": request.method,
+                "path": request.url.path,
+                "user_id": current_user.id,
+                "role": current_user.roles,
+                "allowed_roles": self.allowed_roles,
+            })
         if current_user.roles not in self.allowed_roles:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Operation forbidden')
-
-
+        return current_user
@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import re
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import Contact
+from src.schemas import ContactRow
+
+# Same default as pg_trgm.similarity_threshold, so both backends return the same matches
+SIMILARITY_THRESHOLD = 0.3
+SEARCH_COLUMNS = (Contact.first_name, Contact.last_name, Contact.email, Contact.phone_number)
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str, complete: bool = True) -> Set[str]:
+    """
+    The trigrams function splits text into the trigrams pg_trgm uses: every alphanumeric word is lowercased,
+    padded with two spaces in front and one behind, and cut into overlapping 3-character pieces.
+    With complete=False the trailing pad of the last word is left out, which gives the trigrams
+    every string starting with ``text`` must contain.
+
+    :param text: str: The text to split
+    :param complete: bool: Whether the last word is finished
+    :return: The set of trigrams
+    """
+    words = _WORD.findall(text.lower())
+    grams = set()
+    for i, word in enumerate(words):
+        padded = f"  {word}" if not complete and i == len(words) - 1 else f"  {word} "
+        grams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    """Shared trigrams over all trigrams of both sides, like pg_trgm's similarity()."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class ContactSearchIndex:
+    """
+    In-memory trigram index over the searchable fields of one user's contacts, used when the database
+    has no pg_trgm (SQLite). It is loaded from the database on the user's first search and then kept
+    up to date by the contacts repository.
+    Each field has its own posting lists, so a match is always checked against the field it matched in.
+    Posting lists are append-only to stay small: removed or changed contacts leave stale entries behind,
+    which every search filters out by checking the current fields. reset() drops them.
+    It lives in one worker only, which is fine for tests and single-process development servers;
+    Postgres deployments search with pg_trgm and never build it. Writes made by other workers are
+    only seen once contact_indexes reloads it.
+    """
+
+    def __init__(self):
+        self._fields = {}
+        self._postings = [defaultdict(list) for _ in SEARCH_COLUMNS]
+        self._min_grams = [1] * len(SEARCH_COLUMNS)
+        self._lock = asyncio.Lock()
+        self.loaded = False
+        self.loaded_at = 0.0
+
+    def add(self, contact_id: int, fields: Iterable[str | None]):
+        if not self.loaded:
+            return
+        values = tuple((value or "").lower() for value in fields)
+        first = contact_id not in self._fields and not self._fields
+        self._fields[contact_id] = values
+        for i, value in enumerate(values):
+            grams = trigrams(value)
+            if not grams:
+                continue
+            self._min_grams[i] = len(grams) if first else min(self._min_grams[i], len(grams))
+            postings = self._postings[i]
+            for gram in grams:
+                postings[gram].append(contact_id)
+
+    def add_contact(self, contact: ContactRow):
+        self.add(contact["id"], [contact[column.key] for column in SEARCH_COLUMNS])
+
+    def discard(self, contact_id: int):
+        self._fields.pop(contact_id, None)
+
+    def reset(self):
+        """Forget everything; the next search reloads the index from the database."""
+        self._fields.clear()
+        self._postings = [defaultdict(list) for _ in SEARCH_COLUMNS]
+        self._min_grams = [1] * len(SEARCH_COLUMNS)
+        self.loaded = False
+
+    async def load(self, db: AsyncSession, user_id: int):
+        async with self._lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+            try:
+                stmt = select(Contact.id, *SEARCH_COLUMNS).where(Contact.user_id == user_id)
+                result = await db.stream(stmt.execution_options(yield_per=10_000))
+                async for rows in result.partitions():
+                    for contact_id, *fields in rows:
+                        self.add(contact_id, fields)
+            except BaseException:
+                self.reset()
+                raise
+
+    def _prefix_matches(self, query: str) -> Dict[int, float]:
+        grams = trigrams(query, complete=False)
+        if not grams:
+            return {}
+        ranked = {}
+        for i, postings in enumerate(self._postings):
+            # A field starting with the query holds all of its prefix trigrams, so the rarest one is enough
+            for contact_id in set(min((postings.get(gram, ()) for gram in grams), key=len)):
+                fields = self._fields.get(contact_id)
+                if fields is not None and fields[i].startswith(query):
+                    rank = 1.0 + len(query) / len(fields[i])
+                    if rank > ranked.get(contact_id, 0.0):
+                        ranked[contact_id] = rank
+        return ranked
+
+    def _fuzzy_matches(self, query: str, exclude) -> Dict[int, float]:
+        grams = trigrams(query)
+        if not grams:
+            return {}
+        ranked = {}
+        for i, postings in enumerate(self._postings):
+            # shared / (|Q| + |F| - shared) >= threshold means shared >= threshold * (|Q| + |F|) / (1 + threshold),
+            # and no value of this field has fewer than _min_grams[i] trigrams
+            needed = SIMILARITY_THRESHOLD * (len(grams) + self._min_grams[i]) / (1 + SIMILARITY_THRESHOLD) - 1e-9
+            # Trigrams found in most values are not counted but assumed shared: a match still needs
+            # at least one rarer trigram, and counting the common ones would visit most of the table
+            common = {gram for gram in grams if len(postings.get(gram, ())) * 2 > len(self._fields)}
+            if len(common) >= needed:
+                common = set()
+            hits = Counter()
+            for gram in grams - common:
+                hits.update(postings.get(gram, ()))
+            for contact_id, shared in hits.items():
+                if shared + len(common) < needed or contact_id in exclude:
+                    continue
+                fields = self._fields.get(contact_id)
+                if fields is None:
+                    continue
+                score = similarity(grams, trigrams(fields[i]))
+                if score >= SIMILARITY_THRESHOLD and score > ranked.get(contact_id, 0.0):
+                    ranked[contact_id] = score
+        return ranked
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """
+        The search method returns the ids and ranks of the best ``limit`` contacts for the query, best first,
+        ties broken by id. A contact with a field starting with the query ranks 1 plus the share of the field
+        the query covers; otherwise it ranks the trigram similarity of its most similar field.
+        Fuzzy matches always rank below 1, so they are only looked for when there are fewer than ``limit``
+        prefix matches.
+
+        :param query: str: What the user typed
+        :param limit: int: Maximum number of results
+        :return: A list of (contact id, rank) pairs
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        ranked = self._prefix_matches(query)
+        if len(ranked) < limit:
+            ranked.update(self._fuzzy_matches(query, ranked.keys()))
+        best = heapq.nsmallest(limit, ((-rank, contact_id) for contact_id, rank in ranked.items()))
+        return [(contact_id, -rank) for rank, contact_id in best]
+
+
+class ContactIndexes:
+    """
+    The search indexes of the ``size`` users who searched most recently. Looking up a user creates their
+    index, empty until it is loaded, and drops the least recently used one beyond ``size``. An index loaded
+    more than ``ttl`` seconds ago is replaced by a new one, so changes made through other workers show up
+    in searches after at most ``ttl`` seconds.
+    """
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._indexes: OrderedDict[int, ContactSearchIndex] = OrderedDict()
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._indexes
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def __getitem__(self, user_id: int) -> ContactSearchIndex:
+        index = self._indexes.get(user_id)
+        if index is None or index.loaded and time.monotonic() - index.loaded_at > self.ttl:
+            index = ContactSearchIndex()
+        self[user_id] = index
+        return index
+
+    def __setitem__(self, user_id: int, index: ContactSearchIndex):
+        self._indexes[user_id] = index
+        self._indexes.move_to_end(user_id)
+        while len(self._indexes) > self.size:
+            self._indexes.popitem(last=False)
+
+    def pop(self, user_id: int, default=None) -> ContactSearchIndex | None:
+        return self._indexes.pop(user_id, default)
+
+
+# One index per user who searched recently, created on their first search; only used without pg_trgm
+contact_indexes = ContactIndexes(settings.search_index_users, settings.search_index_ttl)
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import deque
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Callable
+
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
+
+from src.services.metrics import metrics
+
+
+def html_message(conf: ConnectionConfig, recipient: str, subject: str, html: str) -> EmailMessage:
+    """An HTML email from the sender of ``conf``."""
+    message = EmailMessage()
+    message["From"] = formataddr((conf.MAIL_FROM_NAME, conf.MAIL_FROM))
+    message["To"] = recipient
+    message["Subject"] = subject
+    message.set_content(html, subtype="html")
+    return message
+
+
+def smtp_client(conf: ConnectionConfig) -> aiosmtplib.SMTP:
+    """An SMTP client for the mail server of ``conf``, not connected yet."""
+    return aiosmtplib.SMTP(hostname=conf.MAIL_SERVER, port=conf.MAIL_PORT, use_tls=conf.MAIL_SSL_TLS,
+                           start_tls=conf.MAIL_STARTTLS, validate_certs=conf.VALIDATE_CERTS,
+                           username=conf.MAIL_USERNAME if conf.USE_CREDENTIALS else None,
+                           password=conf.MAIL_PASSWORD if conf.USE_CREDENTIALS else None)
+
+
+class SMTPPool:
+    """
+    A fixed number of SMTP connections that stay open between messages, so the TLS handshake and the login
+    are paid once per connection instead of once per email. A message waits for an idle connection;
+    a connection the server closed is opened again for the next message.
+    """
+
+    def __init__(self, size: int, client: Callable[[], aiosmtplib.SMTP]):
+        self.size = size
+        self._clients = [client() for _ in range(size)]
+        self._idle = asyncio.Queue()
+        for smtp in self._clients:
+            self._idle.put_nowait(smtp)
+
+    async def _connect(self, smtp: aiosmtplib.SMTP):
+        await smtp.connect()
+        metrics.counter("email_smtp_connects").inc()
+
+    async def send(self, message: EmailMessage):
+        smtp = await self._idle.get()
+        try:
+            if not smtp.is_connected:
+                await self._connect(smtp)
+            try:
+                await smtp.send_message(message)
+            except aiosmtplib.SMTPServerDisconnected:
+                # Servers drop connections that were idle too long; reconnect once before giving up
+                await self._connect(smtp)
+                await smtp.send_message(message)
+        finally:
+            self._idle.put_nowait(smtp)
+
+    async def close(self):
+        for smtp in self._clients:
+            if smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except aiosmtplib.SMTPException:
+                    smtp.close()
+
+
+class RateLimit:
+    """Lets at most ``per_minute`` callers through in any 60 seconds; 0 means no limit."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._passed = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.per_minute <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            while self._passed and self._passed[0] <= now - 60:
+                self._passed.popleft()
+            if len(self._passed) >= self.per_minute:
+                await asyncio.sleep(self._passed.popleft() + 60 - now)
+            self._passed.append(time.monotonic())
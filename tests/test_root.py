@@ -9,4 +9,8 @@ client = TestClient(main.app)
 def test_root():
     response = client.get("/")
     assert response.status_code == 200
-    assert response.json() == {"message": "REST APP CONTACTS v1.0"}
\ No newline at end of file
+    assert response.json() == {"message": "REST APP CONTACTS v1.0"}
+
+def test_root_small_response_not_compressed():
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
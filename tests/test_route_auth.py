@@ -1,11 +1,16 @@
-from unittest.mock import MagicMock
+import asyncio
+from unittest.mock import AsyncMock, patch
 
-from src.database.models import User
+from libgravatar import Gravatar
+from passlib.context import CryptContext
+from passlib.hash import md5_crypt
 
+from src.database.models import EmailOutbox, User
+from src.services.auth import auth_service
+from src.services.cache import user_cache
 
-def test_create_user(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+
+def test_create_user(client, user, session):
     response = client.post(
         "/api/auth/signup",
         json=user,
@@ -14,6 +19,10 @@ def test_create_user(client, user, monkeypatch):
     data = response.json()
     assert data["user"]["email"] == user.get("email")
     assert "id" in data["user"]
+    assert data["user"]["avatar"] == Gravatar(user.get("email")).get_image()
+    queued = session.query(EmailOutbox).filter(EmailOutbox.recipient == user.get("email")).one()
+    assert queued.template == "email_template.html"
+    assert queued.context["username"] == user.get("username")
 
 
 def test_repeat_create_user(client, user):
@@ -66,4 +75,39 @@ def test_login_wrong_email(client, user):
     )
     assert response.status_code == 401, response.text
     data = response.json()
-    assert data["detail"] == "Invalid email"
\ No newline at end of file
+    assert data["detail"] == "Invalid email"
+
+
+def test_login_rehashes_deprecated_hash(client, session, user, monkeypatch):
+    monkeypatch.setattr(auth_service, "pwd_context", CryptContext(schemes=["bcrypt", "md5_crypt"], deprecated="auto"))
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.password = md5_crypt.hash(user.get('password'))
+    session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    assert response.status_code == 200, response.text
+    session.refresh(current_user)
+    assert current_user.password.startswith("$2b$")
+
+
+def test_reused_refresh_token_revokes_access_tokens(client, session, user):
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        tokens = client.post(
+            "/api/auth/login",
+            data={"username": user.get('email'), "password": user.get('password')},
+        ).json()
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert client.get("/api/users/me/", headers=headers).status_code == 200
+        stale = asyncio.run(auth_service.create_refresh_token({"sub": user.get('email'), "stale": True}))
+        response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {stale}"})
+        assert response.status_code == 401, response.text
+        # The access token is still signed and unexpired, and its claims are cached, but it predates the revocation
+        assert client.get("/api/users/me/", headers=headers).status_code == 401
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    session.refresh(current_user)
+    assert current_user.refresh_token is None
+    assert current_user.tokens_revoked_at is not None
+    user_cache.pop(user.get('email'))
@@ -1,13 +1,13 @@
-from unittest.mock import MagicMock, patch
+import csv
+import io
+from unittest.mock import AsyncMock, patch
 import pytest
 from src.database.models import User
 from src.services.auth import auth_service
 
 
 @pytest.fixture()
-def access_token(client, user, session, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def access_token(client, user, session):
     client.post("/api/auth/signup", json=user)
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
@@ -22,7 +22,7 @@ def access_token(client, user, session, monkeypatch):
 
 
 def test_create_contact(client, access_token):
-    with patch.object(auth_service, 'redis') as r_mock:
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.post(
             "/api/contacts",
@@ -47,8 +47,25 @@ def test_create_contact(client, access_token):
         assert "id" in data
 
 
+def test_create_contact_ignores_id(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    contact = {"first_name": "no", "last_name": "id", "phone_number": "0987777", "birthday": "1968-10-30",
+               "email": "no-id@gmail.com", "additional_data": "Empty"}
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post("/api/contacts", json={**contact, "id": 1}, headers=headers)
+        assert response.status_code == 201, response.text
+        assert response.json()["id"] != 1
+        response = client.post("/api/contacts", json=contact, headers=headers)
+        assert response.status_code == 409, response.text
+        response = client.post("/api/contacts", json={**contact, "email": "no-id-2@gmail.com"}, headers=headers)
+        assert response.status_code == 201, response.text
+        client.post("/api/contacts/batch/delete", headers=headers,
+                    json=[{"id": response.json()["id"]}, {"id": response.json()["id"] - 1}])
+
+
 def test_get_contact_found(client, access_token):
-    with patch.object(auth_service, 'redis') as r_mock:
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contacts/1",
@@ -62,10 +79,76 @@ def test_get_contact_found(client, access_token):
         assert data["birthday"] == "1968-10-30"
         assert data["email"] == "usercontact@gmail.com"
         assert data["additional_data"] == "Empty"
+        assert r_mock.set.call_args.kwargs["ex"] == auth_service.redis_user_ttl
+
+
+def test_get_contact_not_modified(client, access_token):
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = client.get("/api/contacts/1", headers=headers)
+        assert response.status_code == 200, response.text
+        etag = response.headers["etag"]
+        assert "last-modified" in response.headers
+        response = client.get("/api/contacts/1", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+
+def test_get_contacts_by_last_name_not_modified(client, access_token):
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = client.get("/api/contacts/by_last_name/user2", headers=headers)
+        assert response.status_code == 200, response.text
+        etag = response.headers["etag"]
+        # The ETag computed from the rows is the one the database aggregate checks conditional requests against
+        response = client.get("/api/contacts/by_last_name/user2", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        response = client.get("/api/contacts/by_last_name/user2", headers={**headers, "If-None-Match": 'W/"stale"'})
+        assert response.status_code == 200
+        assert response.headers["etag"] == etag
+
+
+def test_get_contact_of_other_user_not_found(client, session):
+    import asyncio
+    session.add(User(username="other", email="other@example.com", password="x", confirmed=True, roles="user"))
+    session.commit()
+    token = asyncio.run(auth_service.create_access_token({"sub": "other@example.com"}))
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get("/api/contacts/1", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 404, response.text
+
+
+def test_get_contact_cached_user(client, session, user, access_token):
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = auth_service.dump_user(current_user)
+        response = client.get(
+            "/api/contacts/1",
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        assert response.status_code == 200, response.text
+        r_mock.set.assert_not_called()
+
+
+def test_get_contact_local_user_cache(client, access_token):
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        for _ in range(2):
+            response = client.get(
+                "/api/contacts/1",
+                headers={"Authorization": f"Bearer {access_token}"}
+            )
+            assert response.status_code == 200, response.text
+        r_mock.get.assert_called_once()
 
 
 def test_get_contact_not_found(client, access_token):
-    with patch.object(auth_service, 'redis') as r_mock:
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contacts/2",
@@ -78,7 +161,7 @@ def test_get_contact_not_found(client, access_token):
 
 # def test_get_contacts(client, access_token):
 #     with patch('FastAPILimiter) as init_mock:
-#         with patch.object(auth_service, 'redis') as r_mock:
+#         with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
 #             r_mock.get.return_value = None
 #             response = client.get(
 #                 "/api/contacts",
@@ -94,8 +177,9 @@ def test_get_contact_not_found(client, access_token):
 #
 #
 def test_update_contact(client, access_token):
-    with patch.object(auth_service, 'redis') as r_mock:
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
+        etag = client.get("/api/contacts/1", headers={"Authorization": f"Bearer {access_token}"}).headers["etag"]
         response = client.put(
             "/api/contacts/1",
             json={
@@ -111,10 +195,107 @@ def test_update_contact(client, access_token):
         assert response.status_code == 200, response.text
         data = response.json()
         assert data["first_name"] == "new_user_name"
+        response = client.get("/api/contacts/1", headers={"Authorization": f"Bearer {access_token}",
+                                                         "If-None-Match": etag})
+        assert response.status_code == 200, response.text
+        assert response.headers["etag"] != etag
+
+
+def test_patch_contact_if_match(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        before = client.get("/api/contacts/1", headers=headers)
+        etag = before.headers["etag"]
+        response = client.patch("/api/contacts/1", json={"last_name": "patched"},
+                                headers={**headers, "If-Match": etag})
+        assert response.status_code == 200, response.text
+        assert response.json() == {**before.json(), "last_name": "patched"}
+        assert response.headers["etag"] != etag
+        assert client.get("/api/contacts/1", headers=headers).headers["etag"] == response.headers["etag"]
+        response = client.patch("/api/contacts/1", json={"last_name": "lost update"},
+                                headers={**headers, "If-Match": etag})
+        assert response.status_code == 412, response.text
+        response = client.delete("/api/contacts/1", headers={**headers, "If-Match": etag})
+        assert response.status_code == 412, response.text
+        assert client.get("/api/contacts/1", headers=headers).json()["last_name"] == "patched"
+
+
+def test_patch_contact_invalid(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        assert client.patch("/api/contacts/1", json={}, headers=headers).status_code == 422
+        assert client.patch("/api/contacts/1", json={"first_name": None}, headers=headers).status_code == 422
+        response = client.patch("/api/contacts/99", json={"first_name": "x"}, headers={**headers, "If-Match": "*"})
+        assert response.status_code == 404, response.text
+
+
+def test_batch_contacts(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post("/api/contacts/batch/get", json=[1, 99], headers=headers)
+        assert response.status_code == 200, response.text
+        found, missing = response.json()
+        assert (found["status"], found["contact"]["id"], missing["status"]) == (200, 1, 404)
+        etag = found["etag"]
+        response = client.post("/api/contacts/batch/update", headers=headers, json=[
+            {"id": 1, "last_name": "batched", "if_match": etag},
+            {"id": 99, "first_name": "nobody"},
+            {"id": 2},
+        ])
+        assert [item["status"] for item in response.json()] == [200, 404, 422]
+        updated = response.json()[0]
+        assert updated["contact"]["last_name"] == "batched"
+        response = client.get("/api/contacts/1", headers=headers)
+        assert response.json() == updated["contact"]
+        assert response.headers["etag"] == updated["etag"]
+        response = client.post("/api/contacts/batch/update", json=[{"id": 1, "last_name": "lost", "if_match": etag}],
+                               headers=headers)
+        assert response.json()[0]["status"] == 412
+        response = client.post("/api/contacts/batch/delete", json=[{"id": 1, "if_match": etag}, {"id": 99}],
+                               headers=headers)
+        assert [item["status"] for item in response.json()] == [412, 404]
+        assert client.get("/api/contacts/1", headers=headers).status_code == 200
+
+
+def test_update_contact_email_taken(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        first, second = (client.post("/api/contacts", headers=headers, json={
+            "id": contact_id, "first_name": "taken", "last_name": "email", "phone_number": "0987777",
+            "birthday": "1968-10-30", "email": f"taken-{contact_id}@gmail.com", "additional_data": "Empty"}).json()
+            for contact_id in (60, 61))
+        response = client.patch(f"/api/contacts/{second['id']}", json={"email": first["email"]}, headers=headers)
+        assert response.status_code == 409, response.text
+        response = client.post("/api/contacts/batch/update", headers=headers, json=[
+            {"id": second["id"], "email": first["email"]},
+            {"id": first["id"], "last_name": "kept"},
+        ])
+        assert [item["status"] for item in response.json()] == [409, 200]
+        response = client.get(f"/api/contacts/{first['id']}", headers=headers)
+        assert response.json()["last_name"] == "kept"
+        client.post("/api/contacts/batch/delete", json=[{"id": first["id"]}, {"id": second["id"]}], headers=headers)
+
+
+def test_batch_delete_contacts(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        contact = {"id": 50, "first_name": "batch", "last_name": "delete", "phone_number": "0987777",
+                   "birthday": "1968-10-30", "email": "batch-delete@gmail.com", "additional_data": "Empty"}
+        contact_id = client.post("/api/contacts", json=contact, headers=headers).json()["id"]
+        response = client.post("/api/contacts/batch/delete", json=[{"id": contact_id}], headers=headers)
+        assert response.json() == [{"id": contact_id, "status": 204}]
+        assert client.get(f"/api/contacts/{contact_id}", headers=headers).status_code == 404
+        response = client.post("/api/contacts/batch/get", json=[1, 1], headers=headers)
+        assert response.status_code == 422, response.text
 
 
 def test_update_contact_not_found(client, access_token):
-    with patch.object(auth_service, 'redis') as r_mock:
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.put(
             "/api/tags/2",
@@ -134,7 +315,7 @@ def test_update_contact_not_found(client, access_token):
 
 
 def test_delete_contact(client, access_token):
-    with patch.object(auth_service, 'redis') as r_mock:
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.delete(
             "/api/contacts/1",
@@ -145,7 +326,7 @@ def test_delete_contact(client, access_token):
 
 
 def test_repeat_delete_contact(client, access_token):
-    with patch.object(auth_service, 'redis') as r_mock:
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.delete(
             "/api/contacts/2",
@@ -154,3 +335,147 @@ def test_repeat_delete_contact(client, access_token):
         assert response.status_code == 404, response.text
         data = response.json()
         assert data["detail"] == "Not found"
+
+
+def test_bulk_import_contacts(client, access_token):
+    contact = {
+        "first_name": "bulk",
+        "last_name": "user",
+        "phone_number": "0987777",
+        "birthday": "1968-10-30",
+        "additional_data": "Empty"}
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/api/contacts/bulk",
+            json=[
+                {**contact, "email": "bulk1@gmail.com"},
+                {**contact, "email": "not-an-email"},
+                {**contact, "email": "bulk2@gmail.com"},
+                {**contact, "email": "bulk1@gmail.com"},
+            ],
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 2
+        assert [error["row"] for error in data["errors"]] == [2, 4]
+        assert data["errors"][1]["detail"] == "Contact with this email already exists"
+
+
+def test_bulk_import_contacts_csv(client, access_token):
+    body = (
+        "first_name,last_name,phone_number,birthday,email,additional_data\n"
+        "csv,user,0987777,1968-10-30,csv1@gmail.com,Empty\n"
+        "csv,user,0987777,not-a-date,csv2@gmail.com,Empty\n"
+    )
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/api/contacts/bulk",
+            content=body,
+            headers={"Authorization": f"Bearer {access_token}", "Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 1
+        assert data["errors"][0]["row"] == 2
+        assert data["errors"][0]["detail"].startswith("birthday")
+
+
+def test_bulk_import_contacts_csv_multiline(client, access_token):
+    body = (
+        'first_name,last_name,phone_number,birthday,email,additional_data\n'
+        'multi,line,0987777,1968-10-30,multiline@gmail.com,"line1\nline2, ""quoted"""\n'
+        'after,it,0987777,1968-10-30,after-multiline@gmail.com,Empty\n'
+    ).encode()
+    headers = {"Authorization": f"Bearer {access_token}"}
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        # Chunks that end inside the quoted field
+        response = client.post("/api/contacts/bulk", content=(body[i:i + 50] for i in range(0, len(body), 50)),
+                               headers={**headers, "Content-Type": "text/csv"})
+        assert response.status_code == 200, response.text
+        assert response.json() == {"inserted": 2, "errors": []}
+        response = client.get("/api/contacts/export", params={"format": "csv"},
+                              headers={**headers, "Accept-Encoding": "identity"})
+        exported = [row for row in csv.DictReader(io.StringIO(response.text)) if row["first_name"] == "multi"]
+        assert exported[0]["additional_data"] == 'line1\nline2, "quoted"'
+
+
+def test_bulk_import_large_response_compressed(client, access_token):
+    contact = {"first_name": "bulk", "last_name": "user", "phone_number": "0987777", "birthday": "1968-10-30"}
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/api/contacts/bulk",
+            json=[{**contact, "email": "not-an-email"}] * 50,
+            headers={"Authorization": f"Bearer {access_token}", "Accept-Encoding": "gzip"}
+        )
+        assert response.status_code == 200, response.text
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()["errors"]) == 50
+
+
+def test_export_contacts_csv(client, access_token):
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get(
+            "/api/contacts/export",
+            params={"format": "csv"},
+            headers={"Authorization": f"Bearer {access_token}", "Accept-Encoding": "identity"}
+        )
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.splitlines()
+        assert lines[0].startswith("id,first_name,last_name")
+        assert any("csv1@gmail.com" in line for line in lines[1:])
+
+
+def test_export_contacts_gzip_columnar(client, access_token):
+    import gzip
+    import json
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get(
+            "/api/contacts/export",
+            params={"format": "columnar"},
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        assert response.status_code == 200, response.text
+        header, *groups = gzip.decompress(response.content).decode().splitlines()
+        assert json.loads(header)["columns"][0] == "id"
+        emails = [email for group in groups for email in json.loads(group)["columns"]["email"]]
+        assert "bulk1@gmail.com" in emails
+
+
+def test_get_upcoming_birthdays(client, access_token):
+    from datetime import date, timedelta
+    birthday = (date.today() + timedelta(days=3)).replace(year=1992)
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        client.post(
+            "/api/contacts/",
+            json={"id": 1000, "first_name": "soon", "last_name": "birthday", "email": "soon@gmail.com",
+                  "phone_number": "0987777", "birthday": birthday.isoformat(), "additional_data": "Empty"},
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        response = client.get(
+            "/api/contacts/upcoming_birthdays/",
+            params={"days": 7},
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        assert response.status_code == 200, response.text
+        assert "soon@gmail.com" in [contact["email"] for contact in response.json()]
+
+
+def test_search_contacts(client, access_token):
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get(
+            "/api/contacts/search",
+            params={"q": "bulk2"},
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()[0]["email"] == "bulk2@gmail.com"
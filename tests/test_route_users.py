@@ -0,0 +1,79 @@
+import io
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from PIL import Image
+
+from main import app
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.avatars import LocalStorage, get_avatar_storage
+
+
+@pytest.fixture()
+def access_token(client, user, session):
+    client.post("/api/auth/signup", json=user)
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.confirmed = True
+    session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    return response.json()["access_token"]
+
+
+@pytest.fixture()
+def storage(tmp_path):
+    storage = LocalStorage(tmp_path, "/static/avatars")
+    app.dependency_overrides[get_avatar_storage] = lambda: storage
+    yield storage
+    del app.dependency_overrides[get_avatar_storage]
+
+
+def image_file(size=(1200, 800)) -> io.BytesIO:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "JPEG")
+    buffer.seek(0)
+    return buffer
+
+
+def test_update_avatar(client, access_token, storage):
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.patch("/api/users/avatar", files={"file": ("me.jpg", image_file(), "image/jpeg")},
+                                headers={"Authorization": f"Bearer {access_token}"})
+        assert response.status_code == 200, response.text
+        avatar = response.json()["avatar"]
+        assert avatar.startswith("/static/avatars/WEB13/user1.jpg?v=")
+        with Image.open(storage.root / "WEB13" / "user1.jpg") as stored:
+            assert stored.size == (250, 250)
+
+
+def test_update_avatar_not_an_image(client, access_token, storage):
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.patch("/api/users/avatar", files={"file": ("me.jpg", io.BytesIO(b"not an image"), "image/jpeg")},
+                                headers={"Authorization": f"Bearer {access_token}"})
+        assert response.status_code == 422, response.text
+        assert response.json()["detail"] == "Invalid image"
+
+
+def test_update_avatar_size_unknown(monkeypatch):
+    import asyncio
+    from fastapi import HTTPException, UploadFile
+    from src.routes.users import update_avatar_user
+    monkeypatch.setattr("src.routes.users.settings.avatar_max_bytes", 100)
+    upload = UploadFile(io.BytesIO(b"x" * 101))
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(update_avatar_user(upload, User(id=1), AsyncMock(), AsyncMock()))
+    assert err.value.status_code == 413
+
+
+def test_update_avatar_too_large(client, access_token, storage, monkeypatch):
+    monkeypatch.setattr("src.routes.users.settings.avatar_max_bytes", 100)
+    with patch.object(auth_service, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.patch("/api/users/avatar", files={"file": ("me.jpg", image_file(), "image/jpeg")},
+                                headers={"Authorization": f"Bearer {access_token}"})
+        assert response.status_code == 413, response.text
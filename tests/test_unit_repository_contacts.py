@@ -1,46 +1,88 @@
+import json
 import unittest
-from unittest.mock import MagicMock
+from datetime import date, datetime
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.schemas import ContactModel, ResponseContact
-from src.database.models import Contact
+from src.database.models import Contact, User
 from src.repository.contacts import (
+    CONTACT_FIELDS,
     get_contacts,
-    get_contact,
+    get_contact_snapshot,
+    get_contact_snapshot_by_email,
+    stream_contact_rows,
     get_contact_by_first_name,
     get_contact_by_last_name,
     get_upcoming_birthdays,
-    get_contact_by_email,
     create_contact,
+    create_contacts,
     update_contact,
+    update_contacts,
     remove_contact,
+    remove_contacts,
+    get_contacts_by_ids,
+    refresh_birthday_digest,
+    search_contacts,
 )
+from src.services.etags import ContactVersion, contact_validator, make_validator
+from src.services.search import ContactIndexes
 
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
+        for hook in ("index_birthday", "forget_birthday", "invalidate_birthday_digest"):
+            patcher = patch(f"src.repository.contacts.{hook}", new_callable=AsyncMock)
+            setattr(self, hook, patcher.start())
+            self.addCleanup(patcher.stop)
+        patcher = patch("src.services.contact_cache.redis_client", new_callable=AsyncMock)
+        self.redis = patcher.start()
+        self.redis.get.return_value = None
+        self.addCleanup(patcher.stop)
+        self.redis.pipeline = MagicMock()
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock()
+        self.redis.pipeline.return_value.__aenter__.return_value = self.pipe
+        self.user = User(id=1)
         self.contact = Contact(id=1, first_name='Dmytro', last_name='Test', email='paukdv_test@gmail.com',
                                phone_number='0677772332', birthday='1990-01-11', additional_data='Additional 1')
+        self.row = (1, 'Dmytro', 'Test', '0677772332', date(1990, 1, 11), 'paukdv_test@gmail.com', 'Additional 1')
+        self.row_dict = dict(zip(CONTACT_FIELDS, self.row))
+        self.versioned_row = self.row + (2, datetime(2023, 10, 17, 12))
+
+    def invalidated(self):
+        return {call.args[0] for call in self.pipe.set.call_args_list}
 
     async def test_get_contacts(self):
-        contacts = [Contact(), Contact(), Contact()]
-        self.session.query().all.return_value = contacts
-        result = await get_contacts(self.session)
-        self.assertEqual(result, contacts)
-
-    async def test_get_contact_found(self):
-        contact = [Contact(), Contact(), Contact()]
-        self.session.query().filter_by().first.return_value = contact
-        result = await get_contact(contact_id=self.contact.id, db=self.session)
-        self.assertEqual(result, contact)
-
-    async def test_get_contact_not_found(self):
-        self.session.query().filter_by().first.return_value = None
-        result = await get_contact(contact_id=self.contact.id, db=self.session)
-        self.assertIsNone(result)
+        self.session.execute.return_value.__iter__.return_value = [self.versioned_row]
+        result = await get_contacts(self.user, self.session)
+        self.assertEqual(result.contacts, [self.row_dict])
+        self.assertEqual(result.validator, make_validator(1, 1, 2, datetime(2023, 10, 17, 12)))
+        self.session.execute.assert_awaited_once()
+
+    async def test_get_contacts_after_cursor(self):
+        self.session.execute.return_value.__iter__.return_value = [self.versioned_row]
+        result = await get_contacts(self.user, self.session, limit=2, after=3)
+        self.assertEqual(result.contacts, [self.row_dict])
+        stmt = self.session.execute.call_args.args[0]
+        self.assertEqual(stmt._limit, 2)
+        self.assertIn("contacts.id >", str(stmt))
+
+    async def test_stream_contact_rows(self):
+        batches = [[(1, 'Dmytro')], [(2, 'Stefan')]]
+        self.session.stream.return_value = MagicMock()
+        self.session.stream.return_value.partitions.return_value.__aiter__.return_value = batches
+        result = [rows async for rows in stream_contact_rows(self.user, self.session, after=0, batch_size=2)]
+        self.assertEqual(result, batches)
+        stmt = self.session.stream.call_args.args[0]
+        self.assertEqual(stmt.get_execution_options()["yield_per"], 2)
+        self.assertIn("contacts.id >", str(stmt))
 
     async def test_create_contact(self):
         body = ContactModel(
@@ -52,8 +94,14 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             email='stefan@meta.com.ua',
             additional_data='Empty',
         )
-        result = await create_contact(body=body, db=self.session)
-        self.assertEqual(result.id, body.id)
+        added_ids = []
+        self.session.add.side_effect = lambda contact: added_ids.append(contact.id)
+        self.session.refresh.side_effect = lambda contact: setattr(contact, "id", 7)
+        result = await create_contact(body=body, user=self.user, db=self.session)
+        self.index_birthday.assert_awaited_once_with(1, {**body.model_dump(), "id": 7,
+                                                         "birthday": date(1961, 10, 23)})
+        self.assertEqual(added_ids, [None])
+        self.assertEqual(result.id, 7)
         self.assertEqual(result.first_name, body.first_name)
         self.assertEqual(result.last_name, body.last_name)
         self.assertEqual(result.phone_number, body.phone_number)
@@ -62,127 +110,320 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.additional_data, body.additional_data)
         self.assertTrue(hasattr(result, "id"))
 
-    async def test_update_contact_found(self):
+    async def test_create_contact_email_taken(self):
+        body = ContactModel(first_name='Stefan', last_name='Stefanos', phone_number='0989876655',
+                            birthday='1961-10-23', email='stefan@meta.com.ua', additional_data='Empty')
+        self.session.commit.side_effect = IntegrityError("INSERT", {}, Exception("UNIQUE constraint failed"))
+        with self.assertRaises(IntegrityError):
+            await create_contact(body=body, user=self.user, db=self.session)
+        self.session.rollback.assert_awaited_once()
+        self.index_birthday.assert_not_awaited()
+
+    async def test_create_contacts(self):
         body = ContactModel(
-            id=2,
-            first_name='Stefanka',
+            first_name='Stefan',
             last_name='Stefanos',
             phone_number='0989876655',
             birthday='1961-10-23',
             email='stefan@meta.com.ua',
             additional_data='Empty',
         )
-        contact = Contact(
-            id=2,
-            first_name='Stefania',
-            last_name='Stefano',
-            phone_number='0989876655',
-            birthday='1961-10-23',
-            email='stefan@meta.com.ua',
-            additional_data='Empty',
-        )
-        self.session.query().filter_by().first.return_value = contact
-        self.session.commit.return_value = None
-        result = await update_contact(body=body, contact_id=self.contact.id, db=self.session)
-        self.assertEqual(result, contact)
+        self.session.execute.return_value.scalars.return_value.all.return_value = [body.email]
+        result = await create_contacts([body], user=self.user, db=self.session)
+        self.assertEqual(result, [body.email])
+        stmt = self.session.execute.call_args.args[0]
+        self.assertIn("ON CONFLICT (user_id, email) DO NOTHING", str(stmt.compile(dialect=sqlite.dialect())))
+        self.session.commit.assert_called_once()
+        self.invalidate_birthday_digest.assert_awaited_once()
+
+    async def test_create_contacts_empty(self):
+        result = await create_contacts([], user=self.user, db=self.session)
+        self.assertEqual(result, [])
+        self.session.execute.assert_not_called()
+
+    async def test_update_contact_found(self):
+        updated = self.row + (4, datetime(2023, 10, 17, 12), self.row[5])
+        self.session.execute.return_value.first.return_value = updated
+        result = await update_contact(changes={"first_name": "Dmytro", "birthday": date(1990, 1, 11)},
+                                      contact_id=1, user=self.user, db=self.session)
+        self.assertEqual(json.loads(result.body), {**self.row_dict, "birthday": "1990-01-11"})
+        self.assertEqual(result.validator, contact_validator(4, datetime(2023, 10, 17, 12)))
+        sql = str(self.session.execute.call_args.args[0].compile(dialect=sqlite.dialect()))
+        self.assertIn("SET first_name=?, birthday=?, birthday_md=?, version=(contacts.version + ?)", sql)
+        self.assertIn("RETURNING", sql)
+        self.session.execute.assert_called_once()
+        self.session.commit.assert_awaited_once()
+        self.assertEqual(self.invalidated(), {"contact:1:1", "contact:1:email:paukdv_test@gmail.com"})
+        self.index_birthday.assert_awaited_once_with(1, self.row_dict)
+
+    async def test_update_contact_email_postgres(self):
+        self.session.get_bind.return_value.dialect.name = "postgresql"
+        self.session.execute.return_value.first.return_value = self.row + (4, datetime(2023, 10, 17, 12), "old@meta.ua")
+        await update_contact(changes={"email": self.row[5]}, contact_id=1, user=self.user, db=self.session)
+        sql = str(self.session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertTrue(sql.startswith("WITH previous AS"))
+        self.assertIn("FOR UPDATE", sql)
+        self.assertIn("previous.email", sql.split("RETURNING")[1])
+        self.assertEqual(self.invalidated(),
+                         {"contact:1:1", "contact:1:email:paukdv_test@gmail.com", "contact:1:email:old@meta.ua"})
+
+    async def test_update_contact_if_match(self):
+        self.session.execute.return_value.first.return_value = None
+        expected = [ContactVersion(3, datetime(2023, 10, 17, 12))]
+        result = await update_contact(changes={"last_name": "Test"}, contact_id=1, user=self.user, db=self.session,
+                                      expected=expected)
+        self.assertIsNone(result)
+        sql = str(self.session.execute.call_args.args[0].compile(dialect=sqlite.dialect()))
+        self.assertIn("contacts.version = ? AND contacts.updated_at = ?", sql)
+        self.session.commit.assert_not_awaited()
+        self.index_birthday.assert_not_awaited()
 
     async def test_update_contact_not_found(self):
-        body = ContactModel(
-            id=2,
-            first_name='Stefanka',
-            last_name='Stefanos',
-            phone_number='0989876655',
-            birthday='1961-10-23',
-            email='stefan@meta.com.ua',
-            additional_data='Empty',
-        )
-        contact = Contact(
-            id=2,
-            first_name='Stefania',
-            last_name='Stefano',
-            phone_number='0989876655',
-            birthday='1961-10-23',
-            email='stefan@meta.com.ua',
-            additional_data='Empty',
-        )
-        self.session.query().filter_by().first.return_value = None
-        self.session.commit.return_value = None
-        result = await update_contact(body=body, contact_id=self.contact.id, db=self.session)
+        self.session.execute.return_value.first.return_value = None
+        result = await update_contact(changes={"last_name": "Test"}, contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
+        self.pipe.set.assert_not_called()
 
     async def test_remove_contact_found(self):
-        contact = Contact()
-        self.session.query().filter_by().first.return_value = contact
-        result = await remove_contact(contact_id=1, db=self.session)
-        self.assertEqual(result, contact)
+        self.session.execute.return_value.first.return_value = self.row
+        result = await remove_contact(contact_id=1, user=self.user, db=self.session)
+        self.assertEqual(result, self.row_dict)
+        sql = str(self.session.execute.call_args.args[0].compile(dialect=sqlite.dialect()))
+        self.assertTrue(sql.startswith("DELETE FROM contacts"))
+        self.assertIn("RETURNING", sql)
+        self.forget_birthday.assert_awaited_once_with(1, 1)
+        self.pipe.execute.assert_awaited_once()
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter_by().first.return_value = None
-        result = await remove_contact(contact_id=1, db=self.session)
+        self.session.execute.return_value.first.return_value = None
+        result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
+        self.forget_birthday.assert_not_awaited()
+
+    async def test_get_contacts_by_ids(self):
+        self.session.execute.return_value.__iter__.return_value = [self.row + (2, datetime(2023, 10, 17, 12))]
+        result = await get_contacts_by_ids([1, 5], user=self.user, db=self.session)
+        self.assertEqual(result, {1: (self.row_dict, ContactVersion(2, datetime(2023, 10, 17, 12)))})
+        sql = str(self.session.execute.call_args.args[0].compile(dialect=sqlite.dialect()))
+        self.assertIn("contacts.id IN", sql)
+
+    async def test_update_contacts(self):
+        second = (2,) + self.row[1:5] + ("second@meta.ua", None)
+        self.session.execute.return_value.__iter__.return_value = [self.row + (2, datetime(2023, 10, 17, 12)),
+                                                                   second + (5, datetime(2023, 10, 17, 12))]
+        changes = {1: {"last_name": "One"}, 2: {"last_name": "Two"}, 3: {"last_name": "Three"}}
+        updated, conflicts, taken = await update_contacts(changes, user=self.user, db=self.session,
+                                                          expected={2: [ContactVersion(4, datetime(2023, 10, 17, 12))]})
+        self.assertEqual(list(updated), [1])
+        self.assertEqual(updated[1].contact, {**self.row_dict, "last_name": "One"})
+        self.assertEqual(updated[1].version.version, 3)
+        self.assertEqual(conflicts, {2})
+        self.assertEqual(taken, set())
+        lock, write = self.session.execute.call_args_list
+        self.assertIn("FOR UPDATE", str(lock.args[0].compile(dialect=postgresql.dialect())))
+        sql = str(write.args[0].compile(dialect=sqlite.dialect()))
+        self.assertIn("SET last_name=?, version=(contacts.version + ?)", sql)
+        self.assertEqual(write.args[1], [{"contact_id": 1, "new_last_name": "One"}])
+        self.session.commit.assert_awaited_once()
+        self.assertEqual(self.invalidated(), {"contact:1:1", "contact:1:email:paukdv_test@gmail.com"})
+
+    async def test_update_contacts_email_taken(self):
+        second = (2,) + self.row[1:5] + ("second@meta.ua", None)
+        self.session.execute.return_value.__iter__.return_value = [self.row + (2, datetime(2023, 10, 17, 12)),
+                                                                   second + (5, datetime(2023, 10, 17, 12))]
+        self.session.execute.return_value.scalars.return_value = ["second@meta.ua"]
+        changes = {1: {"email": "second@meta.ua"}, 2: {"email": "new@meta.ua", "last_name": "Two"}}
+        updated, conflicts, taken = await update_contacts(changes, user=self.user, db=self.session, expected={})
+        self.assertEqual(list(updated), [2])
+        self.assertEqual(taken, {1})
+        lock, check, write = self.session.execute.call_args_list
+        self.assertIn("contacts.email IN", str(check.args[0].compile(dialect=sqlite.dialect())))
+        self.assertEqual(write.args[1], [{"contact_id": 2, "new_email": "new@meta.ua", "new_last_name": "Two"}])
+
+    async def test_update_contact_email_taken(self):
+        self.session.execute.side_effect = IntegrityError("UPDATE", {}, Exception("UNIQUE constraint failed"))
+        with self.assertRaises(IntegrityError):
+            await update_contact(changes={"last_name": "Test"}, contact_id=1, user=self.user, db=self.session)
+        self.session.rollback.assert_awaited_once()
+        self.session.commit.assert_not_awaited()
+
+    async def test_remove_contacts(self):
+        self.session.execute.return_value.__iter__.return_value = [self.row]
+        self.session.execute.return_value.scalars.return_value = [2]
+        removed, conflicts = await remove_contacts([1, 2, 3], user=self.user, db=self.session,
+                                                   expected={2: [ContactVersion(4, datetime(2023, 10, 17, 12))]})
+        self.assertEqual(removed, {1: self.row_dict})
+        self.assertEqual(conflicts, {2})
+        sql = str(self.session.execute.call_args_list[0].args[0].compile(dialect=sqlite.dialect()))
+        self.assertTrue(sql.startswith("DELETE FROM contacts"))
+        self.assertIn("contacts.id = ? AND contacts.version = ? AND contacts.updated_at = ?", sql)
+        self.assertEqual(self.session.execute.await_count, 2)
+        self.session.commit.assert_awaited_once()
 
     async def test_contact_by_first_name_found(self):
-        self.session.query().filter_by().all.return_value = [self.contact]
-        result = await get_contact_by_first_name(first_name=self.contact.first_name, db=self.session)
-
-        expected_result = [ResponseContact(
-            id=self.contact.id,
-            first_name=self.contact.first_name,
-            last_name=self.contact.last_name,
-            email=self.contact.email,
-            phone_number=self.contact.phone_number,
-            birthday=self.contact.birthday,
-            additional_data=self.contact.additional_data
-        )]
-        self.assertEqual(result, expected_result)
+        self.session.execute.return_value.__iter__.return_value = [self.versioned_row]
+        contacts, validator = await get_contact_by_first_name(first_name=self.contact.first_name, user=self.user,
+                                                           db=self.session)
+        self.assertEqual(contacts, [self.row_dict])
+        self.assertEqual(validator.count, 1)
+        ResponseContact.model_validate(contacts[0])
 
     async def test_contact_by_first_name_not_found(self):
-        self.session.query().filter_by().all.return_value = []
-        result = await get_contact_by_first_name(first_name=self.contact.first_name, db=self.session)
-        self.assertEqual(result, [])
+        self.session.execute.return_value.scalars.return_value.all.return_value = []
+        result = await get_contact_by_first_name(first_name=self.contact.first_name, user=self.user, db=self.session)
+        self.assertEqual(result.contacts, [])
+        self.assertEqual(result.validator, make_validator(0, None, None, None))
 
     async def test_contact_by_last_name_found(self):
-        self.session.query().filter_by().all.return_value = [self.contact]
-        result = await get_contact_by_last_name(last_name=self.contact.last_name, db=self.session)
-
-        expected_result = [ResponseContact(
-            id=self.contact.id,
-            first_name=self.contact.first_name,
-            last_name=self.contact.last_name,
-            email=self.contact.email,
-            phone_number=self.contact.phone_number,
-            birthday=self.contact.birthday,
-            additional_data=self.contact.additional_data
-        )]
-        self.assertEqual(result, expected_result)
+        self.session.execute.return_value.__iter__.return_value = [self.versioned_row]
+        contacts, validator = await get_contact_by_last_name(last_name=self.contact.last_name, user=self.user,
+                                                           db=self.session)
+        self.assertEqual(contacts, [self.row_dict])
+        self.assertEqual(validator.count, 1)
+        ResponseContact.model_validate(contacts[0])
 
     async def test_contact_by_last_name_not_found(self):
-        self.session.query().filter_by().all.return_value = []
-        result = await get_contact_by_last_name(last_name=self.contact.last_name, db=self.session)
-        self.assertEqual(result, [])
+        self.session.execute.return_value.scalars.return_value.all.return_value = []
+        result = await get_contact_by_last_name(last_name=self.contact.last_name, user=self.user, db=self.session)
+        self.assertEqual(result.contacts, [])
+        self.assertEqual(result.validator, make_validator(0, None, None, None))
+
+    async def test_get_contact_snapshot(self):
+        self.session.execute.return_value.first.return_value = self.row + (2, datetime(2023, 10, 17, 12))
+        result = await get_contact_snapshot(contact_id=1, user=self.user, db=self.session)
+        self.assertEqual(json.loads(result.body), {**self.row_dict, "birthday": "1990-01-11"})
+        self.assertEqual(result.validator, contact_validator(2, datetime(2023, 10, 17, 12)))
+        self.assertEqual(self.redis.set.call_args.args[0], "contact:1:1")
 
-    async def test_contact_by_email_found(self):
-        self.session.query().filter_by().first.return_value = self.contact
-        result = await get_contact_by_email(email=self.contact.email, db=self.session)
+    async def test_get_contact_snapshot_not_found(self):
+        self.session.execute.return_value.first.return_value = None
+        result = await get_contact_snapshot(contact_id=1, user=self.user, db=self.session)
+        self.assertIsNone(result)
+        self.redis.set.assert_not_called()
 
-        self.assertEqual(result, self.contact)
+    async def test_contact_snapshot_by_email_found(self):
+        self.session.execute.return_value.first.return_value = self.row + (1, datetime(2023, 10, 17, 12))
+        result = await get_contact_snapshot_by_email(email=self.contact.email, user=self.user, db=self.session)
+        self.assertEqual(json.loads(result.body)["email"], self.contact.email)
+        self.assertEqual(self.redis.set.call_args.args[0], "contact:1:email:paukdv_test@gmail.com")
 
-    async def test_contact_by_email_not_found(self):
-        self.session.query().filter_by().first.return_value = []
-        result = await get_contact_by_email(email=self.contact.email, db=self.session)
-        self.assertEqual(result, [])
+    async def test_contact_snapshot_by_email_not_found(self):
+        self.session.execute.return_value.first.return_value = None
+        result = await get_contact_snapshot_by_email(email=self.contact.email, user=self.user, db=self.session)
+        self.assertIsNone(result)
 
-    async def test_get_upcoming_birthdays_found(self):
-        self.session.query().filter().all.return_value = self.contact
-        result = await get_upcoming_birthdays(seven_days_from_now=self.contact.birthday, db=self.session)
+    async def test_search_contacts_postgres(self):
+        self.session.get_bind.return_value.dialect.name = "postgresql"
+        self.session.execute.return_value.__iter__.return_value = [self.row]
+        result = await search_contacts("Dmy_", self.user, self.session, limit=5)
+        self.assertEqual(result, [self.row_dict])
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        self.assertIn("lower(contacts.first_name) LIKE", sql)
+        self.assertIn("lower(contacts.email) %", sql)
+        self.assertIn("similarity(", sql)
+        self.assertEqual(stmt.compile().params["lower_1"], "dmy\\_%")
 
-        self.assertEqual(result, self.contact)
+    async def test_search_contacts_in_memory(self):
+        self.session.execute.return_value.__iter__.return_value = [(3,) + self.row[1:], self.row]
+        index = MagicMock()
+        index.load = AsyncMock()
+        index.loaded = False
+        index.search.return_value = [(1, 1.5), (3, 0.4)]
+        indexes = ContactIndexes(size=10, ttl=60)
+        indexes[1] = index
+        with patch("src.repository.contacts.contact_indexes", indexes):
+            result = await search_contacts(" Dmytro ", self.user, self.session, limit=5)
+        index.load.assert_awaited_once_with(self.session, 1)
+        index.search.assert_called_once_with("dmytro", 5)
+        self.assertEqual([contact["id"] for contact in result], [1, 3])
+
+    async def test_search_contacts_blank(self):
+        self.assertEqual(await search_contacts("  ", self.user, self.session), [])
+        self.session.execute.assert_not_called()
+
+    async def test_get_upcoming_birthdays_found(self):
+        self.session.execute.return_value.__iter__.return_value = [self.row]
+        result = await get_upcoming_birthdays(self.user, self.session, today=date(2023, 10, 17), days=7)
+        self.assertEqual(result, [self.row_dict])
+        sql = str(self.session.execute.call_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn("contacts.birthday_md BETWEEN 1017 AND 1024", sql)
+        self.assertIn("contacts.user_id = 1", sql)
 
     async def test_get_upcoming_birthdays_not_found(self):
-        self.session.query().filter().all.return_value = None
-        result = await get_upcoming_birthdays(seven_days_from_now=self.contact.birthday, db=self.session)
+        self.session.execute.return_value.scalars.return_value.all.return_value = []
+        result = await get_upcoming_birthdays(self.user, self.session, today=date(2023, 10, 17))
+        self.assertEqual(result, [])
 
-        self.assertIsNone(result)
+    async def test_get_upcoming_birthdays_wraps_year(self):
+        self.session.execute.return_value.scalars.return_value.all.return_value = []
+        await get_upcoming_birthdays(self.user, self.session, today=date(2023, 12, 28), days=7)
+        sql = str(self.session.execute.call_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn("contacts.birthday_md >= 1228 OR contacts.birthday_md <= 104", sql)
+
+    async def test_get_upcoming_birthdays_ends_on_feb_28(self):
+        await get_upcoming_birthdays(self.user, self.session, today=date(2023, 2, 25), days=3)
+        sql = str(self.session.execute.call_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn("contacts.birthday_md BETWEEN 225 AND 229", sql)
+
+    def test_birthday_md_follows_birthday(self):
+        contact = Contact(birthday=date(1990, 1, 11))
+        self.assertEqual(contact.birthday_md, 111)
+        contact.birthday = date(1990, 12, 31)
+        self.assertEqual(contact.birthday_md, 1231)
+        contact.birthday = None
+        self.assertIsNone(contact.birthday_md)
+
+
+class TestRefreshBirthdayDigest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        for hook in ("pop_changed_contacts", "reapply_birthdays", "release_rebuild_lock",
+                     "invalidate_birthday_digest", "materialize_birthdays"):
+            patcher = patch(f"src.repository.contacts.{hook}", new_callable=AsyncMock)
+            setattr(self, hook, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.pop_changed_contacts.return_value = {}
+        for hook, current in (("digest_is_current", False), ("acquire_rebuild_lock", True)):
+            patcher = patch(f"src.repository.contacts.{hook}", AsyncMock(return_value=current))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.row = (1, 'Dmytro', 'Test', '0677772332', date(1990, 10, 18), 'a@b.com', None)
+
+    async def test_rebuilds_stale_digest(self):
+        session = MagicMock(spec=AsyncSession)
+        session.execute.return_value = [(2, *self.row)]
+        self.assertTrue(await refresh_birthday_digest(session, date(2023, 10, 17)))
+        self.materialize_birthdays.assert_awaited_once()
+        self.assertEqual(self.materialize_birthdays.call_args.args[1], date(2023, 10, 17))
+        user_id, contact = self.materialize_birthdays.call_args.args[0][0]
+        self.assertEqual((user_id, contact["id"], contact["first_name"]), (2, 1, 'Dmytro'))
+        self.reapply_birthdays.assert_not_awaited()
+        self.release_rebuild_lock.assert_awaited_once()
+
+    async def test_reapplies_contacts_written_during_rebuild(self):
+        session = MagicMock(spec=AsyncSession)
+        session.execute.side_effect = [[], [self.row]]
+        self.pop_changed_contacts.side_effect = [{2: [1, 5]}, {}]
+        self.assertTrue(await refresh_birthday_digest(session, date(2023, 10, 17)))
+        contact = dict(zip(CONTACT_FIELDS, self.row))
+        self.reapply_birthdays.assert_awaited_once_with(2, {1: contact, 5: None})
+        self.release_rebuild_lock.assert_awaited_once()
+
+    async def test_invalidated_during_rebuild(self):
+        session = MagicMock(spec=AsyncSession)
+        session.execute.return_value = []
+        self.pop_changed_contacts.return_value = None
+        await refresh_birthday_digest(session, date(2023, 10, 17))
+        self.invalidate_birthday_digest.assert_awaited_once()
+        self.release_rebuild_lock.assert_awaited_once()
+
+    async def test_skips_current_digest(self):
+        session = MagicMock(spec=AsyncSession)
+        with patch("src.repository.contacts.digest_is_current", AsyncMock(return_value=True)):
+            self.assertFalse(await refresh_birthday_digest(session, date(2023, 10, 17)))
+        self.materialize_birthdays.assert_not_awaited()
+        self.release_rebuild_lock.assert_not_awaited()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,54 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import EmailOutbox
+from src.repository.outbox import QueuedEmail, claim_emails, enqueue_email, finish_emails
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+
+    async def test_enqueue_email(self):
+        await enqueue_email("user@meta.ua", "Hi", "email_template.html", {"token": "t"}, self.session)
+        added = self.session.add.call_args.args[0]
+        self.assertIsInstance(added, EmailOutbox)
+        self.assertEqual((added.recipient, added.context), ("user@meta.ua", {"token": "t"}))
+        self.session.commit.assert_not_awaited()
+
+    async def test_claim_emails(self):
+        self.session.execute.return_value = [(2, "b@meta.ua", "Hi", "t.html", {}, 1),
+                                              (1, "a@meta.ua", "Hi", "t.html", {}, 3)]
+        result = await claim_emails(self.session, limit=100, lease_seconds=300)
+        self.assertEqual(result, [QueuedEmail(1, "a@meta.ua", "Hi", "t.html", {}, 3),
+                                  QueuedEmail(2, "b@meta.ua", "Hi", "t.html", {}, 1)])
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        self.assertTrue(sql.startswith("UPDATE email_outbox SET attempts=(email_outbox.attempts + "))
+        self.assertIn("FOR UPDATE SKIP LOCKED", sql)
+        self.assertIn("RETURNING", sql)
+        self.assertNotIn("FOR UPDATE", str(stmt.compile(dialect=sqlite.dialect())))
+        self.session.commit.assert_awaited_once()
+
+    async def test_finish_emails(self):
+        retry_at = datetime(2023, 10, 17, 12)
+        await finish_emails([1, 2], {3: retry_at, 4: None}, {3: "busy", 4: "x" * 2000}, self.session)
+        deleted, updated = (call.args for call in self.session.execute.call_args_list)
+        self.assertIn("DELETE FROM email_outbox WHERE email_outbox.id IN", str(deleted[0]))
+        self.assertEqual(updated[1], [{"email_id": 3, "retry_at": retry_at, "error": "busy"},
+                                      {"email_id": 4, "retry_at": None, "error": "x" * 1000}])
+        self.session.commit.assert_awaited_once()
+
+    async def test_finish_emails_all_sent(self):
+        await finish_emails([1], {}, {}, self.session)
+        self.session.execute.assert_awaited_once()
+        self.session.commit.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
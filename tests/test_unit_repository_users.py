@@ -1,7 +1,7 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.schemas import UserModel
 from src.database.models import User
 
@@ -9,6 +9,7 @@ from src.repository.users import (
     get_user_by_email,
     create_user,
     update_token,
+    update_password,
     confirmed_email,
     update_avatar,
 )
@@ -17,19 +18,23 @@ from src.repository.users import (
 class TestUsers(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
+        patcher = patch("src.repository.users.invalidate_user", new_callable=AsyncMock)
+        self.invalidate_user = patcher.start()
+        self.addCleanup(patcher.stop)
         self.user = User(id=1, username='Pavlo', email='pavlo_test@gmail.com',
                          password='1234567', created_at='2023-10-10', avatar=False, refresh_token='old_token',
                          roles='moderator', confirmed=False)
 
     async def test_get_user_by_email_found(self):
-        self.session.query().filter().first.return_value = self.user
+        self.session.execute.return_value.scalars.return_value.first.return_value = self.user
         result = await get_user_by_email(email=self.user.email, db=self.session)
 
         self.assertEqual(result, self.user)
 
     async def test_get_user_by_email_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.scalars.return_value.first.return_value = None
         result = await get_user_by_email(email=self.user.email, db=self.session)
 
         self.assertIsNone(result)
@@ -44,23 +49,41 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.username, body.username)
         self.assertEqual(result.email, body.email)
         self.assertEqual(result.password, body.password)
+        self.assertIsNone(result.avatar)
+        self.session.commit.assert_awaited_once()
+        self.session.refresh.assert_not_awaited()
 
     async def test_update_token_found(self):
         new_token = "new_token"
         await update_token(self.user, new_token, db=self.session)
         self.assertEqual(self.user.refresh_token, new_token)
         self.session.commit.assert_called_once()
+        self.assertIsNone(self.user.tokens_revoked_at)
+        self.invalidate_user.assert_awaited_once_with(self.user.email)
+
+    async def test_update_token_cleared_revokes_tokens(self):
+        await update_token(self.user, None, db=self.session)
+        self.assertIsNone(self.user.refresh_token)
+        self.assertIsNotNone(self.user.tokens_revoked_at)
+        self.invalidate_user.assert_awaited_once_with(self.user.email)
+
+    async def test_update_password(self):
+        await update_password(self.user, "new_hash", db=self.session)
+        self.assertEqual(self.user.password, "new_hash")
+        self.session.commit.assert_called_once()
 
     async def test_confirmed_email(self):
-        self.session.query().return_value = self.user
+        self.session.execute.return_value.scalars.return_value.first.return_value = self.user
         await confirmed_email(email=self.user.email, db=self.session)
-        self.assertTrue(self.user.email)
+        self.assertTrue(self.user.confirmed)
+        self.invalidate_user.assert_awaited_once_with(self.user.email)
 
     async def test_update_avatar(self):
         url = 'https://example.com/avatar.jpg'
-        self.session.query().return_value = self.user
+        self.session.execute.return_value.scalars.return_value.first.return_value = self.user
         update_user = await update_avatar(email=self.user.email, url=url, db=self.session)
         self.assertEqual(update_user.avatar, url)
+        self.invalidate_user.assert_awaited_once_with(self.user.email)
 
 
 if __name__ == '__main__':
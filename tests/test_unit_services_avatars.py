@@ -0,0 +1,73 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image, UnidentifiedImageError
+
+from src.services.avatars import AVATAR_SIZE, CloudinaryStorage, LocalStorage, make_avatar, resize_avatar
+
+
+def encoded(image: Image.Image, fmt: str) -> io.BytesIO:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    buffer.seek(0)
+    return buffer
+
+
+class TestResizeAvatar(unittest.TestCase):
+
+    def test_large_jpeg(self):
+        avatar = Image.open(io.BytesIO(resize_avatar(encoded(Image.new("RGB", (4000, 3000), "blue"), "JPEG"))))
+        self.assertEqual((avatar.format, avatar.size), ("JPEG", (AVATAR_SIZE, AVATAR_SIZE)))
+
+    def test_fill_crops_the_center(self):
+        image = Image.new("RGB", (900, 300), "black")
+        image.paste("white", (300, 0, 600, 300))
+        avatar = Image.open(io.BytesIO(resize_avatar(encoded(image, "PNG"))))
+        self.assertEqual(avatar.getpixel((AVATAR_SIZE // 2, AVATAR_SIZE // 2)), (255, 255, 255))
+        self.assertGreater(min(avatar.getpixel((5, 5))), 240)
+
+    def test_transparent_png(self):
+        avatar = Image.open(io.BytesIO(resize_avatar(encoded(Image.new("RGBA", (300, 300)), "PNG"))))
+        self.assertEqual(avatar.mode, "RGB")
+
+    def test_not_an_image(self):
+        with self.assertRaises(UnidentifiedImageError):
+            resize_avatar(io.BytesIO(b"not an image"))
+
+
+class TestStorage(unittest.IsolatedAsyncioTestCase):
+
+    async def test_make_avatar(self):
+        avatar = await make_avatar(encoded(Image.new("RGB", (500, 500)), "JPEG"))
+        self.assertEqual(Image.open(io.BytesIO(avatar)).size, (AVATAR_SIZE, AVATAR_SIZE))
+
+    async def test_local_storage(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = LocalStorage(tmp, "/static/avatars/")
+            first = await storage.save("WEB13/user1", b"first")
+            second = await storage.save("WEB13/user1", b"second")
+            self.assertTrue(first.startswith("/static/avatars/WEB13/user1.jpg?v="))
+            self.assertNotEqual(first, second)
+            self.assertEqual((Path(tmp) / "WEB13" / "user1.jpg").read_bytes(), b"second")
+
+    async def test_local_storage_stays_under_root(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = LocalStorage(Path(tmp) / "avatars", "/static/avatars")
+            with self.assertRaises(ValueError):
+                await storage.save("WEB13/../../../escaped", b"data")
+            self.assertFalse((Path(tmp) / "escaped.jpg").exists())
+
+    async def test_cloudinary_storage(self):
+        storage = CloudinaryStorage("cloud", "key", "secret")
+        with patch("src.services.avatars.cloudinary.uploader.upload", return_value={"version": 7}) as upload:
+            url = await storage.save("WEB13/user1", b"avatar")
+        upload.assert_called_once_with(b"avatar", public_id="WEB13/user1", overwrite=True)
+        self.assertIn("/v7/WEB13/user1", url)
+        self.assertIn("c_fill,h_250,w_250", url)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import json
+import unittest
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from redis.exceptions import ConnectionError
+
+from src.database.models import Contact, birthday_md
+from src.services.birthdays import (
+    DIGEST_CHANGED,
+    DIGEST_META,
+    DIGEST_OWNERS,
+    birthday_window,
+    contact_row,
+    in_birthday_window,
+    index_birthday,
+    owner_key,
+    materialize_birthdays,
+    pop_changed_contacts,
+    read_birthdays,
+    window_month_days,
+)
+
+
+class TestWindowMonthDays(unittest.TestCase):
+
+    def test_window(self):
+        self.assertEqual(window_month_days(date(2023, 10, 17), 3), [1017, 1018, 1019, 1020])
+
+    def test_window_wraps_year(self):
+        self.assertEqual(window_month_days(date(2023, 12, 30), 3), [1230, 1231, 101, 102])
+
+    def test_feb_29_outside_leap_years(self):
+        self.assertEqual(window_month_days(date(2023, 2, 27), 2), [227, 228, 229, 301])
+        self.assertEqual(window_month_days(date(2024, 2, 27), 2), [227, 228, 229])
+
+    def test_window_ends_on_feb_28_outside_leap_years(self):
+        self.assertEqual(birthday_window(date(2023, 2, 25), 3), (225, 229))
+        self.assertEqual(window_month_days(date(2023, 2, 25), 3), [225, 226, 227, 228, 229])
+        self.assertEqual(birthday_window(date(2024, 2, 25), 3), (225, 228))
+        self.assertEqual(window_month_days(date(2024, 2, 25), 3), [225, 226, 227, 228])
+
+    def test_same_days_as_the_range(self):
+        month_days = {birthday_md(date(2024, 1, 1) + timedelta(days=i)) for i in range(366)}
+        for start in (date(2023, 1, 30), date(2023, 2, 20), date(2023, 12, 1), date(2024, 2, 20), date(2024, 3, 1)):
+            for days in range(0, 400, 3):
+                window = birthday_window(start, days)
+                self.assertEqual(set(window_month_days(start, days)),
+                                 {month_day for month_day in month_days if in_birthday_window(month_day, window)},
+                                 (start, days))
+
+
+class TestBirthdayDigest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = patch("src.services.birthdays.redis_client")
+        self.redis = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.redis.pipeline = MagicMock()
+        self.pipe = MagicMock()
+        self.redis.pipeline.return_value.__aenter__.return_value = self.pipe
+        self.pipe.execute = AsyncMock()
+        self.redis.hgetall = AsyncMock(return_value={b"built_on": b"2023-10-17", b"days": b"31"})
+        self.redis.hmget = AsyncMock()
+        self.redis.smembers = AsyncMock(return_value={b"3"})
+        self.contact = Contact(id=7, first_name='Dmytro', last_name='Test', email='paukdv_test@gmail.com',
+                               phone_number='0677772332', birthday=date(1990, 10, 18), additional_data='')
+        self.row = contact_row(self.contact)
+
+    async def test_materialize(self):
+        await materialize_birthdays([(2, self.row)], date(2023, 10, 17), 31)
+        self.pipe.delete.assert_called_once_with("birthdays:contacts", DIGEST_OWNERS, owner_key(3))
+        self.pipe.zadd.assert_called_once_with(owner_key(2), {7: 1018})
+        self.pipe.sadd.assert_called_once_with(DIGEST_OWNERS, 2)
+        self.assertEqual(json.loads(self.pipe.hset.call_args_list[0].kwargs["mapping"][7])["birthday"], "1990-10-18")
+        self.assertEqual(self.pipe.hset.call_args_list[-1].args, (DIGEST_META,))
+        self.pipe.execute.assert_awaited_once()
+
+    async def test_index_birthday_during_rebuild(self):
+        self.redis.exists = AsyncMock(return_value=1)
+        await index_birthday(2, self.row)
+        self.pipe.sadd.assert_any_call(DIGEST_CHANGED, "2:7")
+        self.pipe.zadd.assert_called_once_with(owner_key(2), {7: 1018})
+
+    async def test_index_birthday_without_digest(self):
+        self.redis.hgetall.return_value = {}
+        self.redis.exists = AsyncMock(return_value=0)
+        await index_birthday(2, self.row)
+        self.redis.pipeline.assert_not_called()
+
+    async def test_pop_changed_contacts(self):
+        self.pipe.execute.return_value = [{b"2:7", b"2:9", b"3:1"}, 1]
+        changed = await pop_changed_contacts()
+        self.assertEqual({user_id: sorted(ids) for user_id, ids in changed.items()}, {2: [7, 9], 3: [1]})
+        self.pipe.execute.return_value = [{b"2:7", b"*"}, 1]
+        self.assertIsNone(await pop_changed_contacts())
+
+    async def test_read_birthdays(self):
+        self.pipe.execute.return_value = [[], [b"7"], [b"10", b"9"], []]
+        self.redis.hmget.return_value = [b'{"id":7}', b'{"id":9}', None]
+        result = await read_birthdays(2, date(2023, 10, 17), 3)
+        self.assertEqual(result, [b'{"id":7}', b'{"id":9}'])
+        self.pipe.zrangebyscore.assert_any_call(owner_key(2), 1018, 1018)
+        self.redis.hmget.assert_awaited_once_with("birthdays:contacts", [b"7", b"9", b"10"])
+
+    async def test_read_birthdays_stale_digest(self):
+        self.assertIsNone(await read_birthdays(2, date(2023, 10, 18), 3))
+        self.assertIsNone(await read_birthdays(2, date(2023, 10, 17), 60))
+
+    async def test_read_birthdays_redis_down(self):
+        self.redis.hgetall.side_effect = ConnectionError()
+        self.assertIsNone(await read_birthdays(2, date(2023, 10, 17), 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
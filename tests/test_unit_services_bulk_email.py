@@ -0,0 +1,58 @@
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
+
+from src.services import bulk_email
+from src.services.bulk_email import BulkJob, add_job, run_bulk_job
+from src.services.email_templates import EmailTemplates
+from src.services.smtp import RateLimit, SMTPPool
+
+ROOT = Path(__file__).resolve().parent.parent
+
+conf = ConnectionConfig(MAIL_USERNAME="user", MAIL_PASSWORD="secret", MAIL_FROM="from@meta.ua", MAIL_PORT=465,
+                        MAIL_SERVER="localhost", MAIL_FROM_NAME="Example email", MAIL_STARTTLS=False,
+                        MAIL_SSL_TLS=True)
+
+
+class TestBulkEmail(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.templates = EmailTemplates(ROOT / "templates")
+        self.pool = MagicMock(spec=SMTPPool)
+        self.pool.size = 2
+
+    async def test_run_bulk_job(self):
+        self.pool.send.side_effect = [None, aiosmtplib.SMTPRecipientsRefused([]), None]
+        job = BulkJob("Hello", "example_email.html",
+                      [(f"user{i}@meta.ua", {"fullname": f"User {i}", "position": "Bla"}) for i in range(3)])
+        await run_bulk_job(job, self.pool, RateLimit(0), self.templates, conf)
+        snapshot = job.snapshot()
+        self.assertEqual((snapshot["status"], snapshot["total"], snapshot["sent"], snapshot["failed"]),
+                         ("done", 3, 2, 1))
+        self.assertEqual([result["status"] for result in snapshot["results"]], ["sent", "failed", "sent"])
+        messages = [call.args[0] for call in self.pool.send.call_args_list]
+        self.assertEqual([message["To"] for message in messages], ["user0@meta.ua", "user1@meta.ua", "user2@meta.ua"])
+        self.assertIn("Hi User 2,", messages[2].get_content())
+
+    async def test_template_error_fails_recipient(self):
+        job = BulkJob("Hello", "missing.html", [("user@meta.ua", {})])
+        await run_bulk_job(job, self.pool, RateLimit(0), self.templates, conf)
+        self.assertEqual(job.results[0]["status"], "failed")
+        self.pool.send.assert_not_called()
+
+    def test_add_job_forgets_old_finished_jobs(self):
+        with patch.object(bulk_email, "jobs", {}) as jobs, patch.object(bulk_email, "JOBS_KEPT", 1):
+            finished = [BulkJob("Hello", "example_email.html", []) for _ in range(2)]
+            for job in finished:
+                job.status = "done"
+                add_job(job)
+            running = BulkJob("Hello", "example_email.html", [])
+            add_job(running)
+            self.assertEqual(list(jobs), [finished[1].id, running.id])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from jose import jwt
+
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.cache import LocalCache, token_cache
+
+
+class TestLocalCache(unittest.TestCase):
+
+    def test_get_set(self):
+        cache = LocalCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+
+    def test_evicts_least_recently_used(self):
+        cache = LocalCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire(self):
+        cache = LocalCache(maxsize=2, ttl=10)
+        with patch("src.services.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=50)
+        with patch("src.services.cache.time.monotonic", return_value=111):
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), 2)
+
+    def test_pop(self):
+        cache = LocalCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertIsNone(cache.pop("a"))
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.token = asyncio.run(auth_service.create_access_token({"sub": "deadpool@example.com"}))
+
+    def test_decode_token_verifies_once(self):
+        with patch("src.services.auth.jwt.decode", wraps=jwt.decode) as decode:
+            first = auth_service.decode_token(self.token)
+            second = auth_service.decode_token(self.token)
+        self.assertEqual(first, second)
+        self.assertEqual(first["sub"], "deadpool@example.com")
+        decode.assert_called_once()
+
+    def test_cached_claims_of_revoked_token(self):
+        claims = auth_service.decode_token(self.token)
+        user = User(email="deadpool@example.com")
+        self.assertFalse(auth_service.is_revoked(claims, user))
+        user.tokens_revoked_at = datetime.utcnow() + timedelta(seconds=1)
+        self.assertTrue(auth_service.is_revoked(auth_service.decode_token(self.token), user))
+        user.tokens_revoked_at = datetime.utcnow() - timedelta(seconds=5)
+        self.assertFalse(auth_service.is_revoked(claims, user))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import asyncio
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from redis.exceptions import ConnectionError
+
+from src.services.contact_cache import (
+    TOMBSTONE,
+    contact_key,
+    dump_snapshot,
+    get_or_load,
+    invalidate_contact,
+    load_snapshot,
+    make_snapshot,
+)
+from src.services.metrics import metrics
+
+
+class TestContactCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = patch("src.services.contact_cache.redis_client", new_callable=AsyncMock)
+        self.redis = patcher.start()
+        self.redis.get.return_value = None
+        self.addCleanup(patcher.stop)
+        self.redis.pipeline = MagicMock()
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock()
+        self.redis.pipeline.return_value.__aenter__.return_value = self.pipe
+        self.snapshot = make_snapshot(2, datetime(2023, 10, 17, 12, 30), b'{"id":7,"email":"a\\nb"}')
+        self.load = AsyncMock(return_value=self.snapshot)
+
+    def test_dump_and_load(self):
+        self.assertEqual(load_snapshot(dump_snapshot(self.snapshot)), self.snapshot)
+
+    async def test_hit(self):
+        self.redis.get.return_value = dump_snapshot(self.snapshot)
+        hits = metrics.counter("contact_cache_hits").value
+        self.assertEqual(await get_or_load(contact_key(1, 7), self.load), self.snapshot)
+        self.load.assert_not_awaited()
+        self.assertEqual(metrics.counter("contact_cache_hits").value, hits + 1)
+
+    async def test_miss_loads_and_stores(self):
+        misses = metrics.counter("contact_cache_misses").value
+        self.assertEqual(await get_or_load(contact_key(1, 7), self.load), self.snapshot)
+        self.redis.set.assert_awaited_once()
+        self.assertEqual(self.redis.set.call_args.args, ("contact:1:7", dump_snapshot(self.snapshot)))
+        self.assertTrue(self.redis.set.call_args.kwargs["nx"])
+        self.assertEqual(metrics.counter("contact_cache_misses").value, misses + 1)
+
+    async def test_missing_contact_not_stored(self):
+        self.load.return_value = None
+        self.assertIsNone(await get_or_load(contact_key(1, 7), self.load))
+        self.redis.set.assert_not_awaited()
+
+    async def test_concurrent_misses_load_once(self):
+        async def slow_load():
+            await asyncio.sleep(0.01)
+            return self.snapshot
+        self.load.side_effect = slow_load
+        results = await asyncio.gather(*(get_or_load(contact_key(1, 7), self.load) for _ in range(5)))
+        self.assertEqual(results, [self.snapshot] * 5)
+        self.load.assert_awaited_once()
+
+    async def test_followers_load_when_leader_fails(self):
+        calls = []
+
+        async def flaky_load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise RuntimeError("database went away")
+            return self.snapshot
+        leader, follower = await asyncio.gather(get_or_load(contact_key(1, 7), flaky_load),
+                                                get_or_load(contact_key(1, 7), flaky_load), return_exceptions=True)
+        self.assertIsInstance(leader, RuntimeError)
+        self.assertEqual(follower, self.snapshot)
+
+    async def test_redis_down_falls_back_to_database(self):
+        self.redis.get.side_effect = ConnectionError()
+        self.redis.set.side_effect = ConnectionError()
+        self.assertEqual(await get_or_load(contact_key(1, 7), self.load), self.snapshot)
+
+    async def test_tombstone_is_a_miss(self):
+        self.redis.get.return_value = TOMBSTONE
+        self.assertEqual(await get_or_load(contact_key(1, 7), self.load), self.snapshot)
+        self.load.assert_awaited_once()
+
+    async def test_weak_etag_entry_is_a_miss(self):
+        self.redis.get.return_value = b'W/"2.1" 2023-10-17T12:30:00\n{"id":7}'
+        self.assertEqual(await get_or_load(contact_key(1, 7), self.load), self.snapshot)
+        self.load.assert_awaited_once()
+
+    async def test_invalidate(self):
+        await invalidate_contact(1, 7, "old@example.com", "new@example.com")
+        self.assertEqual({call.args for call in self.pipe.set.call_args_list},
+                         {(key, TOMBSTONE) for key in
+                          ("contact:1:7", "contact:1:email:old@example.com", "contact:1:email:new@example.com")})
+        self.pipe.execute.assert_awaited_once()
+
+    async def test_load_racing_an_update_is_not_stored(self):
+        store = {}
+
+        async def set_key(key, value, ex=None, nx=False):
+            if nx and key in store:
+                return None
+            store[key] = value
+            return True
+        self.redis.get.side_effect = store.get
+        self.redis.set.side_effect = set_key
+        self.pipe.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value)
+
+        async def stale_load():
+            # The update commits and invalidates while the old row is being read
+            await invalidate_contact(1, 7)
+            return self.snapshot
+        self.assertEqual(await get_or_load(contact_key(1, 7), stale_load), self.snapshot)
+        self.assertEqual(store["contact:1:7"], TOMBSTONE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiosmtplib
+
+from src.conf.config import settings
+from src.repository.outbox import QueuedEmail
+from src.services.email import render_email, retry_delay, send_outbox_batch
+from src.services.smtp import RateLimit, SMTPPool
+
+
+def queued(email_id: int, attempts: int = 1) -> QueuedEmail:
+    return QueuedEmail(email_id, f"user{email_id}@meta.ua", "Confirm your email ", "email_template.html",
+                       {"host": "http://test/", "username": "deadpool", "token": "token"}, attempts)
+
+
+class TestRenderEmail(unittest.TestCase):
+
+    def test_render_email(self):
+        message = render_email(queued(1))
+        self.assertEqual(message["To"], "user1@meta.ua")
+        self.assertIn("Rest API App", message["From"])
+        self.assertIn("http://test/api/auth/confirmed_email/token", message.get_content())
+
+
+class TestSendOutboxBatch(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = patch("src.services.email.repository_outbox")
+        self.outbox = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.outbox.claim_emails = AsyncMock()
+        self.outbox.finish_emails = AsyncMock()
+        self.session_factory = MagicMock()
+        self.session_factory.return_value.__aenter__ = AsyncMock()
+        self.session_factory.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    async def send(self, *outcomes):
+        pool = MagicMock(spec=SMTPPool)
+        pool.send.side_effect = outcomes
+        return await send_outbox_batch(pool, RateLimit(0), self.session_factory)
+
+    def finished(self):
+        return self.outbox.finish_emails.await_args.args[:3]
+
+    async def test_nothing_due(self):
+        self.outbox.claim_emails.return_value = []
+        self.assertEqual(await self.send(), 0)
+        self.outbox.finish_emails.assert_not_awaited()
+
+    async def test_sent_and_retried(self):
+        self.outbox.claim_emails.return_value = [queued(1), queued(2, attempts=3)]
+        self.assertEqual(await self.send(None, aiosmtplib.SMTPResponseException(421, "busy")), 2)
+        sent, retry, errors = self.finished()
+        self.assertEqual(sent, [1])
+        self.assertIsNotNone(retry[2])
+        self.assertIn("busy", errors[2])
+
+    async def test_gives_up_on_permanent_errors(self):
+        self.outbox.claim_emails.return_value = [queued(1), queued(2)]
+        refused = aiosmtplib.SMTPRecipientsRefused([aiosmtplib.SMTPRecipientRefused(550, "no", "user1@meta.ua")])
+        await self.send(refused, aiosmtplib.SMTPResponseException(554, "rejected"))
+        _, retry, _ = self.finished()
+        self.assertEqual(retry, {1: None, 2: None})
+
+    async def test_gives_up_after_max_attempts(self):
+        self.outbox.claim_emails.return_value = [queued(1, attempts=settings.email_max_attempts)]
+        await self.send(aiosmtplib.SMTPConnectError("refused"))
+        _, retry, _ = self.finished()
+        self.assertEqual(retry, {1: None})
+
+
+class TestRetryDelay(unittest.TestCase):
+
+    def test_backoff(self):
+        self.assertEqual(retry_delay(1), settings.email_retry_base)
+        self.assertEqual(retry_delay(3), settings.email_retry_base * 4)
+        self.assertEqual(retry_delay(100), settings.email_retry_max)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound, select_autoescape
+
+from src.services.email_templates import EmailTemplates, Prerendered
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class TestEmailTemplates(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.folder = Path(tmp.name)
+        (self.folder / "plain.html").write_text("<p>Hi {{ name }},</p>\n<p>{{code}}</p>\n")
+        (self.folder / "loop.html").write_text("{% for item in items %}<li>{{ item }}</li>{% endfor %}")
+        (self.folder / "note.txt").write_text("Hi {{ name }}")
+        self.templates = EmailTemplates(self.folder)
+
+    def test_simple_templates_are_prerendered(self):
+        renderer = self.templates._renderers["plain.html"]
+        self.assertIsInstance(renderer.__self__, Prerendered)
+        self.assertEqual(renderer.__self__.names, ("name", "code"))
+
+    def test_same_output_as_jinja(self):
+        for folder, name, context in (
+                (ROOT / "src" / "services" / "templates", "email_template.html",
+                 {"host": "http://localhost:8000/", "username": "deadpool", "token": "abc"}),
+                (ROOT / "templates", "example_email.html", {"fullname": "Billy Jones", "position": "Bla-Bla"}),
+                (self.folder, "loop.html", {"items": [1, 2]})):
+            jinja = Environment(loader=FileSystemLoader(folder), autoescape=select_autoescape(["html"]))
+            self.assertEqual(EmailTemplates(folder).render(name, context), jinja.get_template(name).render(context))
+
+    def test_html_is_escaped(self):
+        self.assertEqual(self.templates.render("plain.html", {"name": "<b>", "code": 1}),
+                         "<p>Hi &lt;b&gt;,</p>\n<p>1</p>")
+        self.assertEqual(self.templates.render("note.txt", {"name": "<b>"}), "Hi <b>")
+
+    def test_undefined_renders_empty(self):
+        self.assertEqual(self.templates.render("plain.html", {}), "<p>Hi ,</p>\n<p></p>")
+
+    def test_unknown_template(self):
+        with self.assertRaises(TemplateNotFound):
+            self.templates.render("missing.html", {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from fastapi import FastAPI, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.testclient import TestClient
+
+from src.services.etags import (
+    ContactVersion,
+    GZipETagMiddleware,
+    contact_validator,
+    if_match,
+    is_conditional,
+    make_validator,
+    not_modified,
+    validator_headers,
+)
+
+
+def request(**headers):
+    mock = MagicMock()
+    mock.headers = {name.replace("_", "-"): value for name, value in headers.items()}
+    return mock
+
+
+class TestEtags(unittest.TestCase):
+
+    def setUp(self):
+        self.validator = make_validator(2, 3, 4, datetime(2023, 10, 17, 12, 30, 15, 500))
+
+    def test_validator_changes_with_state(self):
+        self.assertEqual(self.validator, make_validator(2, 3, 4, datetime(2023, 10, 17, 12, 30, 15, 500)))
+        self.assertNotEqual(self.validator.etag, make_validator(2, 3, 5, self.validator.last_modified).etag)
+        self.assertNotEqual(self.validator.etag, make_validator(1, 1, 1, self.validator.last_modified).etag)
+        self.assertTrue(self.validator.etag.startswith('W/"'))
+
+    def test_empty_validator(self):
+        validator = make_validator(0, None, None, None)
+        self.assertEqual(validator.count, 0)
+        self.assertNotIn("Last-Modified", validator_headers(validator))
+
+    def test_headers(self):
+        headers = validator_headers(self.validator)
+        self.assertEqual(headers["ETag"], self.validator.etag)
+        self.assertNotIn("Last-Modified", headers)
+        contact = contact_validator(3, datetime(2023, 10, 17, 12, 30, 15, 500))
+        self.assertEqual(validator_headers(contact)["Last-Modified"], "Tue, 17 Oct 2023 12:30:15 GMT")
+
+    def test_if_none_match(self):
+        self.assertTrue(not_modified(request(if_none_match=self.validator.etag), self.validator))
+        self.assertTrue(not_modified(request(if_none_match=f'"x", {self.validator.etag[2:]}'), self.validator))
+        self.assertTrue(not_modified(request(if_none_match="*"), self.validator))
+        self.assertFalse(not_modified(request(if_none_match='W/"stale"'), self.validator))
+
+    def test_is_conditional(self):
+        self.assertTrue(is_conditional(request(if_none_match=self.validator.etag)))
+        self.assertTrue(is_conditional(request(if_modified_since="Tue, 17 Oct 2023 12:30:15 GMT")))
+        self.assertFalse(is_conditional(request(if_match=self.validator.etag)))
+
+    def test_if_none_match_wins_over_if_modified_since(self):
+        headers = request(if_none_match='W/"stale"', if_modified_since="Tue, 17 Oct 2023 12:30:15 GMT")
+        self.assertFalse(not_modified(headers, self.validator))
+
+    def test_if_modified_since(self):
+        contact = contact_validator(3, datetime(2023, 10, 17, 12, 30, 15, 500))
+        self.assertTrue(not_modified(request(if_modified_since="Tue, 17 Oct 2023 12:30:15 GMT"), contact))
+        self.assertFalse(not_modified(request(if_modified_since="Tue, 17 Oct 2023 12:30:14 GMT"), contact))
+        self.assertFalse(not_modified(request(if_modified_since="yesterday"), contact))
+
+    def test_collections_ignore_if_modified_since(self):
+        # A delete leaves the latest updated_at where it was, so the date cannot tell the list changed
+        self.assertFalse(not_modified(request(if_modified_since="Tue, 17 Oct 2030 12:30:15 GMT"), self.validator))
+
+    def test_unconditional(self):
+        self.assertFalse(not_modified(request(), self.validator))
+
+
+    def test_contact_etag_carries_version(self):
+        updated_at = datetime(2023, 10, 17, 12, 30, 15, 500)
+        etag = contact_validator(3, updated_at).etag
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual(if_match(request(if_match=etag)), [ContactVersion(3, updated_at)])
+        self.assertEqual(if_match(request(if_match=f'"x", {etag}')), [ContactVersion(3, updated_at)])
+        self.assertEqual(if_match(request(if_match=f'{etag[:-1]}-gzip"')), [ContactVersion(3, updated_at)])
+
+    def test_if_match_is_strong(self):
+        etag = contact_validator(3, datetime(2023, 10, 17, 12, 30, 15, 500)).etag
+        self.assertEqual(if_match(request(if_match=f"W/{etag}")), [])
+
+    def test_if_none_match_ignores_gzip_suffix(self):
+        contact = contact_validator(3, datetime(2023, 10, 17, 12, 30, 15, 500))
+        self.assertTrue(not_modified(request(if_none_match=f'{contact.etag[:-1]}-gzip"'), contact))
+
+    def test_if_match_any(self):
+        self.assertIsNone(if_match(request()))
+        self.assertIsNone(if_match(request(if_match="*")))
+        self.assertEqual(if_match(request(if_match=self.validator.etag)), [])
+
+
+class TestGZipETagMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        app = FastAPI()
+        app.add_middleware(GZipMiddleware, minimum_size=100)
+        app.add_middleware(GZipETagMiddleware)
+
+        @app.get("/{size}")
+        def body(size: int, weak: bool = False):
+            return Response(b"x" * size, headers={"ETag": 'W/"a"' if weak else '"3.ab"'})
+        self.client = TestClient(app)
+
+    def test_gzip_body_gets_its_own_etag(self):
+        response = self.client.get("/1000")
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["etag"], '"3.ab-gzip"')
+
+    def test_identity_body_keeps_etag(self):
+        self.assertEqual(self.client.get("/10").headers["etag"], '"3.ab"')
+        self.assertEqual(self.client.get("/1000", headers={"Accept-Encoding": "identity"}).headers["etag"], '"3.ab"')
+
+    def test_weak_etag_untouched(self):
+        self.assertEqual(self.client.get("/1000?weak=true").headers["etag"], 'W/"a"')
+
+
+if __name__ == '__main__':
+    unittest.main()
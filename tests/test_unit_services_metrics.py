@@ -0,0 +1,51 @@
+import unittest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from src.database.connect import async_database_url, engine_options, instrument_pool
+from src.services.metrics import Histogram, MetricsRegistry, metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3):
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 4)
+        self.assertEqual(snapshot["buckets"], {"0.1": 1, "1.0": 3, "+Inf": 4})
+
+    def test_registry_snapshot(self):
+        registry = MetricsRegistry()
+        registry.counter("requests").inc(3)
+        registry.gauge("in_flight").set(2)
+        registry.collector("pool", lambda: {"size": 5})
+        self.assertEqual(registry.snapshot(), {"in_flight": 2, "requests": 3, "pool": {"size": 5}})
+
+    def test_async_database_url(self):
+        self.assertEqual(async_database_url("postgresql://u:p@localhost:5432/db"),
+                         "postgresql+asyncpg://u:p@localhost:5432/db")
+        self.assertEqual(async_database_url("sqlite:///./test.db"), "sqlite+aiosqlite:///./test.db")
+
+    def test_engine_options(self):
+        self.assertNotIn("pool_size", engine_options("sqlite:///./test.db"))
+        options = engine_options("postgresql://u:p@localhost:5432/db")
+        self.assertIn("pool_size", options)
+        self.assertTrue(options["pool_pre_ping"])
+
+    def test_instrument_pool_tracks_checkouts(self):
+        engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2)
+        instrument_pool(engine.pool)
+        checked_out = metrics.gauge("db_pool_checked_out")
+        before = checked_out.value
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            self.assertEqual(checked_out.value, before + 1)
+        self.assertEqual(checked_out.value, before)
+        self.assertEqual(metrics.snapshot()["db_pool"]["size"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
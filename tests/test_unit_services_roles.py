@@ -0,0 +1,30 @@
+import unittest
+from unittest.mock import MagicMock
+
+from fastapi import HTTPException
+
+from src.database.models import User, Roles
+from src.services.roles import RoleChecker
+
+
+class TestRoleChecker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.request = MagicMock()
+        self.user = User(id=1, username='Pavlo', email='pavlo_test@gmail.com', roles=Roles.moderator)
+
+    async def test_allowed_role_returns_user(self):
+        checker = RoleChecker([Roles.admin, Roles.moderator])
+        result = await checker(self.request, current_user=self.user)
+        self.assertIs(result, self.user)
+        self.request.json.assert_not_called()
+
+    async def test_forbidden_role(self):
+        checker = RoleChecker([Roles.admin])
+        with self.assertRaises(HTTPException) as err:
+            await checker(self.request, current_user=self.user)
+        self.assertEqual(err.exception.status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import patch
+
+from src.services.search import ContactIndexes, ContactSearchIndex, similarity, trigrams
+
+
+class TestTrigrams(unittest.TestCase):
+
+    def test_trigrams(self):
+        self.assertEqual(trigrams("Cat"), {"  c", " ca", "cat", "at "})
+
+    def test_incomplete_word(self):
+        self.assertEqual(trigrams("Ca", complete=False), {"  c", " ca"})
+
+    def test_similarity(self):
+        self.assertEqual(similarity(trigrams("cat"), trigrams("cat")), 1.0)
+        self.assertEqual(similarity(trigrams("cat"), set()), 0.0)
+        self.assertLess(similarity(trigrams("cat"), trigrams("dog")), 0.3)
+
+
+class TestContactSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ContactSearchIndex()
+        self.index.loaded = True
+        self.index.add(1, ("Dmytro", "Pauk", "paukdv@gmail.com", "0677772332"))
+        self.index.add(2, ("Stefan", "Stefanos", "stefan@meta.com.ua", "0989876655"))
+        self.index.add(3, ("Stepan", "Dmytrenko", "stepan@ukr.net", "0501112233"))
+
+    def test_prefix(self):
+        self.assertEqual([contact_id for contact_id, _ in self.index.search("ste", 10)], [2, 3])
+        self.assertEqual([contact_id for contact_id, _ in self.index.search("098", 10)], [2])
+
+    def test_case_insensitive(self):
+        self.assertEqual(self.index.search("DMYTRO", 10)[0][0], 1)
+
+    def test_fuzzy(self):
+        self.assertEqual([contact_id for contact_id, _ in self.index.search("stefann", 10)], [2])
+
+    def test_prefix_ranks_above_fuzzy(self):
+        ranked = self.index.search("dmytr", 10)
+        self.assertEqual([contact_id for contact_id, _ in ranked], [1, 3])
+        self.assertGreater(ranked[0][1], 1.0)
+
+    def test_limit(self):
+        self.assertEqual(len(self.index.search("ste", 1)), 1)
+
+    def test_discard_and_update(self):
+        self.index.discard(2)
+        self.assertEqual(self.index.search("stefanos", 10), [])
+        self.index.add(3, ("Stefan", "Stefanos", "stepan@ukr.net", "0501112233"))
+        self.assertEqual([contact_id for contact_id, _ in self.index.search("stefanos", 10)], [3])
+
+    def test_not_loaded_ignores_changes(self):
+        index = ContactSearchIndex()
+        index.add(1, ("Dmytro", "Pauk", "paukdv@gmail.com", "0677772332"))
+        self.assertEqual(index.search("dmytro", 10), [])
+
+
+class TestContactIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.indexes = ContactIndexes(size=2, ttl=60)
+
+    def test_drops_least_recently_used(self):
+        first = self.indexes[1]
+        self.indexes[2]
+        self.assertIs(self.indexes[1], first)
+        self.indexes[3]
+        self.assertEqual(len(self.indexes), 2)
+        self.assertIn(1, self.indexes)
+        self.assertNotIn(2, self.indexes)
+
+    def test_reloads_after_ttl(self):
+        index = self.indexes[1]
+        index.loaded, index.loaded_at = True, 100.0
+        with patch("src.services.search.time.monotonic", return_value=150.0):
+            self.assertIs(self.indexes[1], index)
+        with patch("src.services.search.time.monotonic", return_value=161.0):
+            self.assertIsNot(self.indexes[1], index)
+            self.assertFalse(self.indexes[1].loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
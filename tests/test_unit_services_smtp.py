@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiosmtplib
+
+from src.services.smtp import RateLimit, SMTPPool
+
+
+def smtp_mock():
+    smtp = MagicMock(spec=aiosmtplib.SMTP)
+    smtp.is_connected = False
+
+    async def connect():
+        smtp.is_connected = True
+
+    smtp.connect.side_effect = connect
+    return smtp
+
+
+class TestSMTPPool(unittest.IsolatedAsyncioTestCase):
+
+    async def test_connections_are_reused(self):
+        smtp = smtp_mock()
+        pool = SMTPPool(1, client=lambda: smtp)
+        for _ in range(3):
+            await pool.send(MagicMock())
+        smtp.connect.assert_awaited_once()
+        self.assertEqual(smtp.send_message.await_count, 3)
+
+    async def test_reconnects_when_server_disconnected(self):
+        smtp = smtp_mock()
+        smtp.send_message.side_effect = [aiosmtplib.SMTPServerDisconnected("idle"), None]
+        pool = SMTPPool(1, client=lambda: smtp)
+        await pool.send(MagicMock())
+        self.assertEqual(smtp.connect.await_count, 2)
+
+    async def test_close(self):
+        smtp = smtp_mock()
+        pool = SMTPPool(1, client=lambda: smtp)
+        await pool.send(MagicMock())
+        await pool.close()
+        smtp.quit.assert_awaited_once()
+
+
+class TestRateLimit(unittest.IsolatedAsyncioTestCase):
+
+    async def test_waits_for_the_window(self):
+        rate = RateLimit(2)
+        with patch("src.services.smtp.asyncio.sleep", new_callable=AsyncMock) as sleep, \
+                patch("src.services.smtp.time.monotonic", return_value=100.0):
+            for _ in range(3):
+                await rate.acquire()
+        sleep.assert_awaited_once_with(60.0)
+
+    async def test_unlimited(self):
+        rate = RateLimit(0)
+        with patch("src.services.smtp.asyncio.sleep", new_callable=AsyncMock) as sleep:
+            for _ in range(10):
+                await rate.acquire()
+        sleep.assert_not_awaited()
+
+
+if __name__ == '__main__':
+    unittest.main()